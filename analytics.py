@@ -0,0 +1,141 @@
+import argparse
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from export import EXPORT_FP
+
+GROUPS = ("member", "party", "state_district", "chamber", "asset_type")
+FIELDS = ("value", "income")
+
+@dataclass
+class Holdings:
+    """
+    Every exported holding as parallel arrays. Bracket bounds are float64 with NaN where a bound
+    is unknown, "Over $50,000,000" has a lower bound and a NaN upper bound. Group columns are
+    stored as codes into their labels so aggregating is a bincount.
+    """
+    low: dict[str, np.ndarray]     # field -> lower bounds
+    high: dict[str, np.ndarray]    # field -> upper bounds
+    codes: dict[str, np.ndarray]   # group -> code of every row
+    labels: dict[str, np.ndarray]  # group -> label of every code
+
+    def __len__(self) -> int:
+        return len(self.low["value"])
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list]) -> "Holdings":
+        """ columns has a list per group plus {field}_low and {field}_high lists, None for unknown bounds. """
+        (low, high), codes, labels = _bounds(columns), {}, {}
+        for group in GROUPS:
+            codes[group], labels[group] = _factorize(np.asarray(columns[group], dtype=object))
+        return cls(low, high, codes, labels)
+
+    @classmethod
+    def from_db(cls, db_fp: Path = EXPORT_FP, year: Optional[int] = None) -> "Holdings":
+        """
+        Load the export, the same member in several years would be counted once per year unless year is given.
+        Holdings come back as numbers only, their filing id and asset type code, and the member columns are
+        looked up once per filing. No label is turned into a Python string per row.
+        """
+        where, params = ("WHERE year = ?", (year,)) if year is not None else ("", ())
+        with sqlite3.connect(db_fp) as db:
+            asset_types = [asset_type for (asset_type,) in db.execute("SELECT DISTINCT asset_type FROM holdings")]
+            db.execute("CREATE TEMP TABLE asset_types (asset_type TEXT, code INTEGER)")
+            db.executemany("INSERT INTO asset_types VALUES (?, ?)", [(asset_type, i) for i, asset_type in enumerate(asset_types)])
+            filings = {row[0]: row[1:] for row in db.execute(
+                "SELECT filing_id, chamber || '/' || key, party, state_district, chamber "
+                f"FROM filings JOIN members USING (member_id) {where}", params)}
+            rows = db.execute(
+                "SELECT h.filing_id, t.code, h.value_low, h.value_high, h.income_low, h.income_high "
+                "FROM holdings h JOIN asset_types t ON t.asset_type IS h.asset_type" +
+                (" WHERE h.filing_id IN (SELECT filing_id FROM filings JOIN members USING (member_id) WHERE year = ?)"
+                 if year is not None else ""), params).fetchall()
+
+        # one float64 array straight from the row tuples, NULL becomes NaN
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), 6)
+        low = {"value": table[:, 2].copy(), "income": table[:, 4].copy()}
+        high = {"value": table[:, 3].copy(), "income": table[:, 5].copy()}
+        codes, labels = {}, {}
+        # the filings holding anything, each member column is factorized over them and spread to their rows
+        ids, filing_rows = np.unique(table[:, 0].astype(np.int64), return_inverse=True)
+        by_filing = list(zip(*(filings[i] for i in ids.tolist()))) or [()] * 4
+        for group, values in zip(("member", "party", "state_district", "chamber"), by_filing):
+            filing_codes, labels[group] = _factorize(np.array(values, dtype=object))
+            codes[group] = filing_codes[filing_rows.ravel()]
+        codes["asset_type"], type_labels = _factorize(table[:, 1].astype(np.int64))
+        labels["asset_type"] = np.array(asset_types, dtype=object)[type_labels]
+        return cls(low, high, codes, labels)
+
+    def aggregate(self, by: str, field: str = "value", open_ended: float = 1.0) -> dict[str, np.ndarray]:
+        """
+        Per group of by: holdings, sum of lower bounds ("min"), sum of upper bounds ("max") and
+        their midpoint. Open-ended brackets count as open_ended times their lower bound in max,
+        holdings with unknown bounds are left out of the sums and counted in "unknown".
+        """
+        codes, n = self.codes[by], len(self.labels[by])
+        low, high = self.low[field], self.high[field]
+        unbounded = ~np.isnan(low) & np.isnan(high)
+        known = ~np.isnan(low)
+        high = np.where(unbounded, low * open_ended, high)
+
+        ret = {
+            by: self.labels[by],
+            "holdings": np.bincount(codes, minlength=n),
+            "min": np.bincount(codes, weights=np.where(known, low, 0), minlength=n),
+            "max": np.bincount(codes, weights=np.where(known, high, 0), minlength=n),
+            "open_ended": np.bincount(codes, weights=unbounded, minlength=n).astype(np.int64),
+            "unknown": np.bincount(codes, weights=~known, minlength=n).astype(np.int64),
+        }
+        ret["midpoint"] = (ret["min"] + ret["max"]) / 2
+        return ret
+
+    def top(self, by: str, n: int = 50, stat: str = "min", field: str = "value", open_ended: float = 1.0) -> dict[str, np.ndarray]:
+        """ The n groups with the largest stat, e.g. the top 50 members by minimum disclosed wealth. """
+        aggregate = self.aggregate(by, field, open_ended)
+        order = np.argsort(-aggregate[stat], kind="stable")[:n]
+        return {name: column[order] for name, column in aggregate.items()}
+
+def _bounds(columns: dict[str, list]) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+    # None becomes NaN
+    low = {field: np.array(columns[f"{field}_low"], dtype=np.float64) for field in FIELDS}
+    high = {field: np.array(columns[f"{field}_high"], dtype=np.float64) for field in FIELDS}
+    return low, high
+
+def _factorize(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ (codes, labels) of values, labels sorted with None last. """
+    missing = np.equal(values, None) if values.dtype == object else np.zeros(len(values), dtype=bool)
+    labels, codes = np.unique(values[~missing], return_inverse=True)
+    ret = np.full(len(values), len(labels), dtype=np.int64)
+    ret[~missing] = codes.ravel()
+    if missing.any():
+        labels = np.append(labels.astype(object), None)
+    return ret, labels
+
+def format_table(table: dict[str, np.ndarray]) -> str:
+    names = list(table)
+    rows = [[f"{value:,.0f}" if isinstance(value, float) else str(value) for value in row] for row in zip(*table.values())]
+    widths = [max([len(name)] + [len(row[i]) for row in rows]) for i, name in enumerate(names)]
+    lines = ["  ".join(name.ljust(width) for name, width in zip(names, widths))]
+    lines += ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate exported holdings by their disclosed brackets")
+    parser.add_argument("--db", type=Path, default=EXPORT_FP, help="database written by export.py")
+    parser.add_argument("--year", type=int, default=None, help="only this year's partition")
+    parser.add_argument("--by", choices=GROUPS, default="party")
+    parser.add_argument("--field", choices=FIELDS, default="value")
+    parser.add_argument("--stat", choices=("min", "max", "midpoint"), default="min")
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--open-ended", type=float, default=1.0,
+                        help="upper bound of an open-ended bracket as a multiple of its lower bound")
+    args = parser.parse_args()
+
+    holdings = Holdings.from_db(args.db, args.year)
+    print(f"{len(holdings)} holdings")
+    print(format_table(holdings.top(args.by, args.top, args.stat, args.field, args.open_ended)))
@@ -0,0 +1,190 @@
+import argparse
+import bisect
+import json
+import re
+import time
+from collections import defaultdict
+from difflib import get_close_matches
+from pathlib import Path
+from typing import Optional
+
+from utils import BASE_DATA_FP, atomic_write_json, chamber_fps, remove_accents
+
+INDEX_FP = BASE_DATA_FP / 'index' / 'assets.json'
+
+_TICKER_RE = re.compile(r'\(([A-Z][A-Z0-9.\-]{0,9})\)')
+# owner and account codes filers put in parentheses too, "Vanguard S&P 500 ETF (VOO) (IRA)"
+_ACCOUNT_CODES = {'SP', 'JT', 'DC', 'IRA', 'ROTH', 'SEP', 'SIMPLE', 'HSA', 'UTMA', 'UGMA'}
+_PUNCTUATION_RE = re.compile(r"[^\w\s&]|_")
+# trailing words that name the same issuer, stripped repeatedly so "Corp Class A Common Stock" all goes
+_SUFFIXES = {
+    'INC', 'INCORPORATED', 'CORP', 'CORPORATION', 'CO', 'COMPANY', 'COS', 'LTD', 'LIMITED', 'LLC', 'LP', 'PLC',
+    'SA', 'AG', 'NV', 'SE', 'HOLDINGS', 'HOLDING', 'GROUP', 'COMMON', 'STOCK', 'SHARES', 'SHS', 'ORDINARY',
+    'ADR', 'ADS', 'SPONSORED', 'NEW', 'THE', 'CL', 'CLASS', 'SERIES',
+}
+_SHARE_CLASSES = set('ABCDEFGHK')
+
+def asset_ticker(asset: str) -> Optional[str]:
+    """ The ticker of "Apple Inc. (AAPL)", None if there is none. The last group that isn't an account code. """
+    tickers = [ticker for ticker in _TICKER_RE.findall(asset) if ticker not in _ACCOUNT_CODES]
+    return tickers[-1] if tickers else None
+
+def normalize_asset(asset: str) -> str:
+    """ "NVIDIA Corporation - Common Stock (NVDA)" -> "NVIDIA", "Bank of America Corp." -> "BANK OF AMERICA" """
+    name = _TICKER_RE.sub(' ', remove_accents(asset)).upper()
+    words = _PUNCTUATION_RE.sub(' ', name).replace(' CAPITAL STOCK', ' STOCK').split()
+    if words and words[0] == 'THE':
+        words = words[1:]
+    while len(words) > 1:
+        if words[-1] in _SUFFIXES:
+            words.pop()
+        # the share class letter of "Class A" / "Series B" / "Cl A"
+        elif words[-1] in _SHARE_CLASSES and words[-2] in ('CLASS', 'CL', 'SERIES'):
+            words.pop()
+        else:
+            break
+    return " ".join(words)
+
+class AssetIndex:
+    """
+    Normalized asset names -> the members and filings holding them, persisted in one json file:
+    {"members": {"{partition}/{chamber}/{member}": {"stamp": [mtime_ns, size], "names": [...]}},
+     "postings": {name: [[member, filing, asset], ...]}, "tickers": {ticker: [name, ...]}}
+    update() only re-reads member files whose stamp changed.
+    """
+
+    def __init__(self, path: Path = INDEX_FP):
+        self.path = path
+        if path.exists():
+            with open(path, "r") as file:
+                data = json.load(file)
+        else:
+            data = {"members": {}, "postings": {}, "tickers": {}}
+        self.members: dict[str, dict] = data["members"]
+        self.postings: dict[str, list] = data["postings"]
+        self.tickers: dict[str, list] = data["tickers"]
+        self._build_lookups()
+
+    def _build_lookups(self):
+        self.names = sorted(self.postings)
+        self.tokens = defaultdict(set)
+        for name in self.names:
+            for token in name.split():
+                self.tokens[token].add(name)
+
+    def _remove_member(self, member: str):
+        for name in self.members.pop(member)["names"]:
+            postings = [posting for posting in self.postings.get(name, []) if posting[0] != member]
+            if postings:
+                self.postings[name] = postings
+            else:
+                self.postings.pop(name, None)
+
+    def _add_member(self, member: str, json_fp: Path, stamp: list[int]):
+        with open(json_fp, "r") as file:
+            holdings = json.load(file)["holdings"]
+        names = set()
+        for filing, entry in holdings.items():
+            for row in entry.get("data") or []:
+                asset = row.get("Asset")
+                if not asset:
+                    continue
+                name = normalize_asset(asset)
+                if not name:
+                    continue
+                names.add(name)
+                self.postings.setdefault(name, []).append([member, filing, asset])
+                ticker = asset_ticker(asset)
+                if ticker and name not in self.tickers.setdefault(ticker, []):
+                    self.tickers[ticker].append(name)
+        self.members[member] = {"stamp": stamp, "names": sorted(names)}
+
+    def update(self, chamber_fps: list[Path]) -> int:
+        """ Re-index the member files that changed and drop the ones that are gone, returns how many changed. """
+        seen = set()
+        changed = 0
+        for chamber_fp in chamber_fps:
+            for member_fp in sorted(p for p in chamber_fp.iterdir() if p.is_dir()):
+                json_fp = member_fp / f"{member_fp.name}.json"
+                if not json_fp.exists():
+                    continue
+                member = str(member_fp.relative_to(BASE_DATA_FP))
+                seen.add(member)
+                stat = json_fp.stat()
+                stamp = [stat.st_mtime_ns, stat.st_size]
+                if self.members.get(member, {}).get("stamp") == stamp:
+                    continue
+                if member in self.members:
+                    self._remove_member(member)
+                self._add_member(member, json_fp, stamp)
+                changed += 1
+        for member in set(self.members) - seen:
+            self._remove_member(member)
+            changed += 1
+        if changed:
+            self._build_lookups()
+        return changed
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.path, {"members": self.members, "postings": self.postings, "tickers": self.tickers})
+
+    def lookup(self, query: str) -> list[str]:
+        """ Names equal to the query once normalized, or named by the query as a ticker. """
+        name = normalize_asset(query)
+        ret = [name] if name in self.postings else []
+        # tickers aren't pruned when members are re-indexed, so skip names nobody holds anymore
+        return ret + [name for name in self.tickers.get(query.strip().upper(), []) if name in self.postings and name not in ret]
+
+    def prefix(self, query: str, limit: int = 50) -> list[str]:
+        """ Names starting with the normalized query, in order. """
+        prefix = normalize_asset(query)
+        i = bisect.bisect_left(self.names, prefix)
+        ret = []
+        while i < len(self.names) and self.names[i].startswith(prefix) and len(ret) < limit:
+            ret.append(self.names[i])
+            i += 1
+        return ret
+
+    def fuzzy(self, query: str, limit: int = 10, cutoff: float = 0.75) -> list[str]:
+        """ Closest names to the query, e.g. misspellings. Only names sharing a word with it are compared when there are any. """
+        name = normalize_asset(query)
+        candidates = set().union(*(self.tokens.get(token, ()) for token in name.split()))
+        return get_close_matches(name, candidates or self.names, n=limit, cutoff=cutoff)
+
+    def holders(self, names: list[str]) -> dict[str, list]:
+        return {name: self.postings[name] for name in names}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the members and filings holding an asset")
+    parser.add_argument("query", nargs="?", help="asset name or ticker, e.g. 'Bank of America' or NVDA")
+    parser.add_argument("--prefix", action="store_true", help="every name starting with the query")
+    parser.add_argument("--fuzzy", action="store_true", help="the closest names to the query")
+    parser.add_argument("--update", action="store_true", help="re-index changed member files first")
+    args = parser.parse_args()
+
+    # a one-off query pays for reading and rebuilding the whole index, so that's reported too
+    start = time.perf_counter()
+    index = AssetIndex()
+    load_seconds = time.perf_counter() - start
+    if args.update:
+        changed = index.update(chamber_fps())
+        index.save()
+        print(f"re-indexed {changed} member files, {len(index.names)} asset names")
+    if args.query:
+        start = time.perf_counter()
+        if args.prefix:
+            names = index.prefix(args.query)
+        elif args.fuzzy:
+            names = index.fuzzy(args.query)
+        else:
+            names = index.lookup(args.query)
+        results = index.holders(names)
+        seconds = time.perf_counter() - start
+
+        for name, postings in results.items():
+            print(f"{name} ({len({member for member, _, _ in postings})} members)")
+            for member, filing, asset in postings:
+                print(f"    {member}  {filing}  {asset}")
+        print(f"{len(results)} names in {(load_seconds + seconds) * 1000:.1f} ms, {load_seconds * 1000:.1f} ms of it loading the index")
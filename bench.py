@@ -0,0 +1,855 @@
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from pdf2image import convert_from_bytes
+from PIL import Image, ImageDraw
+
+import holdings
+import members
+import metrics
+import transport
+from holdings import (
+    HouseFiling,
+    RasterConfig,
+    _rasterize_HoR_PDF,
+    iter_HoR_FD_XML,
+    parse_assets,
+    download_zip,
+    load_HoR_FD_XML,
+    save_HoR_FD_PDF,
+    scrape_senate
+)
+from members import ResponseCache, get_members, parse_members, setup_members
+from analytics import GROUPS, Holdings
+from checkpoint import Manifest
+from export import SCHEMA
+from pages import write_pages
+from store import HoldingsStore
+from utils import HOR_DATA_FP, SENATE_DATA_FP, atomic_write_json, checkpoint_fp, parse_amount_range
+
+BENCHMARKS = ["xml", "senate_assets", "aggregate", "transport", "pipeline", "rasterize"]
+
+
+def _run_isolated(fn, *args):
+    """ Run fn in a fresh process and return (seconds, peak RSS in MB, result), errors are raised here. """
+    def _target(queue, *args):
+        try:
+            start = time.perf_counter()
+            result = fn(*args)
+            seconds = time.perf_counter() - start
+            # ru_maxrss is in KB on linux
+            queue.put((None, (seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, result)))
+        except BaseException:
+            queue.put((traceback.format_exc(), None))
+
+    ctx = mp.get_context("fork")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_target, args=(queue, *args))
+    process.start()
+    error, ret = queue.get()
+    process.join()
+    if error is not None:
+        raise RuntimeError(f"{fn.__name__} failed:\n{error}")
+    return ret
+
+def _result(seconds: float, rss: float, items: int, **extra) -> dict:
+    return {"seconds": round(seconds, 4), "peak_rss_mb": round(rss, 1), "items": items,
+            "items_per_second": round(items / seconds, 2) if seconds else None, **extra}
+
+
+# =============================================
+# ========== House FD XML index ===============
+# =============================================
+
+FILING_TYPES = ['O', 'O', 'O', 'P', 'A', 'C', 'D', 'X', 'W']
+
+def make_HoR_FD_XML(fp: Path, rows: int, years: range = range(2012, 2024)):
+    rng = random.Random(0)
+    with open(fp, "w") as file:
+        file.write('<?xml version="1.0" encoding="utf-8"?>\n<FinancialDisclosure>\n')
+        for i in range(rows):
+            year = rng.choice(years)
+            file.write(
+                "<Member>"
+                f"<Prefix>Hon.</Prefix><Last>Last{i % 5000}</Last><First>First{i % 713}</First><Suffix />"
+                f"<FilingType>{rng.choice(FILING_TYPES)}</FilingType><StateDst>CA{i % 53:02}</StateDst>"
+                f"<Year>{year}</Year><FilingDate>{rng.randint(1, 12)}/{rng.randint(1, 28)}/{year}</FilingDate>"
+                f"<DocID>{10000000 + i}</DocID>"
+                "</Member>\n"
+            )
+        file.write("</FinancialDisclosure>\n")
+
+def _bs4_HoR_FD_XML(xml_fp: Path) -> list[tuple]:
+    # the BeautifulSoup loader load_HoR_FD_XML used before iterparse
+    with open(xml_fp, 'r') as file:
+        content = file.read()
+    soup = BeautifulSoup(content, 'xml')
+    fds = [{child.name: child.text.strip() if child.text else None for child in member.find_all()} \
+           for member in soup.find_all('Member')]
+    fds = [fd for fd in fds if fd['FilingType'] == 'O']
+    return [tuple(fd[field] for field in HouseFiling._fields) for fd in fds]
+
+def _iterparse_HoR_FD_XML(xml_fp: Path) -> list[tuple]:
+    return [tuple(fd) for fd in iter_HoR_FD_XML(xml_fp)]
+
+def bench_HoR_FD_XML(rows: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_fp = Path(tmp) / "FD.xml"
+        make_HoR_FD_XML(xml_fp, rows)
+        print(f"House FD XML: {rows} rows, {xml_fp.stat().st_size / 1e6:.1f} MB")
+
+        results, ret = {}, {}
+        for name, fn in [("bs4", _bs4_HoR_FD_XML), ("iterparse", _iterparse_HoR_FD_XML)]:
+            seconds, rss, records = _run_isolated(fn, xml_fp)
+            results[name] = records
+            ret[name] = _result(seconds, rss, len(records))
+            print(f"  {name:<10} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  {len(records)} annual reports")
+
+        assert results["bs4"] == results["iterparse"], "iterparse records differ from the BeautifulSoup loader"
+    return ret
+
+
+# =============================================
+# ========== Senate e-filed assets ============
+# =============================================
+
+ASSET_TYPES = ['Stock', 'Corporate Bond', 'Mutual Funds', 'Bank Deposit', 'Real Estate', 'Retirement Plans']
+VALUES = ['$1,001 - $15,000', '$15,001 - $50,000', '$50,001 - $100,000', '$1,000,001 - $5,000,000', 'Over $50,000,000']
+
+def make_senate_report(rows: int, seed: int = 0) -> str:
+    # shaped like an efdsearch.senate.gov annual report, with the other parts around the assets
+    rng = random.Random(seed)
+    other_part = lambda part: (
+        f'<section class="card mb-2"><div class="card-body"><h3 class="h4">{part}</h3>'
+        '<table class="table table-striped" id="grid_items"><tbody>'
+        + "".join(f'<tr><td>{i}</td><td>Employer {i}</td><td>Salary</td><td>$1,000</td></tr>' for i in range(rows // 10))
+        + '</tbody></table></div></section>')
+    assets = "".join(
+        f'<tr class="nowrap"><td>{i + 1}</td>'
+        f'<td><strong>Asset {rng.randint(0, 10**6)} Inc &amp; Co</strong><div class="muted"><em>Company:</em> Asset Inc<br><em>Description:</em> held in a brokerage account</div></td>'
+        f'<td>{rng.choice(ASSET_TYPES)} <div class="muted"><em>Type:</em> Common</div></td>'
+        f'<td>{rng.choice(["Self", "Spouse", "Joint", "Child"])}</td><td>{rng.choice(VALUES)}</td>'
+        f'<td>Dividends, <br>Capital Gains</td><td>{rng.choice(VALUES)}</td></tr>\n'
+        for i in range(rows))
+    return (
+        '<!DOCTYPE html><html><head><title>eFD: Annual Report</title></head><body><div class="container">'
+        + other_part('Part 1. Honoraria Payments') + other_part('Part 2. Earned and Non-Investment Income')
+        + '<section class="card mb-2"><div class="card-body"><h3 class="h4">Part 3. Assets</h3>'
+        '<p>Assets held for investment or production of income with a value exceeding $1,000.</p>'
+        '<div class="table-responsive"><table class="table table-striped" id="grid_items">'
+        '<thead><tr><th>#</th><th>Asset</th><th>Asset Type</th><th>Owner</th><th>Value</th><th>Income Type</th><th>Income Amount</th></tr></thead>'
+        f'<tbody>{assets}</tbody></table></div></div></section>'
+        + other_part('Part 4a. Periodic Transaction Report Summary') + other_part('Part 7. Liabilities')
+        + '</div></body></html>')
+
+def _bs4_senate_assets(html: str) -> list[dict]:
+    # the BeautifulSoup parser _parse_disclosure used before parse_assets
+    webpage_soup = BeautifulSoup(html, 'html.parser')
+    assets_section = webpage_soup.find('h3', string='Part 3. Assets').find_parent('section')
+    table = assets_section.find('table', {'id': 'grid_items'})
+    ret = []
+    for row in table.tbody.find_all('tr'):
+        cells = row.find_all('td')
+        ret.append({
+        'Asset': cells[1].find('strong').text.strip(),
+        'Asset Type': cells[2].get_text(separator=" ").strip()[:-1],
+        'Owner': cells[3].text.strip(),
+        'Value': cells[4].text.strip(),
+        'Income Type': cells[5].text.strip(),
+        'Income': cells[6].text.strip(),
+        })
+    return ret
+
+def _parse_reports(parse, reports: list[str]) -> list[list[dict]]:
+    return [parse(html) for html in reports]
+
+def bench_senate_assets(reports: list[str]) -> dict:
+    print(f"Senate assets: {len(reports)} reports, {sum(map(len, reports)) / 1e6:.1f} MB")
+
+    results, ret = {}, {}
+    for name, fn in [("bs4", _bs4_senate_assets), ("lxml", parse_assets)]:
+        seconds, rss, parsed = _run_isolated(_parse_reports, fn, reports)
+        results[name] = parsed
+        ret[name] = _result(seconds, rss, len(reports), assets=sum(map(len, parsed)))
+        print(f"  {name:<10} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  {sum(map(len, parsed))} assets")
+
+    assert results["bs4"] == results["lxml"], "lxml assets differ from the BeautifulSoup parser"
+    return ret
+
+
+# =============================================
+# ========== Bracket aggregation ==============
+# =============================================
+
+BRACKETS = VALUES + ['$1 - $200', '$201 - $1,000', 'None (or less than $201)', 'Undetermined', 'Spouse/DC Over $1,000,000']
+
+def make_holdings_db(fp: Path, rows: int, members: int = 600):
+    """ A synthetic export.py database, one filing per member. """
+    rng = random.Random(0)
+    with sqlite3.connect(fp) as db:
+        db.executescript(SCHEMA)
+        db.executemany("INSERT INTO members (member_id, partition, year, chamber, key, party, state_district) "
+                       "VALUES (?, '2022', 2022, 'House of Representatives', ?, ?, ?)",
+                       [(m, f"MEMBER, {m}", rng.choice("DRI"), f"{rng.choice(['CA', 'NY', 'TX', 'FL'])}{rng.randint(1, 40)}")
+                        for m in range(members)])
+        db.executemany("INSERT INTO filings (filing_id, member_id, filing, digest) VALUES (?, ?, ?, '')",
+                       [(m, m, str(10_000_000 + m)) for m in range(members)])
+        filing_rows = defaultdict(int)
+        holdings = []
+        for _ in range(rows):
+            m = rng.randrange(members)
+            value, income = parse_amount_range(rng.choice(BRACKETS)), parse_amount_range(rng.choice(BRACKETS))
+            holdings.append((m, filing_rows[m], rng.choice(ASSET_TYPES), *value, *income))
+            filing_rows[m] += 1
+        db.executemany("INSERT INTO holdings (filing_id, row, asset_type, value_low, value_high, income_low, income_high) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)", holdings)
+
+def _python_aggregate(db_fp: Path) -> dict[str, dict]:
+    # per-row aggregation over the flat view, the way one would walk the member json files
+    with sqlite3.connect(db_fp) as db:
+        rows = db.execute("SELECT chamber || '/' || key, party, state_district, chamber, asset_type, value_low, value_high "
+                          "FROM holdings_flat").fetchall()
+    ret = {}
+    for i, by in enumerate(GROUPS):
+        sums = {}
+        for row in rows:
+            low, high = row[5], row[6]
+            entry = sums.setdefault(row[i], [0.0, 0.0])
+            if low is not None:
+                entry[0] += low
+                entry[1] += low if high is None else high
+        ret[by] = sums
+    return ret
+
+def _numpy_aggregate(db_fp: Path) -> tuple[float, dict[str, dict]]:
+    # loading into arrays is paid once, every later question is just the aggregate
+    start = time.perf_counter()
+    holdings = Holdings.from_db(db_fp)
+    load_seconds = time.perf_counter() - start
+    ret = {}
+    for by in GROUPS:
+        aggregate = holdings.aggregate(by)
+        ret[by] = {label: [low, high] for label, low, high in zip(aggregate[by].tolist(), aggregate["min"].tolist(), aggregate["max"].tolist())}
+    return load_seconds, ret
+
+def bench_aggregate(rows: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_fp = Path(tmp) / "holdings.sqlite"
+        make_holdings_db(db_fp, rows)
+        print(f"Bracket aggregation: {rows} exported holdings by {', '.join(GROUPS)}")
+
+        results, ret = {}, {}
+        seconds, rss, results["python"] = _run_isolated(_python_aggregate, db_fp)
+        ret["python"] = _result(seconds, rss, rows)
+        print(f"  {'python':<10} {seconds:8.2f}s  peak RSS {rss:8.1f} MB")
+        seconds, rss, (load_seconds, results["numpy"]) = _run_isolated(_numpy_aggregate, db_fp)
+        ret["numpy"] = _result(seconds, rss, rows, load_seconds=round(load_seconds, 4))
+        print(f"  {'numpy':<10} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  "
+              f"({load_seconds:.2f}s loading, {seconds - load_seconds:.2f}s aggregating)")
+
+    for by in GROUPS:
+        python, numpy = results["python"][by], results["numpy"][by]
+        assert python.keys() == numpy.keys() and all(
+            abs(a - b) <= 1e-9 * max(abs(a), 1) for label in python for a, b in zip(python[label], numpy[label])), \
+            f"numpy aggregates by {by} differ from the per-row ones"
+    return ret
+
+
+# =============================================
+# ============ Pipeline stages ================
+# =============================================
+# Every stage runs against a local stand-in for congress.gov, disclosures-clerk.house.gov,
+# efdsearch.senate.gov and OpenAI, serving synthetic fixtures, and scrapes into a temporary
+# data folder. Stages run in order (each one reads what the previous one wrote), each in its
+# own process so the peak RSS is its own.
+
+STATES = ['California', 'New York', 'Texas', 'Florida', 'Ohio', 'Georgia', 'Michigan', 'Arizona']
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_text_pdf(lines: list[str], lines_per_page: int = 60) -> bytes:
+    """ A PDF with a text layer, in Courier so pdftotext -layout keeps the columns. """
+    pages = [lines[i:i + lines_per_page] for i in range(0, max(len(lines), 1), lines_per_page)]
+    bodies = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"}
+    kids = []
+    for i, page in enumerate(pages):
+        page_num, content_num = 4 + 2 * i, 5 + 2 * i
+        text = "".join(f"({_pdf_escape(line)}) '\n" for line in page)
+        stream = f"BT /F1 7 Tf 9 TL 20 780 Td\n{text}ET".encode()
+        bodies[page_num] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_num} 0 R >>").encode()
+        bodies[content_num] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        kids.append(f"{page_num} 0 R")
+    bodies[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for num in sorted(bodies):
+        offsets[num] = len(out)
+        out += b"%d 0 obj\n" % num + bodies[num] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(bodies) + 1)
+    for num in sorted(bodies):
+        out += b"%010d 00000 n \n" % offsets[num]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(bodies) + 1, xref)
+    return bytes(out)
+
+def _page_image(rng: random.Random, lines: int = 40, size: tuple[int, int] = (850, 1100)) -> Image.Image:
+    # a page of "text" bars, so preprocessing has margins to crop and content to keep
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(lines):
+        y = 80 + i * 24
+        draw.rectangle([60, y, 60 + rng.randint(200, size[0] - 120), y + 10], fill="black")
+    return image
+
+def make_scanned_pdf(rng: random.Random, pages: int) -> bytes:
+    images = [_page_image(rng) for _ in range(pages)]
+    out = io.BytesIO()
+    images[0].save(out, "PDF", save_all=True, append_images=images[1:], resolution=100)
+    return out.getvalue()
+
+def make_schedule_A(rng: random.Random, rows: int, doc_id: str, tx: bool = False) -> list[str]:
+    """
+    Schedule A of an e-filed House report laid out the way pdftotext -layout prints it. With tx the table
+    has the "Tx. > $1,000?" column, its header on two lines and its checkboxes printed as gfedc.
+    """
+    columns = [0, 40, 47, 73, 92, 112]
+    def _line(*cells):
+        line = ""
+        for start, cell in zip(columns, cells):
+            line = line.ljust(start) + cell
+        return line
+    lines = [f"Filing ID #{doc_id}", "", 'Schedule A: Assets and "Unearned" Income', ""]
+    if tx:
+        lines += [_line("Asset", "Owner", "Value of Asset", "Income Type(s)", "Income", "Tx. >"),
+                  _line("", "", "", "", "Current Year", "$1,000?")]
+    else:
+        lines.append(_line("Asset", "Owner", "Value of Asset", "Income Type(s)", "Income"))
+    for i in range(rows):
+        lines.append(_line(f"Asset {rng.randint(0, 10 ** 6)} Inc [ST]", rng.choice(["", "SP", "JT"]),
+                           rng.choice(VALUES), "Dividends", rng.choice(BRACKETS[:6]), *(["gfedc"] if tx else [])))
+        lines.append("    Description: held in a brokerage account")
+    lines += ["", "Schedule C: Earned Income", "", "None disclosed."]
+    return lines
+
+def _gif(rng: random.Random) -> bytes:
+    out = io.BytesIO()
+    _page_image(rng, lines=20, size=(600, 800)).convert("P").save(out, "GIF")
+    return out.getvalue()
+
+class Fixtures:
+    """ Synthetic responses of every site the pipeline talks to. """
+
+    def __init__(self, year: int, congress: int, house_members: int, senators: int, scanned: float, scan_pages: int,
+                 assets: int):
+        rng = random.Random(0)
+        self.year = year
+        self.congress = congress
+
+        # congress.gov
+        self.members = []
+        for i in range(house_members + senators):
+            chamber = "House of Representatives" if i < house_members else "Senate"
+            self.members.append({
+                "name": f"Member{i}, First{i}", "state": rng.choice(STATES), "partyName": rng.choice(["Democratic", "Republican"]),
+                "terms": {"item": [{"chamber": chamber, "startYear": year - 1}]},
+                **({"district": rng.randint(1, 40)} if chamber != "Senate" else {}),
+            })
+
+        # disclosures-clerk.house.gov, one annual report per member and a few other filings
+        self.pdfs = {}
+        filings = []
+        for i in range(house_members):
+            for filing_type in ["O"] + (["P"] if i % 3 == 0 else []):
+                doc_id = str(10_000_000 + len(filings))
+                filings.append((f"Member{i}", f"First{i}", filing_type, doc_id))
+                if filing_type != "O":
+                    continue
+                if rng.random() < scanned:
+                    self.pdfs[doc_id] = make_scanned_pdf(rng, scan_pages)
+                else:
+                    self.pdfs[doc_id] = make_text_pdf(make_schedule_A(rng, assets, doc_id, tx=i % 2 == 1))
+        xml = io.StringIO()
+        xml.write('<?xml version="1.0" encoding="utf-8"?>\n<FinancialDisclosure>\n')
+        for last, first, filing_type, doc_id in filings:
+            xml.write(f"<Member><Prefix>Hon.</Prefix><Last>{last}</Last><First>{first}</First><Suffix />"
+                      f"<FilingType>{filing_type}</FilingType><StateDst>CA01</StateDst><Year>{year}</Year>"
+                      f"<FilingDate>5/{rng.randint(1, 28)}/{year}</FilingDate><DocID>{doc_id}</DocID></Member>\n")
+        xml.write("</FinancialDisclosure>\n")
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+            zip_file.writestr(f"{year}FD.xml", xml.getvalue())
+            zip_file.writestr(f"{year}FD.txt", "\n".join("\t".join(filing) for filing in filings))
+        self.fd_zip = zip_buffer.getvalue()
+
+        # efdsearch.senate.gov, one annual report per senator
+        self.reports = []
+        self.report_pages = {}
+        self.gifs = {}
+        for i in range(house_members, house_members + senators):
+            report_id = f"{i:08x}-bench"
+            if rng.random() < scanned:
+                link = f'<a href="/search/view/paper/{report_id}/" target="_blank">Annual Report (Paper)</a>'
+                urls = []
+                for page in range(scan_pages):
+                    self.gifs[f"{report_id}_{page}.gif"] = _gif(rng)
+                    urls.append(f"/media/{report_id}_{page}.gif")
+                self.report_pages[report_id] = urls
+            else:
+                link = f'<a href="/search/view/annual/{report_id}/" target="_blank">Annual Report for CY {year - 1}</a>'
+                self.report_pages[report_id] = make_senate_report(assets, seed=i)
+            self.reports.append([f"First{i}", f"Member{i}", f"Member{i}, First{i} (Senator)", link, f"05/13/{year}"])
+
+class StandIn(ThreadingHTTPServer):
+    """
+    Local HTTP server answering as every site the pipeline talks to, latency seconds late.
+    A flaky share of requests gets a 503 with Retry-After, and as large a share of file
+    downloads is cut off halfway. Files honor Range requests so they can be resumed, and
+    If-None-Match on a HEAD of the FD zip so delta runs can skip it, and on congress.gov pages.
+    """
+    daemon_threads = True
+
+    def __init__(self, fixtures: Fixtures, latency: float = 0.0, page_cap: int = 500, flaky: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.page_cap = page_cap  # the Senate search caps page length like the real one
+        self.flaky = flaky
+        self.rng = random.Random(0)
+        self.rng_lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str = "application/json", status: int = 200, headers: Optional[dict] = None):
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _flake(self) -> bool:
+        with self.server.rng_lock:
+            return self.server.rng.random() < self.server.flaky
+
+    def _send_file(self, body: bytes, content_type: str):
+        etag = f'"{len(body)}"'
+        start = 0
+        range_ = self.headers.get("Range", "")
+        if range_.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            start = min(int(range_[len("bytes="):].partition("-")[0] or 0), len(body))
+        if not start:
+            headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+            status = 200
+        else:
+            headers = {"ETag": etag, "Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"}
+            status = 206
+        if len(body) - start > 1 and self._flake():
+            # promise the whole file, send half of it and hang up
+            time.sleep(self.server.latency)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body) - start))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            self.close_connection = True
+            return
+        self._send(body[start:], content_type, status, headers)
+
+    def _send_json(self, page: dict):
+        # congress.gov pages carry an ETag, a matching If-None-Match gets an empty 304
+        body = json.dumps(page).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(b"", status=304, headers={"ETag": etag})
+        self._send(body, headers={"ETag": etag})
+
+    def do_GET(self):
+        fixtures: Fixtures = self.server.fixtures
+        if self._flake():
+            return self._send(b"", "text/plain", 503, {"Retry-After": "0"})
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        path = url.path
+        if path == "/v3/congress/current":
+            return self._send_json({"congress": {"number": fixtures.congress}})
+        if path.startswith("/v3/member/congress/"):
+            offset, limit = int(query.get("offset", 0)), int(query.get("limit", 20))
+            page = {"members": fixtures.members[offset:offset + limit], "pagination": {"count": len(fixtures.members)}}
+            return self._send_json(page)
+        if path == f"/public_disc/financial-pdfs/{fixtures.year}FD.zip":
+            return self._send_file(fixtures.fd_zip, "application/zip")
+        if path.startswith("/public_disc/financial-pdfs/") and path.endswith(".pdf"):
+            return self._send_file(fixtures.pdfs[path.rsplit("/", 1)[1][:-4]], "application/pdf")
+        if path == "/search/home/":
+            form = '<form><input type="hidden" name="csrfmiddlewaretoken" value="bench"></form>'
+            return self._send(form.encode(), "text/html", headers={"Set-Cookie": "csrftoken=bench; Path=/"})
+        if path.startswith("/search/view/"):
+            page = fixtures.report_pages[path.rstrip("/").rsplit("/", 1)[1]]
+            if isinstance(page, list):
+                page = "".join(f'<img class="filingImage" src="{self.server.url}{src}">' for src in page)
+            return self._send(page.encode(), "text/html")
+        if path.startswith("/media/"):
+            return self._send_file(fixtures.gifs[path.rsplit("/", 1)[1]], "image/gif")
+        self._send(b"{}", status=404)
+
+    def do_HEAD(self):
+        fixtures: Fixtures = self.server.fixtures
+        if urlsplit(self.path).path != f"/public_disc/financial-pdfs/{fixtures.year}FD.zip":
+            return self._send(b"", status=404)
+        etag = f'"{len(fixtures.fd_zip)}"'
+        time.sleep(self.server.latency)
+        self.send_response(304 if self.headers.get("If-None-Match") == etag else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0" if self.headers.get("If-None-Match") == etag else str(len(fixtures.fd_zip)))
+        self.end_headers()
+
+    def do_POST(self):
+        fixtures: Fixtures = self.server.fixtures
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = urlsplit(self.path).path
+        if self._flake():
+            return self._send(b"", "text/plain", 503, {"Retry-After": "0"})
+        if path == "/search/home/":
+            return self._send(b"", "text/html", headers={"Set-Cookie": "sessionid=bench; Path=/"})
+        if path == "/search/report/data/":
+            form = dict(parse_qsl(body.decode()))
+            start, length = int(form["start"]), min(int(form["length"]), self.server.page_cap)
+            submitted = datetime.strptime(form["submitted_start_date"], "%m/%d/%Y %H:%M:%S")
+            reports = [report for report in fixtures.reports if datetime.strptime(report[4], "%m/%d/%Y") >= submitted]
+            page = {"recordsTotal": len(fixtures.reports), "recordsFiltered": len(reports),
+                    "data": reports[start:start + length]}
+            return self._send(json.dumps(page).encode())
+        if path == "/v1/chat/completions":
+            request = json.loads(body)
+            images = sum(part.get("type") == "image_url" for message in request["messages"]
+                         if isinstance(message["content"], list) for part in message["content"])
+            rows = [{"Asset": f"Asset {i}", "Asset Type": "Stocks", "Owner": "Self", "Value": VALUES[i % len(VALUES)],
+                     "Income Type": "Dividends", "Income": "$201 - $1,000"} for i in range(images * 5)]
+            answer = {"choices": [{"message": {"content": json.dumps(rows)}}], "usage": {"total_tokens": 765 * images + 50 * len(rows)}}
+            return self._send(json.dumps(answer).encode())
+        self._send(b"{}", status=404)
+
+def _point_at(url: str):
+    # send every request of the pipeline to the stand-in
+    members.BASE_URL = f"{url}/v3"
+    holdings.HOUSE_ROOT = url
+    holdings.ROOT = url
+    holdings.LANDING_PAGE_URL = f"{url}/search/home/"
+    holdings.SEARCH_PAGE_URL = f"{url}/search/"
+    holdings.REPORTS_URL = f"{url}/search/report/data/"
+
+class _RequestTimer:
+    """ Latency and bytes of every HTTP request made through requests in this process. """
+
+    def __init__(self):
+        self.latencies = []
+        self.bytes = 0
+        self.lock = threading.Lock()
+        send = requests.Session.send
+        timer = self
+
+        def _timed_send(session, request, **kwargs):
+            start = time.perf_counter()
+            response = send(session, request, **kwargs)
+            # streamed bodies are read by the caller, count what the header promises
+            length = int(response.headers.get("Content-Length", 0))
+            with timer.lock:
+                timer.latencies.append(time.perf_counter() - start)
+                timer.bytes += length
+            return response
+        requests.Session.send = _timed_send
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else None
+        return {"requests": len(latencies), "bytes_in": self.bytes,
+                "latency_ms": {"p50": pick(0.5), "p95": pick(0.95), "max": pick(1.0)}}
+
+def _completed(chamber_fp: Path) -> tuple[int, int]:
+    manifest = Manifest(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.json", chamber_fp)
+    statuses = [entry["status"] for entry in manifest.entries.values()]
+    return statuses.count("complete"), statuses.count("failed")
+
+def _stage_members(fixtures: Fixtures, data_fp: Path) -> tuple[int, dict]:
+    timer = _RequestTimer()
+    cache = ResponseCache(data_fp / "cache" / "congress.gov")
+    parsed = parse_members(get_members(fixtures.congress, cache=cache), fixtures.congress)
+    setup_members(parsed, data_fp)
+    return len(parsed), timer.summary()
+
+def _stage_load_HoR_FD_XML(fixtures: Fixtures, data_fp: Path) -> tuple[int, dict, list]:
+    timer = _RequestTimer()
+    chamber_fp = data_fp / HOR_DATA_FP.name
+    download_zip(fixtures.year, chamber_fp=chamber_fp)
+    fds = load_HoR_FD_XML(fixtures.year, chamber_fp)
+    return len(fds), timer.summary(), fds
+
+def _stage_save_HoR_FD_PDF(fixtures: Fixtures, data_fp: Path, fds: list, download_workers: int, raster_workers: int) -> tuple[int, dict]:
+    timer = _RequestTimer()
+    chamber_fp = data_fp / HOR_DATA_FP.name
+    save_HoR_FD_PDF(fixtures.year, fds, download_workers, raster_workers, chamber_fp)
+    completed, failed = _completed(chamber_fp)
+    return completed, timer.summary() | {"failed": failed}
+
+def _stage_scrape_senate(fixtures: Fixtures, data_fp: Path, workers: int) -> tuple[int, dict]:
+    timer = _RequestTimer()
+    chamber_fp = data_fp / SENATE_DATA_FP.name
+    scrape_senate(fixtures.year, workers, chamber_fp)
+    completed, failed = _completed(chamber_fp)
+    return completed, timer.summary() | {"failed": failed}
+
+def _stage_extract(data_fp: Path, url: str, workers: int) -> tuple[int, dict]:
+    # imported here so the other stages run without the model SDKs installed
+    import extract
+    from images import PayloadCache
+    extract.OPENAI_URL = f"{url}/v1/chat/completions"
+    timer = _RequestTimer()
+    extractor = extract.BatchExtractor(workers=workers, requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12,
+                                       cache=PayloadCache(data_fp / "cache" / "payloads"),
+                                       results=extract.ExtractionCache(data_fp / "cache" / "extractions"))
+    jobs, failed = 0, []
+    for chamber_fp in [data_fp / HOR_DATA_FP.name, data_fp / SENATE_DATA_FP.name]:
+        chamber_jobs = extract.find_extraction_jobs(chamber_fp)
+        with HoldingsStore(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.extract.log") as store:
+            failed += extractor.run(chamber_jobs, store)
+        jobs += len(chamber_jobs)
+    return jobs - len(failed), timer.summary() | {"failed": len(failed), "tokens": extractor.tokens_used}
+
+def _fetch_all(fixtures: Fixtures, url: str, data_fp: Path, workers: int) -> tuple[int, dict]:
+    # the FD zip through a resumable download, then every PDF through the pooled session.
+    # no backoff, this measures the retry path and not the sleeps
+    transport.RETRY_BASE_DELAY = 0.0
+    zip_fp = transport.download(f"{url}/public_disc/financial-pdfs/{fixtures.year}FD.zip", data_fp / "FD.zip")
+    assert zip_fp.read_bytes() == fixtures.fd_zip, "resumed download differs from the served zip"
+    def _pdf(doc_id: str) -> bool:
+        response = transport.get(f"{url}/public_disc/financial-pdfs/{doc_id}.pdf")
+        return response.status_code == 200 and response.content == fixtures.pdfs[doc_id]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        intact = sum(executor.map(_pdf, fixtures.pdfs))
+    counters = metrics.METRICS.snapshot()["counters"]
+    return 1 + intact, {"retries": int(counters.get("http_retries", 0)), "resumes": int(counters.get("download_resumes", 0))}
+
+def bench_transport(fixtures: Fixtures, latency: float, flaky: float, workers: int) -> dict:
+    """ Fetch every file of the stand-in while a flaky share of its responses fail or get cut off. """
+    print(f"Transport: {len(fixtures.pdfs) + 1} files, {flaky:.0%} flaky, {latency * 1000:.0f} ms stand-in latency")
+    server = StandIn(fixtures, latency, flaky=flaky)
+    ret = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        seconds, rss, (items, stats) = _run_isolated(_fetch_all, fixtures, server.url, Path(tmp), workers)
+    assert items == len(fixtures.pdfs) + 1, f"only {items} of {len(fixtures.pdfs) + 1} files came through intact"
+    ret["fetch"] = _result(seconds, rss, items, **stats)
+    print(f"  {'fetch':<16} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  {items} files  "
+          f"{stats['retries']} retries  {stats['resumes']} resumed downloads")
+    server.shutdown()
+    return ret
+
+def _stream(fixtures: Fixtures, data_fp: Path, url: str, download_workers: int, raster_workers: int,
+            senate_workers: int, extract_workers: int) -> tuple[int, dict]:
+    from pipeline import Pipeline
+    try:
+        import extract
+        from images import PayloadCache
+    except ImportError:
+        # no model SDKs, stream the scrape alone
+        extractor, extract_workers = None, 0
+    else:
+        extract.OPENAI_URL = f"{url}/v1/chat/completions"
+        extractor = extract.BatchExtractor(workers=extract_workers, requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12,
+                                           cache=PayloadCache(data_fp / "cache" / "payloads"),
+                                           results=extract.ExtractionCache(data_fp / "cache" / "extractions"))
+    pipeline = Pipeline(fixtures.year, data_fp, download_workers, raster_workers, senate_workers, extract_workers,
+                        extractor=extractor)
+    pipeline.run()
+    first = round(pipeline.first_result, 4) if pipeline.first_result is not None else None
+    return len(pipeline.hit), {"failed": len(pipeline.failed), "extracted": pipeline.extracted, "first_result_seconds": first}
+
+def bench_pipeline(fixtures: Fixtures, latency: float, download_workers: int, raster_workers: int,
+                   senate_workers: int, extract_workers: int, flaky: float = 0.0) -> dict:
+    print(f"Pipeline: {len(fixtures.members)} members, {len(fixtures.pdfs)} House PDFs, "
+          f"{len(fixtures.reports)} Senate reports, {latency * 1000:.0f} ms stand-in latency")
+    server = StandIn(fixtures, latency, flaky=flaky)
+    _point_at(server.url)
+
+    ret = {}
+    fds = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_fp = Path(tmp)
+        stages = [
+            ("get_members", lambda: _stage_members(fixtures, data_fp)),
+            ("load_HoR_FD_XML", lambda: _stage_load_HoR_FD_XML(fixtures, data_fp)),
+            ("save_HoR_FD_PDF", lambda: _stage_save_HoR_FD_PDF(fixtures, data_fp, fds, download_workers, raster_workers)),
+            ("scrape_senate", lambda: _stage_scrape_senate(fixtures, data_fp, senate_workers)),
+            ("extract", lambda: _stage_extract(data_fp, server.url, extract_workers)),
+        ]
+        for name, stage in stages:
+            try:
+                seconds, rss, (items, stats, *rest) = _run_isolated(stage)
+            except RuntimeError as e:
+                # later stages still run on whatever was written so far
+                ret[name] = {"error": str(e).strip().splitlines()[-1]}
+                print(f"  {name:<16} failed: {ret[name]['error']}")
+                continue
+            if rest:
+                fds = rest[0]
+            ret[name] = _result(seconds, rss, items, **stats)
+            print(f"  {name:<16} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  {items} items  "
+                  f"{stats['requests']} requests (p50 {stats['latency_ms']['p50']} ms)")
+
+    # the same work as one stream, both chambers at once and extraction overlapping the downloads
+    with tempfile.TemporaryDirectory() as tmp:
+        data_fp = Path(tmp)
+        try:
+            _run_isolated(_stage_members, fixtures, data_fp)
+            seconds, rss, (items, stats) = _run_isolated(_stream, fixtures, data_fp, server.url, download_workers,
+                                                         raster_workers, senate_workers, extract_workers)
+        except RuntimeError as e:
+            ret["stream"] = {"error": str(e).strip().splitlines()[-1]}
+            print(f"  {'stream':<16} failed: {ret['stream']['error']}")
+        else:
+            ret["stream"] = _result(seconds, rss, items, **stats)
+            print(f"  {'stream':<16} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  {items} items  "
+                  f"first after {stats['first_result_seconds']}s  {stats['extracted']} extracted")
+    server.shutdown()
+    return ret
+
+
+# =============================================
+# ========== Rasterizing long filings =========
+# =============================================
+# One long filing rasterized the way it used to be, every page a PIL image before any is
+# written, and in windows of pages. At a tenth of the pages and at all of them, so the
+# windowed peak RSS staying put while the other grows is visible.
+
+def _rasterize_at_once(content: bytes, container_fp: Path, raster: RasterConfig) -> int:
+    # _rasterize_HoR_PDF before it rendered in windows
+    pages = []
+    for image in convert_from_bytes(content, dpi=raster.dpi):
+        page = io.BytesIO()
+        image.save(page, raster.fmt.upper())
+        pages.append(page.getvalue())
+    return len(write_pages(container_fp, pages)["pages"])
+
+def _rasterize_windowed(content: bytes, container_fp: Path, raster: RasterConfig) -> int:
+    return len(_rasterize_HoR_PDF(content, container_fp, "05-13-2022", raster)["pages"])
+
+def bench_rasterize(pages: int, dpi: int) -> dict:
+    if shutil.which("pdftoppm") is None:
+        print("Rasterize: skipped, needs poppler's pdftoppm")
+        return {}
+    raster = RasterConfig(dpi=dpi)
+    ret = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (max(pages // 10, 1), pages):
+            content = make_text_pdf([f"Page {i // 60 + 1:>4}  Asset {i} Inc (ABC)  SP  $15,001 - $50,000  Dividends"
+                                     for i in range(n * 60)])
+            print(f"Rasterize: {n} pages at {dpi} dpi, {len(content) / 1e6:.1f} MB PDF")
+            for name, fn in [("at_once", _rasterize_at_once), ("windowed", _rasterize_windowed)]:
+                seconds, rss, rasterized = _run_isolated(fn, content, Path(tmp) / f"{name}.pages", raster)
+                assert rasterized == n, f"{name} rasterized {rasterized} of {n} pages"
+                ret[f"{name}_{n}"] = _result(seconds, rss, rasterized)
+                print(f"  {name:<10} {seconds:8.2f}s  peak RSS {rss:8.1f} MB  {rasterized / seconds:.1f} pages/s")
+    return ret
+
+def compare(results: dict, baseline: dict, threshold: float = 1.1):
+    """ Print every benchmark that got slower than threshold times its baseline. """
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            before = baseline.get(name, {}).get(stage, {})
+            if "seconds" not in result or "seconds" not in before:
+                continue
+            ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"  {name}/{stage:<16} {before['seconds']:8.2f}s -> {result['seconds']:8.2f}s  x{ratio:.2f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the scraping pipeline")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--out", type=Path, default=None, help="write the results here as json")
+    parser.add_argument("--compare", type=Path, default=None, help="json written by an earlier --out to compare with")
+    parser.add_argument("--rows", type=int, default=150_000, help="rows in the synthetic House FD XML")
+    parser.add_argument("--senate-reports", type=Path, default=None,
+                        help="folder of saved e-filed Senate report pages (*.html), synthetic reports if not given")
+    parser.add_argument("--holdings", type=int, default=1_000_000, help="rows in the synthetic holdings")
+    parser.add_argument("--house-members", type=int, default=200, help="House members in the pipeline fixtures")
+    parser.add_argument("--senators", type=int, default=50, help="senators in the pipeline fixtures")
+    parser.add_argument("--scanned", type=float, default=0.5, help="share of filings that are scans")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stand-in server waits per request")
+    parser.add_argument("--flaky", type=float, default=0.0,
+                        help="share of stand-in responses that are 503s or cut off (transport always runs with at least 0.1)")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--raster-workers", type=int, default=4)
+    parser.add_argument("--senate-workers", type=int, default=4)
+    parser.add_argument("--extract-workers", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=500, help="pages of the long filing rasterized")
+    parser.add_argument("--dpi", type=int, default=RasterConfig.dpi)
+    args = parser.parse_args()
+    # the stand-in is local, never send it through a proxy
+    os.environ["NO_PROXY"] = "127.0.0.1"
+
+    results = {}
+    if "xml" in args.only:
+        results["xml"] = bench_HoR_FD_XML(args.rows)
+    if "senate_assets" in args.only:
+        if args.senate_reports is not None:
+            reports = [fp.read_text() for fp in sorted(args.senate_reports.glob("*.html"))]
+        else:
+            reports = [make_senate_report(rows, seed) for seed, rows in enumerate([5, 20, 50, 100, 300] * 40)]
+        results["senate_assets"] = bench_senate_assets(reports)
+    if "aggregate" in args.only:
+        results["aggregate"] = bench_aggregate(args.holdings)
+    if "transport" in args.only or "pipeline" in args.only:
+        fixtures = Fixtures(year=2022, congress=117, house_members=args.house_members, senators=args.senators,
+                            scanned=args.scanned, scan_pages=3, assets=40)
+    if "transport" in args.only:
+        results["transport"] = bench_transport(fixtures, args.latency, max(args.flaky, 0.1), args.download_workers)
+    if "pipeline" in args.only:
+        results["pipeline"] = bench_pipeline(fixtures, args.latency, args.download_workers, args.raster_workers,
+                                             args.senate_workers, args.extract_workers, args.flaky)
+    if "rasterize" in args.only:
+        results["rasterize"] = bench_rasterize(args.pages, args.dpi)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            compare(results, json.load(file)["results"])
+    if args.out is not None:
+        meta = {"time": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                "platform": platform.platform(), "cpus": os.cpu_count(), "args": {k: str(v) for k, v in vars(args).items()}}
+        atomic_write_json(args.out, {"meta": meta, "results": results}, indent=4)
+        print(f"wrote {args.out}")
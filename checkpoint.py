@@ -0,0 +1,162 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional
+
+from utils import JsonJournal, atomic_write_json, sha256_file
+
+# Manifest layout, one entry per filing (House DocID or Senate report link):
+# {
+#     "10045231": {
+#         "status": "complete",  # "running", "failed" or "complete"
+#         "stages": {
+#             "download": {"sha256": "..."},
+#             "rasterize": {"files": {"PELOSI, NANCY/10045231.pages": "..."},  # sha256 of what the stage wrote
+#                           "stamps": {"PELOSI, NANCY/10045231.pages": [size, mtime_ns]}},
+#             "holdings": {}
+#         },
+#         "error": None
+#     }
+# }
+# Changes are appended to {path}.log and folded into the file every so often, see JsonJournal.
+
+class Manifest:
+    """ Per-filing checkpoint of finished stages and the hashes of what they wrote. """
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = root  # files are recorded relative to this folder
+        self.lock = threading.Lock()
+        self.journal = JsonJournal(path)
+        self.entries: dict[str, dict] = self.journal.data
+
+    def _entry(self, key: str) -> dict:
+        return self.entries.setdefault(key, {"status": "running", "stages": {}, "error": None})
+
+    def _save(self, key: str):
+        self.journal.set(key, self.entries[key])
+
+    def compact(self):
+        with self.lock:
+            self.journal.compact()
+
+    def done(self, key: str) -> bool:
+        """
+        True if the filing completed and every file it wrote is still on disk unchanged. Files whose size
+        and mtime are as recorded count as unchanged, the others are hashed.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry["status"] != "complete":
+            return False
+        for stage in entry["stages"].values():
+            stamps = stage.get("stamps", {})
+            for rel_fp, digest in stage.get("files", {}).items():
+                fp = self.root / rel_fp
+                if not fp.exists():
+                    return False
+                stat = fp.stat()
+                if stamps.get(rel_fp) != [stat.st_size, stat.st_mtime_ns] and sha256_file(fp) != digest:
+                    return False
+        return True
+
+    def record(self, key: str, stage: str, files: Iterable[Path] = (), content: Optional[bytes] = None):
+        stage_entry = {}
+        if content is not None:
+            stage_entry["sha256"] = hashlib.sha256(content).hexdigest()
+        files = list(files)
+        if files:
+            stage_entry["files"] = {str(fp.relative_to(self.root)): sha256_file(fp) for fp in files}
+            stage_entry["stamps"] = {str(fp.relative_to(self.root)): [fp.stat().st_size, fp.stat().st_mtime_ns] for fp in files}
+        with self.lock:
+            entry = self._entry(key)
+            entry["status"] = "running"
+            entry["stages"][stage] = stage_entry
+            self._save(key)
+
+    def complete(self, key: str):
+        with self.lock:
+            entry = self._entry(key)
+            entry["status"] = "complete"
+            entry["error"] = None
+            self._save(key)
+
+    def fail(self, key: str, stage: str, error: BaseException):
+        with self.lock:
+            entry = self._entry(key)
+            entry["status"] = "failed"
+            entry["error"] = f"{stage}: {error!r}"
+            # drop the failed stage so a rerun redoes it
+            entry["stages"].pop(stage, None)
+            self._save(key)
+
+# Watermark layout, one per source (a chamber folder):
+# {
+#     "filings": {"10045231": "5-13-2022", ...},  # ingested filings and the filing date they had
+#     "validators": {"etag": "...", "last_modified": "..."},  # of the source's index as of the last complete run
+#     "incomplete": {"10045232": "4-2-2022", ...}  # filings a delta run saw but didn't finish, listed again until they do
+# }
+
+class Watermark:
+    """ What a source has already ingested, so a delta run only fetches new or re-filed filings. """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        if path.exists():
+            with open(path, "r") as file:
+                data = json.load(file)
+        else:
+            data = {"filings": {}, "validators": {}}
+        self.filings: dict[str, str] = data["filings"]
+        self.validators: dict[str, Optional[str]] = data["validators"]
+        self.incomplete: dict[str, str] = data.get("incomplete", {})
+        # filings looked at by this run, and the index validators to keep if all of them complete
+        self.seen: dict[str, str] = {}
+        self.pending_validators: Optional[dict] = None
+
+    def wants(self, key: str, date: str) -> bool:
+        """ True if the filing is new or was filed again since it was ingested. """
+        with self.lock:
+            self.seen[key] = date
+        return self.filings.get(key) != date
+
+    @staticmethod
+    def _dates(dates: Iterable[str]) -> list[datetime]:
+        ret = []
+        for date in dates:
+            try:
+                ret.append(datetime.strptime(date.replace('/', '-'), "%m-%d-%Y"))
+            except ValueError:
+                continue
+        return ret
+
+    def since(self, overlap: timedelta = timedelta(days=1)) -> Optional[datetime]:
+        """
+        The latest filing date ingested less overlap, so filings submitted later the same day are listed
+        again, or the earliest date of a filing left incomplete if that is earlier.
+        """
+        ingested, incomplete = self._dates(self.filings.values()), self._dates(self.incomplete.values())
+        starts = ([max(ingested) - overlap] if ingested else []) + ([min(incomplete)] if incomplete else [])
+        return min(starts) if starts else None
+
+    def advance(self, manifest: Manifest):
+        """
+        Add the seen filings the manifest has as complete and remember the others as incomplete,
+        then keep the pending validators if none were left behind.
+        """
+        with self.lock:
+            for key, date in self.seen.items():
+                if manifest.entries.get(key, {}).get("status") == "complete":
+                    self.filings[key] = date
+                    self.incomplete.pop(key, None)
+                elif self.filings.get(key) != date:
+                    self.incomplete[key] = date
+            if self.pending_validators is not None and all(self.filings.get(key) == date for key, date in self.seen.items()):
+                self.validators = self.pending_validators
+            self.seen = {}
+            self.pending_validators = None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(self.path, {"filings": self.filings, "validators": self.validators,
+                                          "incomplete": self.incomplete}, indent=4)
@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from utils import BASE_DATA_FP, chamber_fps, parse_amount_range
+
+EXPORT_FP = BASE_DATA_FP / 'export' / 'holdings.sqlite'
+
+# members(partition, chamber, key) 1-n filings(member_id, filing) 1-n holdings(filing_id, row),
+# holdings_flat joins them back into one wide table for analysis
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    member_id INTEGER PRIMARY KEY,
+    partition TEXT NOT NULL,      -- '' for data/{chamber}, '2022' for data/2022/{chamber}
+    year INTEGER,
+    chamber TEXT NOT NULL,
+    key TEXT NOT NULL,
+    full_name TEXT,
+    party TEXT,
+    state_district TEXT,
+    json_mtime_ns INTEGER,        -- the member json is skipped while these are unchanged
+    json_size INTEGER,
+    UNIQUE (partition, chamber, key)
+);
+CREATE TABLE IF NOT EXISTS filings (
+    filing_id INTEGER PRIMARY KEY,
+    member_id INTEGER NOT NULL REFERENCES members(member_id),
+    filing TEXT NOT NULL,         -- House DocID or Senate report name
+    link TEXT,
+    date TEXT,
+    filed TEXT,                   -- date as YYYY-MM-DD
+    digest TEXT NOT NULL,         -- sha256 of the filing's json, rows are rewritten when it changes
+    UNIQUE (member_id, filing)
+);
+CREATE TABLE IF NOT EXISTS holdings (
+    filing_id INTEGER NOT NULL REFERENCES filings(filing_id),
+    row INTEGER NOT NULL,
+    asset TEXT,
+    asset_type TEXT,
+    owner TEXT,
+    value TEXT,
+    value_low INTEGER,
+    value_high INTEGER,
+    income_type TEXT,
+    income TEXT,
+    income_low INTEGER,
+    income_high INTEGER,
+    PRIMARY KEY (filing_id, row)
+);
+CREATE INDEX IF NOT EXISTS holdings_asset ON holdings(asset);
+CREATE VIEW IF NOT EXISTS holdings_flat AS
+    SELECT m.partition, m.year, m.chamber, m.key, m.full_name, m.party, m.state_district,
+           f.filing, f.link, f.filed, h.*
+    FROM holdings h JOIN filings f USING (filing_id) JOIN members m USING (member_id);
+"""
+
+def _iso_date(date: Optional[str]) -> Optional[str]:
+    # "05-13-2022" from the Senate and "5-13-2022" from the House
+    for fmt in ("%m-%d-%Y", "%m/%d/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date, fmt).date().isoformat()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def _holding_row(filing_id: int, i: int, row: dict) -> tuple:
+    value_low, value_high = parse_amount_range(row.get('Value'))
+    income_low, income_high = parse_amount_range(row.get('Income'))
+    return (filing_id, i, row.get('Asset'), row.get('Asset Type'), row.get('Owner'),
+            row.get('Value'), value_low, value_high,
+            row.get('Income Type'), row.get('Income'), income_low, income_high)
+
+class Exporter:
+    """
+    Flattens the member json files of every chamber folder into SQLite. Re-exporting only
+    reads member files that changed since the last export and only rewrites the rows of
+    filings whose json changed.
+    """
+
+    def __init__(self, db_fp: Path = EXPORT_FP):
+        db_fp.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(db_fp)
+        self.db.executescript(SCHEMA)
+        self.filings_written = 0
+        self.filings_removed = 0
+
+    def _member_id(self, partition: str, chamber_fp: Path, data: dict) -> int:
+        self.db.execute(
+            "INSERT INTO members (partition, year, chamber, key, full_name, party, state_district) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (partition, chamber, key) DO UPDATE SET "
+            "full_name = excluded.full_name, party = excluded.party, state_district = excluded.state_district",
+            (partition, int(partition) if partition else None, chamber_fp.name, data['key'],
+             data.get('full_name'), data.get('party'), data.get('state_district')))
+        (member_id,) = self.db.execute("SELECT member_id FROM members WHERE partition = ? AND chamber = ? AND key = ?",
+                                       (partition, chamber_fp.name, data['key'])).fetchone()
+        return member_id
+
+    def export_member(self, partition: str, chamber_fp: Path, json_fp: Path) -> bool:
+        """ Export one member json, False if it hasn't changed since the last export. """
+        stat = json_fp.stat()
+        seen = self.db.execute("SELECT json_mtime_ns, json_size FROM members WHERE partition = ? AND chamber = ? AND key = ?",
+                               (partition, chamber_fp.name, json_fp.parent.name)).fetchone()
+        if seen == (stat.st_mtime_ns, stat.st_size):
+            return False
+
+        with open(json_fp, "r") as file:
+            data = json.load(file)
+        member_id = self._member_id(partition, chamber_fp, data)
+
+        digests = dict(self.db.execute("SELECT filing, digest FROM filings WHERE member_id = ?", (member_id,)))
+        for filing, entry in data['holdings'].items():
+            digest = hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+            if digests.pop(filing, None) == digest:
+                continue
+            self._remove_filing(member_id, filing)
+            cursor = self.db.execute(
+                "INSERT INTO filings (member_id, filing, link, date, filed, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (member_id, filing, entry.get('link'), entry.get('date'), _iso_date(entry.get('date')), digest))
+            self.db.executemany("INSERT INTO holdings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (_holding_row(cursor.lastrowid, i, row) for i, row in enumerate(entry.get('data') or [])))
+            self.filings_written += 1
+        # filings that are gone from the json
+        for filing in digests:
+            self._remove_filing(member_id, filing)
+            self.filings_removed += 1
+
+        self.db.execute("UPDATE members SET json_mtime_ns = ?, json_size = ? WHERE member_id = ?",
+                        (stat.st_mtime_ns, stat.st_size, member_id))
+        return True
+
+    def _remove_filing(self, member_id: int, filing: str):
+        self.db.execute("DELETE FROM holdings WHERE filing_id IN (SELECT filing_id FROM filings WHERE member_id = ? AND filing = ?)",
+                        (member_id, filing))
+        self.db.execute("DELETE FROM filings WHERE member_id = ? AND filing = ?", (member_id, filing))
+
+    def export(self, chamber_fps: list[Path]) -> int:
+        """ Export every member of the chamber folders, returns how many member files were read. """
+        changed = 0
+        for chamber_fp in chamber_fps:
+            partition = '' if chamber_fp.parent == BASE_DATA_FP else chamber_fp.parent.name
+            for member_fp in sorted(p for p in chamber_fp.iterdir() if p.is_dir()):
+                json_fp = member_fp / f"{member_fp.name}.json"
+                if json_fp.exists():
+                    # one transaction per member, an interrupted export picks up where it stopped
+                    with self.db:
+                        changed += self.export_member(partition, chamber_fp, json_fp)
+        return changed
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export scraped holdings into a SQLite database")
+    parser.add_argument("--db", type=Path, default=EXPORT_FP, help="database to create or update")
+    args = parser.parse_args()
+
+    with Exporter(args.db) as exporter:
+        changed = exporter.export(chamber_fps())
+        print(f"read {changed} changed member files, wrote {exporter.filings_written} filings, removed {exporter.filings_removed}")
@@ -1,28 +1,55 @@
 import openai
 import google.generativeai as genai
+import argparse
 import base64
+import hashlib
+import json
+import math
+import os
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, astuple
 from pathlib import Path
+from typing import Optional
+from tqdm import tqdm
 
-from utils import SENATE_DATA_FP, HOR_DATA_FP
+import metrics
+import transport
+from utils import (
+    BASE_DATA_FP,
+    CACHE_FP,
+    RateLimiter,
+    atomic_write_json,
+    chamber_fps,
+    checkpoint_fp,
+    remove_directory
+)
+from store import HoldingsStore
+from images import PayloadCache, PreprocessConfig
+from pages import Catalog, PageContainer
 
-# OPENAI_API_KEY = "YOUR_OPENAI_API_KEY"
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY")
 # GEMINI_API_KEY = "YOUR_GEMINI_API_KEY"
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+MODEL = "gpt-4o"
+MAX_TOKENS = 4096 # long asset lists get cut off with less
+IMAGE_TOKENS = 765 # gpt-4o cost of one 1024x1024 high detail image
+
+# a request with a few pages of images can take minutes to answer
+OPENAI_TIMEOUT = (10, 300)
+
 model = genai.GenerativeModel('gemini-pro-vision')
 
 # TODO: google.auth.exceptions.DefaultCredentialsError: Your default credentials were not found.
 # To set up Application Default Credentials, see
 # https://cloud.google.com/docs/authentication/external/set-up-adc for more information.
-def google_chat_with_images(image_paths: list[Path]):
-    def _encode_image(image_path):
-        from PIL import Image
-        image = Image.open(image_path).convert('RGB')
-        return image.tobytes()
-
+def google_chat_with_images(image_paths: list[Path], cache: Optional[PayloadCache] = None):
+    cache = cache or PayloadCache()
     images = [{
-        'mime_type': 'image/jpeg',
-        'data': encode_image(path)
-    } for path in image_paths]
+        'mime_type': cache.config.mime_type,
+        'data': base64.b64decode(payload)
+    } for payload in cache.prepare(image_paths)]
 
     few_shot_examples = [
         {
@@ -66,10 +93,21 @@ def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def openai_chat_with_images(image_paths: list[str | Path], system_text: str, user_text: str):
+def openai_chat_with_images(image_paths: list[str | Path], system_text: str, user_text: str,
+                            max_tokens: int = MAX_TOKENS, session: Optional[requests.Session] = None,
+                            cache: Optional[PayloadCache] = None) -> requests.Response:
     image_paths = [Path(path) if isinstance(path, str) else path for path in image_paths]
-    base64_images = [encode_image(image_path) for image_path in image_paths]
+    if cache is None:
+        mime_type = "image/jpeg"
+        base64_images = [encode_image(image_path) for image_path in image_paths]
+    else:
+        # preprocessed, deduplicated and cached across runs
+        mime_type = cache.config.mime_type
+        base64_images = cache.prepare(image_paths)
+    return openai_chat_with_payloads(base64_images, mime_type, system_text, user_text, max_tokens, session)
 
+def openai_chat_with_payloads(base64_images: list[str], mime_type: str, system_text: str, user_text: str,
+                              max_tokens: int = MAX_TOKENS, session: Optional[requests.Session] = None) -> requests.Response:
     # add text
     content = [{
         "type": "text",
@@ -81,7 +119,7 @@ def openai_chat_with_images(image_paths: list[str | Path], system_text: str, use
         content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
+                    "url": f"data:{mime_type};base64,{base64_image}"
             }
         })
 
@@ -91,9 +129,9 @@ def openai_chat_with_images(image_paths: list[str | Path], system_text: str, use
     ]
 
     payload = {
-        "model": "gpt-4o",
+        "model": MODEL,
         "messages": messages,
-        "max_tokens": 300
+        "max_tokens": max_tokens
     }
 
     headers = {
@@ -101,67 +139,274 @@ def openai_chat_with_images(image_paths: list[str | Path], system_text: str, use
         "Authorization": f"Bearer {OPENAI_API_KEY}"
     }
 
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-    return response.json()
+    # without a session of its own the call goes through the shared transport, which retries 429/5xx
+    session = session or transport.session(OPENAI_URL)
+    return session.post(OPENAI_URL, headers=headers, json=payload, timeout=OPENAI_TIMEOUT)
 
-def disclosure_openai_VLM(image_paths):
-    # define few-shot structure
-    few_shot_examples = [
-        {
-            "Asset": "Capital One",
-            "Asset Type": "Bank Deposit",
-            "Owner": "Joint",
-            "Value": "$100,001 - $250,000",
-            "Income Type": "Interest",
-            "Income": "$201 - $1,000"
-        },
-        {
-            "Asset": "Bank of America",
-            "Asset Type": "Bank Deposit",
-            "Owner": "Joint",
-            "Value": "$1,001 - $15,000",
-            "Income Type": "None",
-            "Income": "None (or less than $201)"
-        },
-        {
-            "Asset": "Bank of America",
-            "Asset Type": "Bank Deposit",
-            "Owner": "Joint",
-            "Value": "$1,001 - $15,000",
-            "Income Type": "None",
-            "Income": "None (or less than $201)"
-        },
-    ]
+# define few-shot structure
+FEW_SHOT_EXAMPLES = [
+    {
+        "Asset": "Capital One",
+        "Asset Type": "Bank Deposit",
+        "Owner": "Joint",
+        "Value": "$100,001 - $250,000",
+        "Income Type": "Interest",
+        "Income": "$201 - $1,000"
+    },
+    {
+        "Asset": "Bank of America",
+        "Asset Type": "Bank Deposit",
+        "Owner": "Joint",
+        "Value": "$1,001 - $15,000",
+        "Income Type": "None",
+        "Income": "None (or less than $201)"
+    },
+    {
+        "Asset": "Bank of America",
+        "Asset Type": "Bank Deposit",
+        "Owner": "Joint",
+        "Value": "$1,001 - $15,000",
+        "Income Type": "None",
+        "Income": "None (or less than $201)"
+    },
+]
 
-    # TODO: maybe try fewshot in user_text
-    # add few-shot to system_text
-    system_text = f"""
+# TODO: maybe try fewshot in user_text
+# add few-shot to system_text
+SYSTEM_TEXT = f"""
 You are an assistant that extracts information from images and returns results in JSON format with the following structure:
 
-{few_shot_examples}
+{FEW_SHOT_EXAMPLES}
 """
 
-    # user prompt
-    user_text = "The images are from a financial disclosure of a congress member. Please extract the assets of the congress member for me in JSON format. Please make sure to only answer with the JSON."
+# user prompt
+USER_TEXT = "The images are from a financial disclosure of a congress member. Please extract the assets of the congress member for me in JSON format. Please make sure to only answer with the JSON."
+
+def disclosure_openai_VLM(image_paths):
+    return openai_chat_with_images(image_paths, SYSTEM_TEXT, USER_TEXT).json()
 
-    return openai_chat_with_images(image_paths, system_text, user_text)
 
-if __name__ == "__main__":
-    senate_folders = [f for f in SENATE_DATA_FP.iterdir() if f.is_dir()]
-    hor_folders = [f for f in HOR_DATA_FP.iterdir() if f.is_dir()]
+# =============================================
+# ============ Batch extraction ===============
+# =============================================
+
+# bump when SYSTEM_TEXT/USER_TEXT change in a way that should invalidate cached results
+PROMPT_VERSION = 1
+
+class ExtractionCache:
+    """
+    Parsed model answers keyed by the hash of the page images, the prompts, the model and everything
+    else that shapes the answer (preprocessing, max_tokens), so an unchanged filing never costs another call. Entries live under v{prompt_version}/ so a prompt
+    version can be dropped as a whole.
+    """
+
+    def __init__(self, path: Path = CACHE_FP / 'extractions', prompt_version: int = PROMPT_VERSION):
+        self.path = path
+        self.prompt_version = prompt_version
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, page_hashes: list[str], system_text: str, user_text: str, model: str,
+            config: PreprocessConfig, max_tokens: int) -> str:
+        """ page_hashes are the sha256 hex digests of the page images, in page order. """
+        h = hashlib.sha256()
+        # the model sees the preprocessed pages, and a low max_tokens cuts its answer short
+        for text in (system_text, user_text, model, repr(astuple(config)), str(max_tokens)):
+            h.update(text.encode())
+            h.update(b"\0")
+        for page_hash in page_hashes:
+            h.update(bytes.fromhex(page_hash))
+        return h.hexdigest()
+
+    def _fp(self, key: str) -> Path:
+        return self.path / f"v{self.prompt_version}" / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        fp = self._fp(key)
+        if not fp.exists():
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        with open(fp, "r") as file:
+            return json.load(file)
+
+    def put(self, key: str, rows: list[dict]):
+        fp = self._fp(key)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(fp, rows)
+
+    def invalidate(self, prompt_version: Optional[int] = None):
+        version_fp = self.path / f"v{self.prompt_version if prompt_version is None else prompt_version}"
+        if version_fp.exists():
+            remove_directory(version_fp)
+
+def _page_ranges(n: int, size: int) -> list[range]:
+    # the page indices of an n page filing, size pages per request
+    return [range(i, min(i + size, n)) for i in range(0, n, size)]
+
+@dataclass
+class ExtractionJob:
+    json_fp: Path # member json
+    key: str # DocID or Senate report name in holdings
+    entry: dict # holdings[key] as it is now
+    container_fp: Path # the filing's packed pages
+    pages: int
+
+def find_extraction_jobs(chamber_fp: Path) -> list[ExtractionJob]:
+    """ Filings in the chamber's page catalog that have no extracted holdings yet. """
+    jobs = []
+    holdings_by_member = {}
+    for rel_fp, filing in Catalog(chamber_fp).entries.items():
+        member_fp = chamber_fp / filing['member']
+        json_fp = member_fp / f"{member_fp.name}.json"
+        if filing['member'] not in holdings_by_member:
+            with open(json_fp, "r") as file:
+                holdings_by_member[filing['member']] = json.load(file)['holdings']
+        entry = holdings_by_member[filing['member']].get(filing['filing'])
+        if entry is None or entry['data'] or filing['pages'] == 0:
+            continue
+        jobs.append(ExtractionJob(json_fp=json_fp, key=filing['filing'], entry=entry,
+                                  container_fp=chamber_fp / rel_fp, pages=filing['pages']))
+    return jobs
 
-    senate_names = [f.name for f in senate_folders]
-    hor_names = [f.name for f in hor_folders]
+def parse_VLM_json(text: str) -> list[dict]:
+    """ Pull the asset rows out of a model answer, which may be wrapped in a ```json fence. """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        # {"assets": [...]} or a single row
+        lists = [value for value in data.values() if isinstance(value, list)]
+        data = lists[0] if lists else [data]
+    return [row for row in data if isinstance(row, dict)]
 
-    senate_folders_with_images = [f for f in senate_folders if any(ff.is_dir() for ff in f.iterdir())]
-    hor_folders_with_images = [f for f in hor_folders if any(ff.is_dir() for ff in f.iterdir())]
+class BatchExtractor:
+    """
+    Runs VLM extraction for many filings at once. Long filings are split into groups of
+    pages_per_request pages, every request waits on a requests-per-minute and an estimated
+    tokens-per-minute budget, and 429/5xx/connection errors are retried with jittered backoff.
+    """
+
+    def __init__(self, workers: int = 8, requests_per_minute: float = 500, tokens_per_minute: float = 30_000,
+                 pages_per_request: int = 4, max_tokens: int = MAX_TOKENS, max_retries: int = 5,
+                 cache: Optional[PayloadCache] = None, results: Optional[ExtractionCache] = None):
+        self.workers = workers
+        self.cache = cache or PayloadCache()
+        self.results = results or ExtractionCache()
+        self.pages_per_request = pages_per_request
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.request_limiter = RateLimiter(requests_per_minute / 60, burst=max(workers, 1))
+        self.token_limiter = RateLimiter(tokens_per_minute / 60, burst=tokens_per_minute)
+        self.tokens_used = 0
+        self.lock = threading.Lock()
+        # retries wait on the requests-per-minute limit again, the token budget is spent once per request
+        self.session = transport.RetryingSession(OPENAI_TIMEOUT, max_retries, pool_size=max(workers, 1), limiter=self.request_limiter)
+
+    def _estimate_tokens(self, pages: int) -> int:
+        # ~4 characters per text token, a page at high detail is ~765 image tokens
+        return (len(SYSTEM_TEXT) + len(USER_TEXT)) // 4 + IMAGE_TOKENS * pages + self.max_tokens
+
+    def _request(self, container_fp: Path, pages: range) -> list[dict]:
+        with PageContainer(container_fp) as container:
+            page_hashes = [container.pages[i]['sha256'] for i in pages]
+            key = self.results.key(page_hashes, SYSTEM_TEXT, USER_TEXT, MODEL, self.cache.config, self.max_tokens)
+            if (rows := self.results.get(key)) is not None:
+                return rows
+
+            # pages are read straight out of the mmap, and not at all if their payload is cached
+            views = [container.page(i) for i in pages]
+            try:
+                payloads = self.cache.prepare(views, page_hashes)
+            finally:
+                for view in views:
+                    view.release()
+
+        rows = self._call(payloads)
+        self.results.put(key, rows)
+        return rows
+
+    def _call(self, payloads: list[str]) -> list[dict]:
+        # the session retries 429/5xx/connection errors itself
+        self.token_limiter.wait(OPENAI_URL, cost=self._estimate_tokens(len(payloads)))
+        with metrics.stage("extract.request"):
+            response = openai_chat_with_payloads(payloads, self.cache.config.mime_type, SYSTEM_TEXT, USER_TEXT,
+                                                 self.max_tokens, self.session)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"Received status code {response.status_code} from {OPENAI_URL}: {response.text}")
+
+        data = response.json()
+        tokens = data.get('usage', {}).get('total_tokens', 0)
+        metrics.count("tokens", tokens)
+        metrics.count("pages_extracted", len(payloads))
+        with self.lock:
+            self.tokens_used += tokens
+        return parse_VLM_json(data['choices'][0]['message']['content'])
+
+    def extract(self, job: ExtractionJob) -> list[dict]:
+        """ Rows of a single filing, its page groups one after another on the calling thread. """
+        return [row for pages in _page_ranges(job.pages, self.pages_per_request) for row in self._request(job.container_fp, pages)]
+
+    def run(self, jobs: list[ExtractionJob], store: HoldingsStore) -> list[ExtractionJob]:
+        """ Extract every job and merge the rows into holdings[key]["data"], returns the jobs that failed. """
+        chunks = {}
+        for job in jobs:
+            for pages in _page_ranges(job.pages, self.pages_per_request):
+                chunks[(job.key, job.json_fp, pages.start)] = (job.container_fp, pages)
+
+        results: dict[tuple, dict[int, list[dict]]] = {(job.key, job.json_fp): {} for job in jobs}
+        remaining = {(job.key, job.json_fp): math.ceil(job.pages / self.pages_per_request) for job in jobs}
+        by_id = {(job.key, job.json_fp): job for job in jobs}
+        failed = []
+
+        desc = "Extracting holdings from disclosure images"
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, tqdm(total=len(jobs), desc=desc) as pbar:
+            futures = {executor.submit(self._request, *chunk): chunk_id for chunk_id, chunk in chunks.items()}
+            for future in as_completed(futures):
+                key, json_fp, i = futures[future]
+                job_id = (key, json_fp)
+                if job_id not in results:
+                    continue # another chunk of this filing failed
+                if future.exception() is not None:
+                    print(f"extraction failed for {json_fp.parent.name} {key}: {future.exception()!r}")
+                    failed.append(by_id[job_id])
+                    del results[job_id]
+                    pbar.update()
+                    continue
+
+                results[job_id][i] = future.result()
+                remaining[job_id] -= 1
+                if remaining[job_id] == 0:
+                    # merge the page groups back in page order
+                    rows = [row for _, part in sorted(results.pop(job_id).items()) for row in part]
+                    store.update(json_fp, {key: by_id[job_id].entry | {"data": rows}})
+                    pbar.update()
+
+        return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract holdings from scanned disclosures with a VLM")
+    parser.add_argument("--invalidate-prompt-version", type=int, default=None,
+                        help="drop cached results of this prompt version before extracting")
+    parser.add_argument("--profile", nargs="*", default=[], metavar="STAGE",
+                        help="run these stages under cProfile, e.g. extract.request images.preprocess")
+    args = parser.parse_args()
 
-    # print([f.name for f in hor_folders_with_images])
-    for folder in hor_folders_with_images:
-        image_paths = [image for f in folder.iterdir() if f.is_dir() for image in f.iterdir()]
-        google_chat_with_images(image_paths)
+    metrics.reset(args.profile)
 
-    # for folder in hor_folders_with_images:
-    #     image_paths = [image for f in folder.iterdir() if f.is_dir() for image in f.iterdir()]
-    #     print(disclosure_openai_VLM(image_paths))
-    #     exit(0)
+    extractor = BatchExtractor()
+    if args.invalidate_prompt_version is not None:
+        extractor.results.invalidate(args.invalidate_prompt_version)
+    for chamber_fp in chamber_fps():
+        jobs = find_extraction_jobs(chamber_fp)
+        with HoldingsStore(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.extract.log") as store:
+            failed = extractor.run(jobs, store)
+        print(f"{chamber_fp.relative_to(BASE_DATA_FP)}: extracted {len(jobs) - len(failed)} of {len(jobs)} filings")
+    print(f"tokens used: {extractor.tokens_used}")
+    print(f"page cache: {extractor.cache.hits} hits, {extractor.cache.misses} misses")
+    print(f"result cache: {extractor.results.hits} hits, {extractor.results.misses} misses")
+    metrics.METRICS.write("extract")
@@ -1,23 +1,40 @@
-from typing import Union
+from typing import Union, Optional, Iterator, NamedTuple
 from dataclasses import dataclass
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from bs4 import BeautifulSoup
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_path
 from tqdm import tqdm
+import xml.etree.ElementTree as ET
+import lxml.etree
+import lxml.html
 import zipfile
-import io
+import shutil
+import subprocess
+import tempfile
+import os
+import re
+import queue
+import math
 import json
 import requests
 
 from utils import (
     HOR_DATA_FP,
     SENATE_DATA_FP,
-    update_holding_json,
+    checkpoint_fp,
     remove_directory,
     standardize_name,
-    interchange_name,
-    house_last_names, senate_last_names
+    NameIndex,
+    RateLimiter,
+    parse_amount_range
 )
-from members import Member
+from checkpoint import Manifest, Watermark
+from store import HoldingsStore
+from pages import Catalog, PageWriter, write_pages, SUFFIX as PAGES_SUFFIX
+import metrics
+import transport
 
 
 
@@ -25,113 +42,465 @@ from members import Member
 # ========= House of Representatives ==========
 # =============================================
 # https://disclosures-clerk.house.gov/
+HOUSE_ROOT = 'https://disclosures-clerk.house.gov'
 
-def download_zip(year: int):
-    url = f"https://disclosures-clerk.house.gov/public_disc/financial-pdfs/{year}FD.zip"
-    unzip_folder = HOR_DATA_FP / f"{year}FD"
-    unzip_folder.mkdir(parents=True, exist_ok=True)
+CHUNK_SIZE = 1 << 20
 
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise requests.HTTPError(f"Failed to download from {url}")
+def download_zip(year: int, include_txt: bool = False, chamber_fp: Path = HOR_DATA_FP):
+    url = f"{HOUSE_ROOT}/public_disc/financial-pdfs/{year}FD.zip"
+    unzip_folder = chamber_fp / f"{year}FD"
+    unzip_folder.mkdir(parents=True, exist_ok=True)
+    zip_fp = unzip_folder / f"{year}FD.zip"
+
+    # spool the archive to disk so memory stays flat regardless of its size, resumed if the connection drops
+    with metrics.stage("house.download_index"):
+        transport.download(url, zip_fp, CHUNK_SIZE)
+
+    # only the index is needed, skip everything else in the archive
+    wanted = [f"{year}FD.xml"] + ([f"{year}FD.txt"] if include_txt else [])
+    with metrics.stage("house.extract_index"), zipfile.ZipFile(zip_fp, "r") as zip_ref:
+        for name in wanted:
+            with zip_ref.open(name) as src, open(unzip_folder / name, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    zip_fp.unlink()
+
+    print(f"Extracted {wanted} to {unzip_folder}")
+
+
+class HouseFiling(NamedTuple):
+    Last: Optional[str]
+    First: Optional[str]
+    DocID: str
+    Year: str
+    FilingDate: str
+    FilingType: str
+
+def iter_HoR_FD_XML(xml_fp: Path, filing_types: Optional[tuple[str, ...]] = ('O',)) -> Iterator[HouseFiling]:
+    """ Stream <Member> records out of the FD index, keeping only the given filing types (None keeps all). """
+    context = ET.iterparse(xml_fp, events=("start", "end"))
+    _, root = next(context)
+
+    fields = {}
+    for event, elem in context:
+        if event != "end":
+            continue
+        if elem.tag == 'Member':
+            if filing_types is None or fields.get('FilingType') in filing_types:
+                yield HouseFiling(*(fields.get(field) for field in HouseFiling._fields))
+            fields = {}
+            # drop the parsed members so memory stays flat
+            root.clear()
+        elif elem.tag in HouseFiling._fields:
+            fields[elem.tag] = elem.text.strip() if elem.text else None
+
+def load_HoR_FD_XML(year: int, chamber_fp: Path = HOR_DATA_FP, filing_types: tuple[str, ...] = ('O',)) -> list[HouseFiling]:
+    xml_fp = chamber_fp / f'{year}FD/{year}FD.xml'
+    assert xml_fp.exists()
 
-    zip_content = io.BytesIO(response.content)
-    with zipfile.ZipFile(zip_content, "r") as zip_ref:
-        zip_ref.extractall(unzip_folder)
+    # NOTE: 'FilingType': 'O' refers to Annual Report
+    with metrics.stage("house.load_index"):
+        fds = list(iter_HoR_FD_XML(xml_fp, filing_types=filing_types))
 
-    print(f"Extracted files to {unzip_folder}")
+    if len(fds) == 0:
+        raise RuntimeError(f"there are no {filing_types} reports for House of Representatives for {year=}")
 
+    # remove the FD stuff
+    remove_directory(chamber_fp / f'{year}FD')
+    print(f"Removed files from {chamber_fp / f'{year}FD'}")
 
-def load_HoR_FD_XML(year: int) -> list[dict]:
-    xml_fp = HOR_DATA_FP / f'{year}FD/{year}FD.xml'
-    assert xml_fp.exists()
+    return fds
 
-    with open(xml_fp, 'r') as file:
-        content = file.read()
+# a delta run also takes amendments (A) and the termination reports of departing members (T), both list holdings.
+# periodic transaction reports (P) list trades and live under ptr-pdfs/ instead
+DELTA_FILING_TYPES = ('O', 'A', 'T')
+
+def load_HoR_index(year: int, chamber_fp: Path = HOR_DATA_FP, watermark: Optional[Watermark] = None) -> Optional[list[HouseFiling]]:
+    """
+    Download and load the year's FD index. With a watermark the index is only downloaded if it changed
+    since the last delta run that left nothing behind (None if it didn't), and DELTA_FILING_TYPES are kept.
+    """
+    if watermark is None:
+        download_zip(year=year, chamber_fp=chamber_fp)
+        return load_HoR_FD_XML(year=year, chamber_fp=chamber_fp)
+
+    changed, watermark.pending_validators = transport.check(f"{HOUSE_ROOT}/public_disc/financial-pdfs/{year}FD.zip",
+                                                            watermark.validators)
+    if not changed:
+        return None
+    download_zip(year=year, chamber_fp=chamber_fp)
+    return load_HoR_FD_XML(year=year, chamber_fp=chamber_fp, filing_types=DELTA_FILING_TYPES)
+
+def watermark_for(chamber_fp: Path) -> Watermark:
+    return Watermark(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.watermark.json")
 
-    soup = BeautifulSoup(content, 'xml')
+@dataclass
+class HouseDisclosure:
+    member_fp: Path
+    doc_id: str
+    filing_date: str
+    pdf_link: str
+    filing_type: str = 'O'
 
-    fds = [{child.name: child.text.strip() if child.text else None for child in member.find_all()} \
-           for member in soup.find_all('Member')]
+    @property
+    def container_fp(self) -> Path:
+        return self.member_fp / f"{self.doc_id}{PAGES_SUFFIX}"
 
-    # NOTE: 'FilingType': 'O' refers to Annual Report
-    fds = [fd for fd in fds if fd['FilingType'] == 'O']
 
-    if len(fds) == 0:
-        raise RuntimeError(f"there are no Annual Reports for House of Representatives for {year=}")
+def _download_HoR_PDF(pdf_link: str) -> bytes:
+    with metrics.stage("house.download_pdf"):
+        response = transport.get(pdf_link)
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Failed to download {pdf_link}")
+    return response.content
+
+@dataclass(frozen=True)
+class RasterConfig:
+    dpi: int = 200  # pdf2image's default, what earlier runs rasterized at
+    fmt: str = "jpeg"  # anything pdftoppm writes: jpeg, png, tiff
+    window: int = 8  # pages per pdftoppm call, the most pages on disk at once
+
+def _rasterize_HoR_PDF(content: bytes, container_fp: Path, filing_date: str, raster: RasterConfig = RasterConfig()) -> dict:
+    """
+    Render the PDF raster.window pages at a time, pdftoppm encodes them straight to files that are packed
+    and deleted before the next window. Memory doesn't grow with the page count, a filing can run to hundreds.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_fp = Path(tmp) / "filing.pdf"
+        pdf_fp.write_bytes(content)
+        pages = pdfinfo_from_path(pdf_fp)["Pages"]
+        with PageWriter(container_fp, {"date": filing_date}) as writer:
+            for first in range(1, pages + 1, raster.window):
+                with metrics.stage("house.rasterize"):
+                    page_fps = convert_from_path(pdf_fp, dpi=raster.dpi, fmt=raster.fmt, first_page=first,
+                                                 last_page=min(first + raster.window - 1, pages), output_folder=tmp,
+                                                 output_file="page", paths_only=True)
+                with metrics.stage("house.write_pages"):
+                    for page_fp in page_fps:
+                        with open(page_fp, "rb") as file:
+                            writer.add(file.read())
+                        os.remove(page_fp)
+    metrics.count("pages_rasterized", pages)
+    return writer.header
+
+# Schedule A codes of e-filed House reports
+HOUSE_OWNERS = {'': 'Self', 'SP': 'Spouse', 'JT': 'Joint', 'DC': 'Child'}
+HOUSE_ASSET_TYPES = {
+    'AB': 'Asset-Backed Securities', 'BA': 'Bank Deposit', 'BK': 'Brokerage Account',
+    'CO': 'Collectibles', 'CS': 'Corporate Securities', 'CT': 'Cryptocurrency', 'DB': 'Defined Benefit Pension',
+    'DO': 'Debts Owed to the Filer', 'DS': 'Delaware Statutory Trust', 'EF': 'Exchange Traded Fund',
+    'EQ': 'Excepted/Qualified Blind Trust', 'ET': 'Exchange Traded Note', 'FA': 'Farms',
+    'FE': 'Foreign Exchange', 'FN': 'Fixed Annuity', 'FU': 'Futures', 'GS': 'Government Securities',
+    'HE': 'Hedge Funds & Private Equity', 'HN': 'Hedge Funds & Private Equity (Non-EIF)', 'IC': 'Investment Club',
+    'IH': 'IRA (Held in Cash)', 'IP': 'Intellectual Property & Royalties', 'IR': 'IRA', 'MA': 'Managed Accounts',
+    'MF': 'Mutual Funds', 'MO': 'Ownership Interest (Holding Investments)', 'OI': 'Ownership Interest (Engaged in a Trade or Business)',
+    'OL': 'Other Liability', 'OP': 'Options', 'OT': 'Other', 'PE': 'Pensions', 'PM': 'Precious Metals',
+    'PS': 'Stock (Not Publicly Traded)', 'RE': 'Real Estate Invest. Trust (REIT)', 'RP': 'Real Property',
+    'RS': 'Restricted Stock Units (RSUs)', 'SA': 'Stock Appreciation Right', 'ST': 'Stocks',
+    'TR': 'Trust', 'VA': 'Variable Annuity', 'VI': 'Variable Insurance', 'WU': 'Whole/Universal Insurance',
+    '5C': '529 College Savings Plan', '5F': '529 Prepaid Tuition Plan', '5P': '529 Portfolio',
+}
+_TEXT_CHUNK_RE = re.compile(r'\S+(?: \S+)*') # runs of words separated by single spaces
+_ASSET_CODE_RE = re.compile(r'\s*\[([0-9A-Z]{2})\]\s*$')
+_SCHEDULE_A_END_RE = re.compile(r'^\s*Schedule [B-J]\b')
+_HOUSE_TEXT_SKIP = ('Location:', 'Description:', 'Comments:', 'Filing ID', '* For the complete list', 'Filing Status:', 'Subholding of:')
+# the Tx. > $1,000? checkbox as pdftotext prints it, run into a wide income cell when there's no gap before it
+_HOUSE_TX_CHECKBOX = re.compile(r'\s*gfedcb?$')
+# a whole Value or Income cell. A cell that isn't one either wraps onto the next line or was split in the wrong place
+_HOUSE_AMOUNT_RE = re.compile(r'(?:Spouse/DC )?(?:\$[\d,]+(?:\.\d\d)? - \$[\d,]+(?:\.\d\d)?|(?:Over )?\$[\d,]+(?:\.\d\d)?'
+                              r'|None(?: \(or less than \$[\d,]+\))?|Undetermined)')
+
+def _HoR_PDF_text(content: bytes) -> str:
+    """ Text layer of a PDF with the layout kept, empty for scans. Uses poppler, which pdf2image needs anyway. """
+    with metrics.stage("house.pdf_text"), tempfile.NamedTemporaryFile(suffix=".pdf") as pdf:
+        pdf.write(content)
+        pdf.flush()
+        result = subprocess.run(["pdftotext", "-layout", pdf.name, "-"], capture_output=True)
+    return result.stdout.decode("utf-8", errors="ignore") if result.returncode == 0 else ""
+
+def parse_HoR_schedule_A(text: str) -> list[dict]:
+    """
+    Parse the Schedule A asset table out of the layout text of an e-filed House report into the
+    rows disclosure_api gives for Senate reports. Empty if the text has no such table.
+    """
+    rows = []
+    columns = None
+    header = False  # on the lines the header's titles wrap onto
+    in_schedule = False
+    for line in text.splitlines():
+        if 'Schedule A' in line:
+            in_schedule = True
+            continue
+        if not in_schedule:
+            continue
+        if _SCHEDULE_A_END_RE.match(line):
+            break
+
+        # the table header repeats on every page, the column starts are where its titles begin
+        if 'Owner' in line and 'Value of Asset' in line:
+            income_type = line.index('Income Type')
+            income = line.index('Income', income_type + len('Income Type'))
+            # the preceding year's income and the "Tx. > $1,000?" checkbox, when the layout has them, are
+            # columns of their own so their text (the checkbox prints as gfedc) doesn't run into the income
+            columns = [0, line.index('Owner'), line.index('Value of Asset'), income_type, income,
+                       line.find('Income', income + len('Income')), line.find('Tx.')]
+            header = True
+            continue
+        if columns is None or not line.strip() or line.strip().startswith(_HOUSE_TEXT_SKIP):
+            continue
 
-    # remove the FD stuff
-    remove_directory(HOR_DATA_FP / f'{year}FD')
-    print(f"Removed files from {HOR_DATA_FP / f'{year}FD'}")
+        cells = [[] for _ in columns]
+        for chunk in _TEXT_CHUNK_RE.finditer(line):
+            # the rightmost column starting at or slightly right of the chunk
+            column = max(i for i, start in enumerate(columns) if i == 0 or 0 <= start <= chunk.start() + 2)
+            cells[column].append(chunk.group())
+        asset, owner, value, income_type, income = (" ".join(cell) for cell in cells[:5])
+        income = _HOUSE_TX_CHECKBOX.sub('', income)
+        # "Current Year to", "Filing", "$1,000?" of a wrapped header only have text right of the income type
+        if header and not (asset or owner or value or income_type):
+            continue
+        header = False
+
+        # a row starts on the line with its asset and value, the lines after it continue the wrapped cells.
+        # a value wrapped mid-range ("$250,001 -") continues on the next line along with the asset name
+        complete = not rows or _HOUSE_AMOUNT_RE.fullmatch(rows[-1]['Value'])
+        if asset and complete and value.startswith(('$', 'None', 'Undetermined', 'Over', 'Spouse/DC')):
+            rows.append({'Asset': asset, 'Owner': owner, 'Value': value, 'Income Type': income_type, 'Income': income})
+        elif rows:
+            for key, part in [('Asset', asset), ('Owner', owner), ('Value', value), ('Income Type', income_type), ('Income', income)]:
+                if part:
+                    rows[-1][key] = f"{rows[-1][key]} {part}".strip()
 
-    return fds
+    ret = []
+    for row in rows:
+        match = _ASSET_CODE_RE.search(row['Asset'])
+        asset_type = HOUSE_ASSET_TYPES.get(match.group(1), match.group(1)) if match else ''
+        ret.append({
+            'Asset': _ASSET_CODE_RE.sub('', row['Asset']),
+            'Asset Type': asset_type,
+            'Owner': HOUSE_OWNERS.get(row['Owner'], row['Owner']),
+            'Value': row['Value'],
+            'Income Type': row['Income Type'],
+            'Income': row['Income'],
+        })
+    return ret
 
-def save_HoR_FD_PDF(year: int, fds: list[dict]):
-    desc = "Scraping financial disclosures for members in House of Representatives"
-    missed = []
+def _HoR_rows_valid(rows: list[dict]) -> bool:
+    """ Whether every row has an asset and whole amounts, else the columns were split in the wrong places. """
+    for row in rows:
+        if not row['Asset'] or not _HOUSE_AMOUNT_RE.fullmatch(row['Value']):
+            return False
+        if row['Value'] != 'Undetermined' and parse_amount_range(row['Value']) == (None, None):
+            return False
+        if row['Income'] and not _HOUSE_AMOUNT_RE.fullmatch(row['Income']):
+            return False
+    return True
+
+def _process_HoR_PDF(content: bytes, container_fp: Path, filing_date: str,
+                     raster: RasterConfig = RasterConfig()) -> tuple[Optional[list[dict]], Optional[dict]]:
+    """
+    Returns (rows, None) for a PDF with a parsable text layer, otherwise rasterizes it and returns (None, header).
+    Rows that don't look right are rasterized too, for the VLM to read instead.
+    """
+    text = _HoR_PDF_text(content)
+    with metrics.stage("house.parse_text"):
+        rows = parse_HoR_schedule_A(text)
+    if rows and _HoR_rows_valid(rows):
+        metrics.count("filings_text")
+        return rows, None
+    if rows:
+        metrics.count("filings_text_rejected")
+    metrics.count("filings_scanned")
+    return None, _rasterize_HoR_PDF(content, container_fp, filing_date, raster)
+
+def _record_pages(key: str, container_fp: Path, header: dict, date: str, manifest: Manifest, catalog: Catalog, stage: str):
+    manifest.record(key, stage, files=[container_fp])
+    catalog.add(container_fp, header, date)
+
+def _record_HoR_result(disclosure: HouseDisclosure, rows: Optional[list[dict]], header: Optional[dict],
+                       manifest: Manifest, catalog: Catalog):
+    if rows is not None:
+        # parsed from the text layer, nothing was rasterized
+        manifest.record(disclosure.doc_id, "text", content=json.dumps(rows).encode())
+    else:
+        _record_pages(disclosure.doc_id, disclosure.container_fp, header, disclosure.filing_date, manifest, catalog, "rasterize")
+
+def _save_HoR_holding(disclosure: HouseDisclosure, store: HoldingsStore, data: Optional[list[dict]] = None):
+    # dump member json info
+    json_data = {disclosure.doc_id: {"data": data or [], "link": disclosure.pdf_link, "date": disclosure.filing_date}}
+    # annual reports keep their original shape, amendments and termination reports say what they are
+    if disclosure.filing_type != 'O':
+        json_data[disclosure.doc_id]["type"] = disclosure.filing_type
+    json_fp = disclosure.member_fp / f"{disclosure.member_fp.name}.json"
+    store.update(json_fp, json_data)
+
+def _scrape_HoR_serial(disclosures: list[HouseDisclosure], desc: str, manifest: Manifest, store: HoldingsStore,
+                       catalog: Catalog, raster: RasterConfig = RasterConfig()) -> tuple[list[str], list[str]]:
+    hit = []
+    failed = []
+    for disclosure in tqdm(disclosures, desc=desc):
+        stage = "download"
+        try:
+            content = _download_HoR_PDF(disclosure.pdf_link)
+            manifest.record(disclosure.doc_id, stage, content=content)
+            stage = "rasterize"
+            rows, header = _process_HoR_PDF(content, disclosure.container_fp, disclosure.filing_date, raster)
+            _record_HoR_result(disclosure, rows, header, manifest, catalog)
+            stage = "holdings"
+            _save_HoR_holding(disclosure, store, rows)
+            manifest.record(disclosure.doc_id, stage)
+        except Exception as e:
+            manifest.fail(disclosure.doc_id, stage, e)
+            failed.append(disclosure.doc_id)
+            continue
+        manifest.complete(disclosure.doc_id)
+        hit.append(disclosure.member_fp.name)
+    return hit, failed
+
+def _scrape_HoR_concurrent(disclosures: list[HouseDisclosure], desc: str, manifest: Manifest, store: HoldingsStore,
+                           catalog: Catalog, download_workers: int, raster_workers: int,
+                           raster: RasterConfig = RasterConfig()) -> tuple[list[str], list[str]]:
+    # downloads run on a thread pool and feed a process pool that parses the text layer or rasterizes,
+    # the number of PDFs held in memory is bounded by max_in_flight
+    max_in_flight = 2 * (download_workers + raster_workers)
+    queue = iter(disclosures)
+    pending = {}
     hit = []
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+         ProcessPoolExecutor(max_workers=raster_workers) as rasters, \
+         tqdm(total=len(disclosures), desc=desc) as pbar:
+
+        def _submit_download() -> bool:
+            disclosure = next(queue, None)
+            if disclosure is None:
+                return False
+            pending[downloads.submit(_download_HoR_PDF, disclosure.pdf_link)] = ("download", disclosure)
+            return True
+
+        while len(pending) < max_in_flight and _submit_download(): pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, disclosure = pending.pop(future)
+                try:
+                    if stage == "download":
+                        content = future.result()
+                        manifest.record(disclosure.doc_id, stage, content=content)
+                        future = rasters.submit(metrics.call_recorded, _process_HoR_PDF, content, disclosure.container_fp,
+                                                disclosure.filing_date, raster)
+                        pending[future] = ("rasterize", disclosure)
+                        continue
+                    # the worker's metrics come back with its result
+                    (rows, header), snapshot = future.result()
+                    metrics.merge(snapshot)
+                    _record_HoR_result(disclosure, rows, header, manifest, catalog)
+                    stage = "holdings"
+                    _save_HoR_holding(disclosure, store, rows)
+                    manifest.record(disclosure.doc_id, stage)
+                except Exception as e:
+                    manifest.fail(disclosure.doc_id, stage, e)
+                    failed.append(disclosure.doc_id)
+                else:
+                    manifest.complete(disclosure.doc_id)
+                    hit.append(disclosure.member_fp.name)
+                pbar.update()
+            while len(pending) < max_in_flight and _submit_download(): pass
+
+    return hit, failed
+
+def _HoR_disclosures(fds: list[HouseFiling], chamber_fp: Path, manifest: Manifest,
+                     watermark: Optional[Watermark] = None) -> tuple[list[HouseDisclosure], list, list, list]:
+    """ The filings still to scrape, plus the hit, missed and unsure members. """
+    hit = []
+    missed = []
     unsure = []
-    last_names = house_last_names()
-    for disclosure in tqdm(fds, desc=desc):
+    disclosures = []
+    names = NameIndex.from_directory(chamber_fp)
+    for disclosure in fds:
         # unpack
-        last_name = standardize_name(disclosure['Last'])
-        first_name = standardize_name(disclosure['First'])
-        last_name, first_name = interchange_name(f"{last_name}, {first_name}").split(",")
-        first_name = first_name.strip()
-        last_name = last_name.strip()
-
-        doc_id = disclosure['DocID']
-        year = disclosure['Year']
-        filing_date = disclosure['FilingDate'].replace('/', '-')
-        pdf_link = f'https://disclosures-clerk.house.gov/public_disc/financial-pdfs/{year}/{doc_id}.pdf'
+        last_name = standardize_name(disclosure.Last)
+        first_name = standardize_name(disclosure.First)
 
-        key = f"{last_name}, {first_name}"
-        member_fp = HOR_DATA_FP / key
+        doc_id = disclosure.DocID
+        year = disclosure.Year
+        filing_date = disclosure.FilingDate.replace('/', '-')
+        pdf_link = f'{HOUSE_ROOT}/public_disc/financial-pdfs/{year}/{doc_id}.pdf'
 
         # missed
-        if not member_fp.exists():
-            missed.append(member_fp.name)
+        key = names.resolve(last_name, first_name)
+        if key is None:
+            missed.append(f"{last_name}, {first_name}")
             # unsure
-            if last_name in last_names:
-                unsure.append((f"{last_name}, {first_name}", last_names[last_name]))
+            if last_name in names.last_names:
+                unsure.append((f"{last_name}, {first_name}", names.last_names[last_name]))
             continue
+        member_fp = chamber_fp / key
 
-        # create folder for member and create a folder to store images
-        images_fp = member_fp / doc_id
-        images_fp.mkdir(parents=True, exist_ok=True)
-
-        response = requests.get(pdf_link)
-        if response.status_code != 200:
-            raise requests.HTTPError(f"Failed to download {pdf_link}")
-
-        images = convert_from_bytes(response.content)
-
-        for i, image in enumerate(images):
-            image_fp = images_fp / f"{filing_date}_{i}.jpg"
-            image.save(image_fp, 'JPEG')
+        # ingested by an earlier delta run, without rehashing what it wrote
+        if watermark is not None and not watermark.wants(doc_id, filing_date):
+            hit.append(member_fp.name)
+            continue
 
-        # dump member json info
-        json_data = {doc_id: {"data": [], "link": pdf_link, "date": filing_date}}
-        json_fp = member_fp / f"{member_fp.name}.json"
-        update_holding_json(json_fp, json_data)
+        # already scraped by a previous run
+        if manifest.done(doc_id):
+            hit.append(member_fp.name)
+            continue
 
-        hit.append(member_fp.name)
+        disclosures.append(HouseDisclosure(
+            member_fp=member_fp,
+            doc_id=doc_id,
+            filing_date=filing_date,
+            pdf_link=pdf_link,
+            filing_type=disclosure.FilingType
+        ))
+    return disclosures, hit, missed, unsure
+
+def save_HoR_FD_PDF(year: int, fds: list[HouseFiling], download_workers: int = 1, raster_workers: int = 1,
+                    chamber_fp: Path = HOR_DATA_FP, watermark: Optional[Watermark] = None, raster: RasterConfig = RasterConfig()):
+    desc = "Scraping financial disclosures for members in House of Representatives"
+    manifest = Manifest(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.json", chamber_fp)
+    catalog = Catalog(chamber_fp)
+    disclosures, hit, missed, unsure = _HoR_disclosures(fds, chamber_fp, manifest, watermark)
+    if watermark is not None:
+        print(f"delta: {len(disclosures)} new or amended filings")
+
+    with HoldingsStore(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.holdings.log") as store:
+        if download_workers <= 1 and raster_workers <= 1:
+            scraped, failed = _scrape_HoR_serial(disclosures, desc, manifest, store, catalog, raster)
+        else:
+            scraped, failed = _scrape_HoR_concurrent(disclosures, desc, manifest, store, catalog,
+                                                     max(download_workers, 1), max(raster_workers, 1), raster)
+    hit += scraped
+    manifest.compact()
+    catalog.compact()
+    if watermark is not None:
+        watermark.advance(manifest)
 
     print(f"hit: {sorted(hit)}")
     print(f"missed: {sorted(missed)}")
+    if failed:
+        print(f"failed (rerun to retry): {sorted(failed)}")
 
     return unsure
 
 
-def scrape_house_of_representatives(year: int) -> list:
-    # download FD description
-    download_zip(year=year)
+def scrape_house_of_representatives(year: int, download_workers: int = 1, raster_workers: int = 1,
+                                    chamber_fp: Path = HOR_DATA_FP, delta: bool = False,
+                                    raster: RasterConfig = RasterConfig()) -> list:
+    """ With delta only the filings that are new or were re-filed since the last delta run are scraped. """
+    watermark = watermark_for(chamber_fp) if delta else None
 
-    # scrape and load financial disclosures
-    fds = load_HoR_FD_XML(year=year)
+    # download FD description, scrape and load financial disclosures
+    fds = load_HoR_index(year, chamber_fp, watermark)
+    if fds is None:
+        print(f"delta: {year}FD.zip hasn't changed since the last run")
+        return []
 
-    # save to data/house_of_representatives/{year}
-    unsure = save_HoR_FD_PDF(year=year, fds=fds)
+    # save to {chamber_fp}/{member}
+    unsure = save_HoR_FD_PDF(year=year, fds=fds, download_workers=download_workers, raster_workers=raster_workers,
+                             chamber_fp=chamber_fp, watermark=watermark, raster=raster)
     return unsure
 
 
@@ -146,6 +515,9 @@ SEARCH_PAGE_URL = f'{ROOT}/search/'
 REPORTS_URL = f'{ROOT}/search/report/data/'
 
 BATCH_SIZE = 100
+MAX_BATCH_SIZE = 1000
+# shared by every session scraping efdsearch.senate.gov
+SENATE_REQUESTS_PER_SECOND = 5
 
 @dataclass
 class SenateMember:
@@ -172,6 +544,9 @@ def _csrf(client: requests.Session) -> str:
                 data=form_payload,
                 headers={'Referer': LANDING_PAGE_URL})
 
+    return _session_token(client)
+
+def _session_token(client: requests.Session) -> str:
     if 'csrftoken' in client.cookies:
         csrftoken = client.cookies['csrftoken']
     else:
@@ -179,14 +554,17 @@ def _csrf(client: requests.Session) -> str:
     return csrftoken
 
 
-def reports_api(client: requests.Session, offset: int, token: str, year: int) -> list[list[str]]:
-    """ Query the periodic transaction reports API. """
+def _reports_page(client: requests.Session, offset: int, token: str, year: int, length: int = BATCH_SIZE,
+                  since: Optional[datetime] = None) -> dict:
+    """ Query the periodic transaction reports API, the DataTables response also carries the record count. """
+    # reports submitted in year, or since a delta run's watermark
+    start = max(since, datetime(year, 1, 1)) if since is not None else datetime(year, 1, 1)
     login_data = {
         'start': str(offset),
-        'length': str(BATCH_SIZE),
+        'length': str(length),
         'report_types': '[7]', # Annual reports
         'filer_types': '[]', # 1 for Senator (not candidate)
-        'submitted_start_date': f'01/01/{year} 00:00:00',
+        'submitted_start_date': start.strftime('%m/%d/%Y 00:00:00'),
         'submitted_end_date': f'01/01/{year+1} 00:00:00',
         'candidate_state': '',
         'senator_state': '',
@@ -198,58 +576,286 @@ def reports_api(client: requests.Session, offset: int, token: str, year: int) ->
     response = client.post(REPORTS_URL,
                            data=login_data,
                            headers={'Referer': SEARCH_PAGE_URL})
-    return response.json()['data']
+    return response.json()
 
-def disclosure_api(client: requests.Session, member: SenateMember, full_url: str):
-    response = client.get(full_url)
+def reports_api(client: requests.Session, offset: int, token: str, year: int, length: int = BATCH_SIZE,
+                since: Optional[datetime] = None) -> list[list[str]]:
+    """ Query the periodic transaction reports API. """
+    return _reports_page(client, offset, token, year, length, since)['data']
+
+def search_reports(client: requests.Session, year: int, pool: Optional["SenateSessionPool"] = None,
+                   since: Optional[datetime] = None) -> list[list[str]]:
+    """
+    List every annual report filed in year. The first page gives the record count, the
+    remaining offsets are then fetched in pages sized to spread them over the pool.
+    """
+    with metrics.stage("senate.search"):
+        return _search_reports(client, year, pool, since)
+
+def _search_reports(client: requests.Session, year: int, pool: Optional["SenateSessionPool"],
+                    since: Optional[datetime]) -> list[list[str]]:
+    def _page(client: requests.Session, offset: int, length: int) -> list[list[str]]:
+        return reports_api(client, offset, _session_token(client), year, length, since)
+
+    first = _reports_page(client, 0, _session_token(client), year, since=since)
+    total = int(first['recordsFiltered'])
+    pages = {0: first['data']}
+
+    workers = pool.size if pool is not None else 1
+    offset = len(first['data'])
+    page_size = min(MAX_BATCH_SIZE, max(BATCH_SIZE, math.ceil((total - offset) / workers)))
+    todo = [(offset, min(page_size, total - offset)) for offset in range(offset, total, page_size)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while todo:
+            if pool is not None:
+                results = executor.map(lambda job: pool.run(_page, *job), todo)
+            else:
+                results = (_page(client, *job) for job in todo)
+            jobs, todo = todo, []
+            for (offset, length), rows in zip(jobs, results):
+                pages[offset] = rows
+                # the server capped the page length, fetch the rest of the page in pieces of that size
+                if 0 < len(rows) < length:
+                    todo += [(o, min(len(rows), offset + length - o)) for o in range(offset + len(rows), offset + length, len(rows))]
+
+    # merge in offset order, a report can show up twice if the listing shifted between pages
+    seen = set()
+    all_reports = []
+    for offset in sorted(pages):
+        for report in pages[offset]:
+            if report[3] not in seen:
+                seen.add(report[3])
+                all_reports.append(report)
+    return all_reports
+
+ASSETS_HEADING = 'Part 3. Assets'
+
+def _assets_sections(html: str) -> Iterator[str]:
+    # slice out every <section> holding an assets heading (long reports repeat it per page),
+    # so lxml never has to build the rest of the report
+    start = html.find(ASSETS_HEADING)
+    while start != -1:
+        section_start = html.rfind('<section', 0, start)
+        section_end = html.find('</section>', start)
+        if section_start == -1 or section_end == -1:
+            yield html
+            return
+        yield html[section_start:section_end + len('</section>')]
+        start = html.find(ASSETS_HEADING, section_end)
+
+def _cell_text(cell, separator: str = "") -> str:
+    # bs4's get_text, comments don't count as text
+    return separator.join(text for text in cell.itertext(lxml.etree.Element)).strip()
+
+def parse_assets(html: str) -> list[dict]:
+    """ Parse the assets table(s) of an e-filed Senate report. """
+    ret = []
+    for section in _assets_sections(html):
+        root = lxml.html.fromstring(section)
+        headings = [h3 for h3 in root.iter('h3') if h3.text_content() == ASSETS_HEADING]
+        for heading in headings:
+            section_element = next(heading.iterancestors('section'), root)
+            for table in section_element.iterfind('.//table[@id="grid_items"]'):
+                for row in table.iterfind('tbody//tr'):
+                    cells = row.findall('td')
+                    strong = next(cells[1].iter('strong'))
+                    ret.append({
+                    'Asset': _cell_text(strong), # strong -> only get bolded Asset title (no asset description)
+                    'Asset Type': _cell_text(cells[2], " ")[:-1],
+                    'Owner': _cell_text(cells[3]),
+                    'Value': _cell_text(cells[4]),
+                    'Income Type': _cell_text(cells[5]),
+                    'Income': _cell_text(cells[6]),
+                    })
+    return ret
 
-    webpage_soup = BeautifulSoup(response.text, 'html.parser')
+def _parse_disclosure(html: str, is_scanned: bool) -> Union[list[str], list[dict]]:
+    """ Return the page image urls of a scanned report, or the parsed assets of an e-filed one. """
+    # if the disclosure is scanned, we just fetch the images
+    if is_scanned:
+        with metrics.stage("senate.parse_scanned"):
+            webpage_soup = BeautifulSoup(html, 'html.parser')
+            return [img['src'] for img in webpage_soup.find_all('img', class_='filingImage')]
+
+    # otherwise, we'll parse the webpage for assets
+    with metrics.stage("senate.parse_assets"):
+        return parse_assets(html)
+
+def _fetch_gif(client: requests.Session, url: str) -> bytes:
+    with metrics.stage("senate.download_gif"):
+        response = client.get(url)
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Failed to download {url}")
+    return response.content
+
+def disclosure_api(client: requests.Session, member: SenateMember, full_url: str):
+    with metrics.stage("senate.download_report"):
+        response = client.get(full_url)
+    parsed = _parse_disclosure(response.text, member.is_scanned)
 
     # if the disclosure is scanned, we just fetch the images
     if member.is_scanned:
-        gif_urls = [img['src'] for img in webpage_soup.find_all('img', class_='filingImage')]
-        responses = [client.get(url) for url in gif_urls]
-        if any(response.status_code != 200 for response in responses):
-            raise requests.HTTPError(f"{member=} raise HTTP error")
-        return [response.content for response in responses]
+        return [_fetch_gif(client, url) for url in parsed]
+    return parsed
 
-    # otherwise, we'll parse the webpage for assets
-    assets_section = webpage_soup.find('h3', string='Part 3. Assets').find_parent('section')
-    table = assets_section.find('table', {'id': 'grid_items'})
 
-    ret = []
-    for row in table.tbody.find_all('tr'):
-        cells = row.find_all('td')
-        asset_data = {
-        'Asset': cells[1].find('strong').text.strip(), # strong -> only get bolded Asset title (no asset description)
-        'Asset Type': cells[2].get_text(separator=" ").strip()[:-1],
-        'Owner': cells[3].text.strip(),
-        'Value': cells[4].text.strip(),
-        'Income Type': cells[5].text.strip(),
-        'Income': cells[6].text.strip(),
-        }
-        ret.append(asset_data)
+@dataclass
+class SenateDisclosure:
+    member: SenateMember
+    disclosure_fp: Path
+    name: str
+    full_url: str
+
+class SenateSessionPool:
+    """ Sessions that have each passed the prohibition agreement, lent out one worker at a time. """
+
+    def __init__(self, clients: list[requests.Session]):
+        self.size = len(clients)
+        self.clients = queue.Queue()
+        for client in clients:
+            self.clients.put(client)
+
+    @classmethod
+    def create(cls, size: int, limiter: RateLimiter, client: Optional[requests.Session] = None) -> "SenateSessionPool":
+        clients = [client] if client is not None else []
+        while len(clients) < size:
+            client = transport.RetryingSession(limiter=limiter)
+            _csrf(client)
+            clients.append(client)
+        return cls(clients)
+
+    def run(self, fn, *args):
+        client = self.clients.get()
+        try:
+            return fn(client, *args)
+        finally:
+            self.clients.put(client)
+
+def _save_senate_disclosure(disclosure: SenateDisclosure, member_diclosure: list[Union[bytes, dict]],
+                            manifest: Manifest, store: HoldingsStore, catalog: Catalog):
+    member, full_url = disclosure.member, disclosure.full_url
+    if member.is_scanned:
+        assert all(isinstance(f, bytes) for f in member_diclosure), \
+        f"datatype is wrong for {member.html}"
 
-    return ret
+        # pack the pages into one container
+        container_fp = disclosure.disclosure_fp / f"{disclosure.name}{PAGES_SUFFIX}"
+        header = write_pages(container_fp, member_diclosure, {"date": member.date})
+        _record_pages(full_url, container_fp, header, member.date, manifest, catalog, "download")
 
+        json_data = {disclosure.name: {"data": [], "link": full_url, "date": member.date}}
+    else:
+        assert all(isinstance(f, dict) for f in member_diclosure), \
+        f"datatype is wrong for {member.html}"
+        manifest.record(full_url, "download", content=json.dumps(member_diclosure).encode())
 
-def scrape_and_save_disclosure(client: requests.Session, reports:list[SenateMember]) -> list:
-    desc = "Scraping financial disclosures for members in Senate"
+        json_data = {disclosure.name: {"data": member_diclosure, "link": full_url, "date": member.date}}
+
+    json_fp = disclosure.disclosure_fp / f"{disclosure.disclosure_fp.name}.json"
+    store.update(json_fp, json_data)
+    manifest.record(full_url, "holdings")
+    metrics.count("filings_scanned" if member.is_scanned else "filings_parsed")
+
+def _scrape_senate_serial(client: requests.Session, disclosures: list[SenateDisclosure], desc: str,
+                          manifest: Manifest, store: HoldingsStore, catalog: Catalog) -> tuple[list[str], list[str]]:
+    hit = []
+    failed = []
+    for disclosure in tqdm(disclosures, desc=desc):
+        stage = "download"
+        try:
+            member_diclosure = disclosure_api(client, disclosure.member, disclosure.full_url)
+            stage = "holdings"
+            _save_senate_disclosure(disclosure, member_diclosure, manifest, store, catalog)
+        except Exception as e:
+            manifest.fail(disclosure.full_url, stage, e)
+            failed.append(disclosure.full_url)
+            continue
+        manifest.complete(disclosure.full_url)
+        hit.append(disclosure.disclosure_fp.name)
+    return hit, failed
+
+def _scrape_senate_concurrent(pool: SenateSessionPool, disclosures: list[SenateDisclosure], desc: str,
+                              manifest: Manifest, store: HoldingsStore, catalog: Catalog,
+                              workers: int) -> tuple[list[str], list[str]]:
+    # report pages and the GIFs of scanned reports all go through one thread pool,
+    # how fast they go is bounded by the pool's shared rate limit
+    def _fetch_report(client: requests.Session, disclosure: SenateDisclosure):
+        with metrics.stage("senate.download_report"):
+            response = client.get(disclosure.full_url)
+        return _parse_disclosure(response.text, disclosure.member.is_scanned)
+
+    hit = []
+    failed = []
+    pending = {}
+    gifs: dict[str, list] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(total=len(disclosures), desc=desc) as pbar:
+        for disclosure in disclosures:
+            pending[executor.submit(pool.run, _fetch_report, disclosure)] = ("report", disclosure, None)
+
+        def _finish(disclosure: SenateDisclosure, member_diclosure: Optional[list], error: Optional[Exception], stage: str):
+            if error is None:
+                stage = "holdings"
+                try:
+                    _save_senate_disclosure(disclosure, member_diclosure, manifest, store, catalog)
+                except Exception as e:
+                    error = e
+            if error is None:
+                manifest.complete(disclosure.full_url)
+                hit.append(disclosure.disclosure_fp.name)
+            else:
+                manifest.fail(disclosure.full_url, stage, error)
+                failed.append(disclosure.full_url)
+            pbar.update()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, disclosure, i = pending.pop(future)
+                full_url = disclosure.full_url
+                if kind == "report":
+                    if future.exception() is not None:
+                        _finish(disclosure, None, future.exception(), "download")
+                    elif not disclosure.member.is_scanned or not future.result():
+                        _finish(disclosure, future.result(), None, "download")
+                    else:
+                        gif_urls = future.result()
+                        gifs[full_url] = [None] * len(gif_urls)
+                        for i, url in enumerate(gif_urls):
+                            pending[executor.submit(pool.run, _fetch_gif, url)] = ("gif", disclosure, i)
+                    continue
+
+                # a page of a scanned report, finish the report once all of its pages are in
+                if full_url not in gifs:
+                    continue  # another page already failed
+                if future.exception() is not None:
+                    del gifs[full_url]
+                    _finish(disclosure, None, future.exception(), "download")
+                    continue
+                gifs[full_url][i] = future.result()
+                if all(gif is not None for gif in gifs[full_url]):
+                    _finish(disclosure, gifs.pop(full_url), None, "download")
+
+    return hit, failed
+
+def _senate_disclosures(reports: list[SenateMember], chamber_fp: Path, manifest: Manifest,
+                        watermark: Optional[Watermark] = None) -> tuple[list[SenateDisclosure], list, list, list]:
+    """ The reports still to scrape, plus the hit, missed and unsure members. """
     hit = []
     missed = []
     unsure = []
-    last_names = senate_last_names()
-    for disclosure in tqdm(reports, desc=desc):
-        key = f"{disclosure.last_name}, {disclosure.first_name}"
-        disclosure_fp = SENATE_DATA_FP / key
-
+    disclosures = []
+    names = NameIndex.from_directory(chamber_fp)
+    for disclosure in reports:
         # missed
-        if not disclosure_fp.exists():
-            missed.append(disclosure_fp.name)
+        key = names.resolve(disclosure.last_name, disclosure.first_name)
+        if key is None:
+            missed.append(f"{disclosure.last_name}, {disclosure.first_name}")
             # unsure
-            if disclosure.last_name in last_names:
-                unsure.append((f"{disclosure.last_name}, {disclosure.first_name}", last_names[disclosure.last_name]))
+            if disclosure.last_name in names.last_names:
+                unsure.append((f"{disclosure.last_name}, {disclosure.first_name}", names.last_names[disclosure.last_name]))
             continue
+        disclosure_fp = chamber_fp / key
 
         # Find the <a> tag and extract the href attribute
         link_soup = BeautifulSoup(disclosure.html, 'html.parser')
@@ -258,70 +864,87 @@ def scrape_and_save_disclosure(client: requests.Session, reports:list[SenateMemb
         disclosure_name = a_tag.text
 
         full_url = ROOT + href_link
-        member_diclosure: list[Union[bytes, dict]] = disclosure_api(client, disclosure, full_url)
 
-        if disclosure.is_scanned:
-            assert all(isinstance(f, bytes) for f in member_diclosure), \
-            f"datatype is wrong for {disclosure.html}"
-
-            # create a folder to store images
-            images_fp = disclosure_fp / disclosure_name
-            images_fp.mkdir(parents=True, exist_ok=True)
+        # ingested by an earlier delta run, without rehashing what it wrote
+        if watermark is not None and not watermark.wants(full_url, disclosure.date):
+            hit.append(disclosure_fp.name)
+            continue
 
-            for i, f in enumerate(member_diclosure):
-                file_fp = images_fp / f"{disclosure.date}_{i}.gif"
-                with open(file_fp, "wb") as file:
-                    file.write(f)
+        # already scraped by a previous run
+        if manifest.done(full_url):
+            hit.append(disclosure_fp.name)
+            continue
 
-            json_data = {disclosure_name: {"data": [], "link": full_url, "date": disclosure.date}}
-            json_fp = disclosure_fp / f"{disclosure_fp.name}.json"
-            update_holding_json(json_fp, json_data)
+        disclosures.append(SenateDisclosure(
+            member=disclosure,
+            disclosure_fp=disclosure_fp,
+            name=disclosure_name,
+            full_url=full_url
+        ))
+    return disclosures, hit, missed, unsure
+
+def scrape_and_save_disclosure(client: requests.Session, reports: list[SenateMember],
+                               pool: Optional[SenateSessionPool] = None, chamber_fp: Path = SENATE_DATA_FP,
+                               watermark: Optional[Watermark] = None) -> list:
+    desc = "Scraping financial disclosures for members in Senate"
+    manifest = Manifest(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.json", chamber_fp)
+    catalog = Catalog(chamber_fp)
+    disclosures, hit, missed, unsure = _senate_disclosures(reports, chamber_fp, manifest, watermark)
+    if watermark is not None:
+        print(f"delta: {len(disclosures)} new or amended reports")
+
+    with HoldingsStore(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.holdings.log") as store:
+        if pool is None:
+            scraped, failed = _scrape_senate_serial(client, disclosures, desc, manifest, store, catalog)
         else:
-            assert all(isinstance(f, dict) for f in member_diclosure), \
-            f"datatype is wrong for {disclosure.html}"
-
-            json_data = {disclosure_name: {"data": member_diclosure, "link": full_url, "date": disclosure.date}}
-            json_fp = disclosure_fp / f"{disclosure_fp.name}.json"
-            update_holding_json(json_fp, json_data)
-
-        hit.append(disclosure_fp.name)
+            scraped, failed = _scrape_senate_concurrent(pool, disclosures, desc, manifest, store, catalog, pool.size)
+    hit += scraped
+    manifest.compact()
+    catalog.compact()
+    if watermark is not None:
+        watermark.advance(manifest)
 
     print(f"hit: {sorted(hit)}")
     print(f"missed: {sorted(missed)}")
+    if failed:
+        print(f"failed (rerun to retry): {sorted(failed)}")
 
     return unsure
 
-def scrape_senate(year: int):
-    def _filter(reports: list[list[str]]) -> list[SenateMember]:
-        ret = []
-        for report in reports:
-            if "Senator" in report[2]:
-                first_name = standardize_name(report[0])
-                last_name = standardize_name(report[1])
-                last_name, first_name = interchange_name(f"{last_name}, {first_name}").split(",")
-                ret.append(SenateMember(
-                    first_name=first_name.strip(),
-                    last_name=last_name.strip(),
-                    html=report[3],
-                    date=report[4].replace("/", "-"),
-                    is_scanned= "for CY" not in report[3]
-                ))
-        return ret
-
-    client = requests.Session()
-
-    token = _csrf(client)
-    idx = 0
-    reports = reports_api(client, idx, token, year)
-    all_reports: list[list[str]] = []
-    while len(reports) != 0:
-        all_reports.extend(reports)
-        idx += BATCH_SIZE
-        reports = reports_api(client, idx, token, year)
-
-    all_reports = _filter(all_reports)
-
-    unsure = scrape_and_save_disclosure(client, all_reports)
+def _senate_members(reports: list[list[str]]) -> list[SenateMember]:
+    """ Keep the reports filed by senators, the search lists candidates' reports too. """
+    ret = []
+    for report in reports:
+        if "Senator" in report[2]:
+            ret.append(SenateMember(
+                first_name=standardize_name(report[0]),
+                last_name=standardize_name(report[1]),
+                html=report[3],
+                date=report[4].replace("/", "-"),
+                is_scanned= "for CY" not in report[3]
+            ))
+    return ret
+
+def senate_sessions(workers: int = 1) -> tuple[requests.Session, Optional[SenateSessionPool]]:
+    """ A session past the prohibition agreement, and a pool of workers of them if workers > 1. """
+    limiter = RateLimiter(SENATE_REQUESTS_PER_SECOND, burst=max(workers, 1))
+    client = transport.RetryingSession(limiter=limiter)
+    _csrf(client)
+    pool = SenateSessionPool.create(workers, limiter, client) if workers > 1 else None
+    return client, pool
+
+def scrape_senate(year: int, workers: int = 1, chamber_fp: Path = SENATE_DATA_FP, delta: bool = False):
+    """ With delta only reports submitted since the last delta run are listed, and only new ones are scraped. """
+    watermark = watermark_for(chamber_fp) if delta else None
+    # a delta run lists a few days of reports, one session is enough for that
+    client, pool = senate_sessions(1 if delta else workers)
+
+    all_reports = search_reports(client, year, pool, watermark.since() if watermark is not None else None)
+    all_reports = _senate_members(all_reports)
+    if delta and workers > 1 and len(all_reports) > workers:
+        pool = SenateSessionPool.create(workers, client.limiter, client)
+
+    unsure = scrape_and_save_disclosure(client, all_reports, pool, chamber_fp, watermark)
     return unsure
 
 
@@ -337,4 +960,6 @@ if __name__ == "__main__":
     unsure.extend(scrape_senate(year))
 
     for name_1, name_2 in unsure:
-        print(name_1, " <=> ", name_2)
\ No newline at end of file
+        print(name_1, " <=> ", name_2)
+    # data/metrics/holdings.json and .prom
+    metrics.METRICS.write("holdings")
\ No newline at end of file
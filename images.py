@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass, astuple
+from pathlib import Path
+from typing import Optional, Union
+
+from PIL import Image
+
+import metrics
+from utils import CACHE_FP
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    max_width: int = 1600
+    max_height: int = 1600
+    grayscale: bool = True
+    crop_whitespace: bool = True
+    whitespace_threshold: int = 240 # pixels lighter than this on every channel count as paper
+    margin: int = 16 # pixels of paper kept around the cropped content
+    format: str = "JPEG"
+    quality: int = 80
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+def preprocess_image(data: Union[bytes, memoryview], config: PreprocessConfig) -> bytes:
+    """ Grayscale, crop the blank margins and shrink a page so it fits config, returns the re-encoded page. """
+    image = Image.open(io.BytesIO(data))
+    image = image.convert("L" if config.grayscale else "RGB")
+
+    if config.crop_whitespace:
+        # anything darker than the threshold is content
+        mask = image if image.mode == "L" else image.convert("L")
+        mask = mask.point(lambda p: 255 if p < config.whitespace_threshold else 0)
+        bbox = mask.getbbox()
+        if bbox is not None:
+            left, top, right, bottom = bbox
+            image = image.crop((max(left - config.margin, 0), max(top - config.margin, 0),
+                                min(right + config.margin, image.width), min(bottom + config.margin, image.height)))
+
+    image.thumbnail((config.max_width, config.max_height))
+
+    out = io.BytesIO()
+    image.save(out, config.format, quality=config.quality, optimize=True)
+    return out.getvalue()
+
+class PayloadCache:
+    """
+    Disk cache of preprocessed, base64 encoded pages ready to go into a request. Keyed by the
+    hash of the raw page and the preprocessing config, least recently used entries are evicted
+    once the cache grows past max_bytes.
+    """
+
+    def __init__(self, path: Path = CACHE_FP / 'payloads', config: PreprocessConfig = PreprocessConfig(),
+                 max_bytes: int = 2 * 1024 ** 3):
+        self.path = path
+        self.config = config
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        path.mkdir(parents=True, exist_ok=True)
+        self.size = sum(fp.stat().st_size for fp in path.glob("*/*.b64"))
+
+    def _fp(self, digest: str) -> Path:
+        key = hashlib.sha256(f"{digest}{astuple(self.config)!r}".encode()).hexdigest()
+        return self.path / key[:2] / f"{key}.b64"
+
+    def get(self, page: Union[Path, bytes, memoryview], digest: Optional[str] = None) -> str:
+        """ Payload for a page file or the raw bytes of a page, digest is the page's sha256 if already known. """
+        if isinstance(page, Path):
+            with open(page, "rb") as file:
+                page = file.read()
+        fp = self._fp(digest or hashlib.sha256(page).hexdigest())
+        try:
+            # bump the mtime, eviction goes oldest first
+            os.utime(fp)
+            payload = fp.read_text()
+        except FileNotFoundError:
+            # not cached, or evicted by another worker in between
+            pass
+        else:
+            with self.lock:
+                self.hits += 1
+            metrics.count("payload_cache_hits")
+            return payload
+
+        with metrics.stage("images.preprocess"):
+            payload = base64.b64encode(preprocess_image(page, self.config)).decode('utf-8')
+        metrics.count("payload_cache_misses")
+        fp.parent.mkdir(exist_ok=True)
+        tmp_fp = fp.with_name(f".{fp.name}.{threading.get_ident()}.tmp")
+        tmp_fp.write_text(payload)
+        os.replace(tmp_fp, fp)
+        with self.lock:
+            self.misses += 1
+            self.size += len(payload)
+            if self.size > self.max_bytes:
+                self._evict()
+        return payload
+
+    def _evict(self):
+        # down to 90% so we don't evict on every insert
+        entries = sorted(((fp.stat().st_mtime, fp) for fp in self.path.glob("*/*.b64")), key=lambda entry: entry[0])
+        self.size = sum(fp.stat().st_size for _, fp in entries)
+        for _, fp in entries:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            self.size -= fp.stat().st_size
+            fp.unlink()
+
+    def prepare(self, pages: list[Union[Path, bytes, memoryview]], digests: Optional[list[str]] = None) -> list[str]:
+        """ Payloads for the pages of a filing, identical pages (e.g. blank ones) are sent once. """
+        payloads = []
+        seen = set()
+        for i, page in enumerate(pages):
+            payload = self.get(page, digests[i] if digests else None)
+            digest = hashlib.sha256(payload.encode()).digest()
+            if digest not in seen:
+                seen.add(digest)
+                payloads.append(payload)
+        return payloads
@@ -1,9 +1,15 @@
 import requests
+import asyncio
+import hashlib
 import json
-from typing import Any
+import time
+from pathlib import Path
+from typing import Any, Optional
 from dataclasses import dataclass, asdict
 
-from utils import BASE_DATA_FP, STATE_MAP, standardize_name
+import metrics
+import transport
+from utils import BASE_DATA_FP, CACHE_FP, STATE_MAP, standardize_name, atomic_write_json
 
 BASE_URL = f"https://api.congress.gov/v3"
 API_KEY = "<enter-your-key>" # https://gpo.congress.gov/sign-up/
@@ -17,47 +23,117 @@ class Member:
     chamber: str # "House of Representatives" or "Senate"
     holdings: dict
 
-def get_current_congress(params=None) -> int:
+class ResponseCache:
+    """
+    On-disk cache of JSON responses. Entries younger than ttl are served without a request,
+    older ones are revalidated with If-None-Match/If-Modified-Since so an unchanged page costs a 304.
+    """
+
+    def __init__(self, path: Path, ttl: float = 24 * 60 * 60):
+        self.path = path
+        self.ttl = ttl
+        path.mkdir(parents=True, exist_ok=True)
+
+    def _fp(self, url: str, params: dict) -> Path:
+        # the api key is not part of the identity of a response
+        key = json.dumps([url, sorted((k, str(v)) for k, v in params.items() if k != 'api_key')])
+        return self.path / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def get_json(self, session: requests.Session, url: str, params: dict) -> dict:
+        fp = self._fp(url, params)
+        entry = None
+        if fp.exists():
+            with open(fp, "r") as file:
+                entry = json.load(file)
+            if time.time() - entry['fetched_at'] < self.ttl:
+                metrics.count("members_cache_hits")
+                return entry['body']
+
+        headers = {}
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        with metrics.stage("members.fetch"):
+            response = session.get(url, params=params, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            metrics.count("members_not_modified")
+            entry['fetched_at'] = time.time()
+        elif response.status_code == 200:
+            entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'body': response.json()
+            }
+        else:
+            raise requests.HTTPError(f"Received status code {response.status_code} when fetching {url}")
+
+        atomic_write_json(fp, entry)
+        return entry['body']
+
+def _default_cache() -> ResponseCache:
+    return ResponseCache(CACHE_FP / 'congress.gov')
+
+def get_current_congress(cache: Optional[ResponseCache] = None) -> int:
     url = BASE_URL + f'/congress/current'
-    if params is None: params = {'api_key': API_KEY}
-    response = requests.get(url, params=params)
-
-    if response.status_code != 200:
-        raise requests.HTTPError(f"Received status code {response.status_code} when fetching members")
-
-    data = response.json()
+    cache = cache or _default_cache()
+    data = cache.get_json(transport.session(url), url, {'api_key': API_KEY})
 
     return int(data['congress']['number'])
 
-def get_members(congress: int, params=None) -> list[dict]:
+async def get_members_async(congress: int, limit: int = 250, concurrency: int = 4,
+                            cache: Optional[ResponseCache] = None) -> list[dict]:
+    """ Fetch every member of a congress, the first page gives the count and the other pages are fetched concurrently. """
     url = BASE_URL + f'/member/congress/{congress}'
-    if params is None: params = {'api_key': API_KEY, 'limit': 250}
-    response = requests.get(url, params=params)
-
-    if response.status_code != 200:
-        raise requests.HTTPError(f"Received status code {response.status_code} when fetching members")
-
-    data = response.json()
-    assert 'members' in data, "no members were returned"
-
-    members = [member for member in data['members']]
-
-    # Update the URL to the next page
-    if next_url := data['pagination'].get('next'):
-        # Parse out the params from the next_url
-        next_url_split = next_url.split('?')
-        url = next_url_split[0]
-        params.update(dict(x.split('=') for x in next_url_split[1].split('&')))
-        members += get_members(congress, params)
-
-    return members
-
-def parse_members(members: list[dict]) -> list[Member]:
-    # filter for if any members resigned during their term
-    members = [member for member in members if any('endYear' not in term for term in member['terms']['item'])]
+    cache = cache or _default_cache()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # the pages share the host's keep-alive connections
+    session = transport.session(url)
+
+    async def _page(offset: int) -> dict:
+        async with semaphore:
+            params = {'api_key': API_KEY, 'limit': limit, 'offset': offset}
+            return await asyncio.to_thread(cache.get_json, session, url, params)
+
+    first = await _page(0)
+    assert 'members' in first, "no members were returned"
+    count = first['pagination']['count']
+    pages = await asyncio.gather(*(_page(offset) for offset in range(limit, count, limit)))
+
+    return [member for data in (first, *pages) for member in data['members']]
+
+def get_members(congress: int, limit: int = 250, cache: Optional[ResponseCache] = None) -> list[dict]:
+    return asyncio.run(get_members_async(congress, limit=limit, cache=cache))
+
+def congress_years(congress: int) -> tuple[int, int]:
+    # a congress sits for the two years starting on January 3rd of an odd year
+    start = 1789 + 2 * (congress - 1)
+    return start, start + 2
+
+def congress_for_year(year: int) -> int:
+    return (year - 1789) // 2 + 1
+
+def _congress_term(member: dict, congress: int) -> Optional[dict]:
+    # the last term overlapping the congress, terms that ended on the day it started don't count
+    start, end = congress_years(congress)
+    terms = [term for term in member['terms']['item'] if term['startYear'] < end and term.get('endYear', end) > start]
+    return terms[-1] if terms else None
+
+def parse_members(members: list[dict], congress: Optional[int] = None) -> list[Member]:
+    """ Members currently in office, or with congress given, members who served in that congress. """
+    if congress is None:
+        # filter for if any members resigned during their term
+        members = [member for member in members if any('endYear' not in term for term in member['terms']['item'])]
+        terms = [member['terms']['item'][-1] for member in members]
+    else:
+        terms = [_congress_term(member, congress) for member in members]
+        members, terms = [member for member, term in zip(members, terms) if term], [term for term in terms if term]
 
     ret = []
-    for member in members:
+    for member, term in zip(members, terms):
         state = member['state'].title()
         state_district = f"{STATE_MAP.get(state, state)}{member.get('district', '')}"
         name: str = member['name'].split(',')
@@ -68,24 +144,45 @@ def parse_members(members: list[dict]) -> list[Member]:
             full_name=member['name'],
             party=member['partyName'][0],
             state_district=state_district,
-            chamber=member['terms']['item'][-1]['chamber'],
+            chamber=term['chamber'],
             holdings={}
         )
         ret.append(member_obj)
     return ret
 
-def setup_members(members: list[Member]):
+def setup_members(members: list[Member], data_fp: Path = BASE_DATA_FP):
     for member in members:
-        member_fp = BASE_DATA_FP / member.chamber / member.key
+        member_fp = data_fp / member.chamber / member.key
         member_fp.mkdir(parents=True, exist_ok=True)
 
         json_fp = member_fp / f"{member_fp.name}.json"
+        data = asdict(member)
+        # keep holdings scraped by a previous (possibly interrupted) run
+        if json_fp.exists():
+            with open(json_fp, "r") as file:
+                data['holdings'] = json.load(file)['holdings'] | data['holdings']
         with open(json_fp, "w") as file:
-            json.dump(asdict(member), file, indent=4)
+            json.dump(data, file, indent=4)
 
 def fetch_members(congress):
     return parse_members(get_members(congress))
 
+class MemberRegistry:
+    """
+    Members of each congress, parsed once per run so every year of it sets up its data folders
+    from the same list. Every run goes through the response cache, so members who joined
+    mid-congress show up once its entries are revalidated.
+    """
+
+    def __init__(self, cache: Optional[ResponseCache] = None):
+        self.cache = cache
+        self.congresses: dict[int, list[Member]] = {}
+
+    def get(self, congress: int) -> list[Member]:
+        if congress not in self.congresses:
+            self.congresses[congress] = parse_members(get_members(congress, cache=self.cache), congress)
+        return self.congresses[congress]
+
 
 if __name__ == "__main__":
     congress = get_current_congress()
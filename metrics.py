@@ -0,0 +1,195 @@
+import cProfile
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from utils import BASE_DATA_FP, atomic_write_json
+
+METRICS_FP = BASE_DATA_FP / 'metrics'
+PREFIX = "cryptopoliticians"
+# upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+class Metrics:
+    """
+    Counters of one process: wall and CPU time per stage, named counters (bytes, pages, tokens, ...)
+    and a request latency histogram per host. Stages listed in profile are also run under cProfile.
+    """
+
+    def __init__(self, profile: Iterable[str] = ()):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages: dict[str, dict[str, float]] = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0})
+        self.counters: dict[str, float] = defaultdict(float)
+        self.requests: dict[str, dict] = {}
+        self.profile = set(profile)
+        self.profiles: dict[str, cProfile.Profile] = {}
+        self.profiling = threading.local()
+
+    @contextmanager
+    def stage(self, name: str):
+        # thread_time is the CPU of this thread only, stages run on many threads at once
+        profiler = self._profiler(name)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self.profiling.active = False
+            with self.lock:
+                stage = self.stages[name]
+                stage["calls"] += 1
+                stage["wall"] += wall
+                stage["cpu"] += cpu
+
+    def _profiler(self, name: str) -> Optional[cProfile.Profile]:
+        # one profiler per stage and thread, a thread can only run one at a time so nested stages aren't profiled
+        if name not in self.profile or getattr(self.profiling, "active", False):
+            return None
+        with self.lock:
+            profiler = self.profiles.setdefault(f"{name}.{threading.get_ident()}", cProfile.Profile())
+        self.profiling.active = True
+        profiler.enable()
+        return profiler
+
+    def count(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def _request_entry(self, host: str) -> dict:
+        return self.requests.setdefault(host, {"count": 0, "sum": 0.0, "bytes": 0, "buckets": [0] * len(LATENCY_BUCKETS)})
+
+    def observe_request(self, host: str, seconds: float):
+        with self.lock:
+            entry = self._request_entry(host)
+            entry["count"] += 1
+            entry["sum"] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+                    break
+
+    def observe_bytes(self, host: str, nbytes: int):
+        with self.lock:
+            self._request_entry(host)["bytes"] += nbytes
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"stages": {name: dict(stage) for name, stage in self.stages.items()}, "counters": dict(self.counters),
+                    "requests": {host: dict(entry, buckets=list(entry["buckets"])) for host, entry in self.requests.items()}}
+
+    def merge(self, snapshot: dict):
+        """ Add the snapshot of another process, e.g. a rasterization worker. """
+        with self.lock:
+            for name, stage in snapshot["stages"].items():
+                for key, value in stage.items():
+                    self.stages[name][key] += value
+            for name, value in snapshot["counters"].items():
+                self.counters[name] += value
+            for host, entry in snapshot["requests"].items():
+                mine = self._request_entry(host)
+                for key in ("count", "sum", "bytes"):
+                    mine[key] += entry[key]
+                mine["buckets"] = [a + b for a, b in zip(mine["buckets"], entry["buckets"])]
+
+    def summary(self) -> dict:
+        summary = self.snapshot()
+        summary["seconds"] = time.time() - self.started
+        # the rates people ask for, from the counters and the stages doing the work
+        rasterize = summary["stages"].get("house.rasterize", {}).get("wall", 0)
+        summary["rates"] = {
+            "pages_rasterized_per_second": summary["counters"].get("pages_rasterized", 0) / rasterize if rasterize else None,
+            "bytes_downloaded": sum(entry["bytes"] for entry in summary["requests"].values()),
+        }
+        return summary
+
+    def prometheus(self) -> str:
+        summary = self.snapshot()
+        lines = []
+        for metric, key, kind in [("stage_calls_total", "calls", "counter"), ("stage_wall_seconds_total", "wall", "counter"),
+                                  ("stage_cpu_seconds_total", "cpu", "counter")]:
+            lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+            lines += [f'{PREFIX}_{metric}{{stage="{name}"}} {stage[key]}' for name, stage in sorted(summary["stages"].items())]
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total {value}")
+        lines.append(f"# TYPE {PREFIX}_request_duration_seconds histogram")
+        for host, entry in sorted(summary["requests"].items()):
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, entry["buckets"]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'{PREFIX}_request_duration_seconds_bucket{{host="{host}",le="{le}"}} {cumulative}')
+            lines.append(f'{PREFIX}_request_duration_seconds_sum{{host="{host}"}} {entry["sum"]}')
+            lines.append(f'{PREFIX}_request_duration_seconds_count{{host="{host}"}} {entry["count"]}')
+        lines.append(f"# TYPE {PREFIX}_response_bytes_total counter")
+        lines += [f'{PREFIX}_response_bytes_total{{host="{host}"}} {entry["bytes"]}' for host, entry in sorted(summary["requests"].items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, name: str, path: Path = METRICS_FP):
+        """ {path}/{name}.json, {path}/{name}.prom and a {name}.{stage}.{thread}.prof per profiled stage. """
+        path.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(path / f"{name}.json", self.summary(), indent=4)
+        tmp_fp = path / f".{name}.prom.tmp"
+        tmp_fp.write_text(self.prometheus())
+        os.replace(tmp_fp, path / f"{name}.prom")
+        for key, profiler in self.profiles.items():
+            profiler.dump_stats(path / f"{name}.{key}.prof")
+
+
+# the metrics of this process, module level so every stage records into the same ones
+METRICS = Metrics()
+
+def reset(profile: Iterable[str] = ()) -> Metrics:
+    global METRICS
+    METRICS = Metrics(profile)
+    return METRICS
+
+def stage(name: str):
+    return METRICS.stage(name)
+
+def count(name: str, value: float = 1):
+    METRICS.count(name, value)
+
+def record_response(response: requests.Response, *args, **kwargs):
+    """
+    requests response hook, elapsed is the time to the response headers. The body isn't read yet,
+    so its bytes are counted as iter_content (and content, json, iter_lines on top of it) reads them,
+    decompressed. Chunked and compressed bodies count, a body never read counts 0.
+    """
+    host = urlsplit(response.url).hostname or ""
+    METRICS.observe_request(host, response.elapsed.total_seconds())
+    iter_content = response.iter_content
+    def counted(*args, **kwargs):
+        for chunk in iter_content(*args, **kwargs):
+            METRICS.observe_bytes(host, len(chunk))
+            yield chunk
+    response.iter_content = counted
+
+def instrument(session: requests.Session) -> requests.Session:
+    session.hooks["response"].append(record_response)
+    return session
+
+def call_recorded(fn, *args):
+    """
+    Run fn(*args) in a process pool worker with fresh metrics, returns (result, snapshot) for the
+    parent to merge. Forked workers start with a copy of the parent's metrics, which would count twice.
+    """
+    global METRICS
+    parent, METRICS = METRICS, Metrics(METRICS.profile)
+    try:
+        return fn(*args), METRICS.snapshot()
+    finally:
+        METRICS = parent
+
+def merge(snapshot: dict):
+    METRICS.merge(snapshot)
@@ -0,0 +1,189 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from utils import BASE_DATA_FP, JsonJournal, chamber_fps, remove_directory
+
+# A filing's pages packed into one {filing}.pages file next to the member json:
+#
+#   b"CPPAGES1" | uint32 little endian header length | header json | page bytes ...
+#
+# The header lists every page as {"offset", "length", "width", "height", "format", "sha256"}
+# with offsets from the start of the file, so a page can be sliced straight out of a mmap.
+
+MAGIC = b"CPPAGES1"
+_HEADER_LEN = struct.Struct("<I")
+SUFFIX = ".pages"
+COPY_SIZE = 1 << 20
+
+CATALOG_FP = BASE_DATA_FP / 'catalog'
+
+def _page_entry(data: bytes) -> dict:
+    with Image.open(io.BytesIO(data)) as image:
+        width, height, fmt = image.width, image.height, image.format
+    return {"length": len(data), "width": width, "height": height, "format": fmt, "sha256": hashlib.sha256(data).hexdigest()}
+
+def _pack_header(entries: list[dict], metadata: Optional[dict]) -> tuple[dict, bytes]:
+    # offsets depend on the header length, which depends on the offsets, so iterate until it settles
+    header = {"metadata": metadata or {}, "pages": entries}
+    raw_header = b""
+    while True:
+        offset = len(MAGIC) + _HEADER_LEN.size + len(raw_header)
+        for entry in entries:
+            entry["offset"] = offset
+            offset += entry["length"]
+        new_header = json.dumps(header).encode()
+        if len(new_header) == len(raw_header):
+            break
+        raw_header = new_header
+    return header, new_header
+
+def write_pages(fp: Path, pages: list[bytes], metadata: Optional[dict] = None) -> dict:
+    """ Pack encoded page images into fp, returns the header. """
+    header, raw_header = _pack_header([_page_entry(data) for data in pages], metadata)
+
+    tmp_fp = fp.with_name(f".{fp.name}.tmp")
+    with open(tmp_fp, "wb") as file:
+        file.write(MAGIC)
+        file.write(_HEADER_LEN.pack(len(raw_header)))
+        file.write(raw_header)
+        for data in pages:
+            file.write(data)
+    os.replace(tmp_fp, fp)
+    return header
+
+class PageWriter:
+    """
+    Pack pages into fp as they come, for filings too long to hold every page in memory. The pages
+    are spooled to disk until close() knows the header, then copied behind it.
+    """
+
+    def __init__(self, fp: Path, metadata: Optional[dict] = None):
+        self.fp = fp
+        self.metadata = metadata
+        self.entries: list[dict] = []
+        self.header: Optional[dict] = None
+        self.spool_fp = fp.with_name(f".{fp.name}.spool")
+        self.spool = open(self.spool_fp, "wb")
+
+    def add(self, data: bytes):
+        self.entries.append(_page_entry(data))
+        self.spool.write(data)
+
+    def close(self) -> dict:
+        self.spool.close()
+        self.header, raw_header = _pack_header(self.entries, self.metadata)
+        tmp_fp = self.fp.with_name(f".{self.fp.name}.tmp")
+        with open(tmp_fp, "wb") as file, open(self.spool_fp, "rb") as spool:
+            file.write(MAGIC)
+            file.write(_HEADER_LEN.pack(len(raw_header)))
+            file.write(raw_header)
+            shutil.copyfileobj(spool, file, COPY_SIZE)
+        os.replace(tmp_fp, self.fp)
+        self.spool_fp.unlink()
+        return self.header
+
+    def abort(self):
+        self.spool.close()
+        self.spool_fp.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class PageContainer:
+    """ Read-only, memory-mapped view of a .pages file, page() slices are zero-copy. """
+
+    def __init__(self, fp: Path):
+        self.fp = fp
+        self.file = open(fp, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        assert self.mmap[:len(MAGIC)] == MAGIC, f"{fp} is not a page container"
+        (header_len,) = _HEADER_LEN.unpack_from(self.mmap, len(MAGIC))
+        start = len(MAGIC) + _HEADER_LEN.size
+        header = json.loads(self.mmap[start:start + header_len])
+        self.metadata: dict = header["metadata"]
+        self.pages: list[dict] = header["pages"]
+        self.view = memoryview(self.mmap)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def page(self, i: int) -> memoryview:
+        # only valid until close() and has to be released before it, bytes() it to keep a copy
+        entry = self.pages[i]
+        return self.view[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def close(self):
+        self.view.release()
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class Catalog:
+    """
+    Every filing of a chamber that has pages, in one json file:
+    {"{member}/{filing}.pages": {"member": ..., "filing": ..., "date": ..., "pages": n, "bytes": n}}
+    Additions are journaled to {catalog}.json.log and folded into it every so often and on compact().
+    """
+
+    def __init__(self, chamber_fp: Path):
+        self.root = chamber_fp
+        # the catalog sits next to the chamber folders of the same partition
+        self.path = chamber_fp.parent / CATALOG_FP.name / f"{chamber_fp.name}.json"
+        self.lock = threading.Lock()
+        self.journal = JsonJournal(self.path)
+        self.entries: dict[str, dict] = self.journal.data
+
+    def add(self, container_fp: Path, header: dict, date: str):
+        rel_fp = container_fp.relative_to(self.root)
+        with self.lock:
+            self.journal.set(str(rel_fp), {
+                "member": rel_fp.parent.name,
+                "filing": rel_fp.name[:-len(SUFFIX)],
+                "date": date,
+                "pages": len(header["pages"]),
+                "bytes": sum(page["length"] for page in header["pages"])
+            })
+
+    def compact(self):
+        with self.lock:
+            self.journal.compact()
+
+def pack_loose_pages(chamber_fp: Path):
+    """ Convert {member}/{filing}/{date}_{i}.jpg|gif folders from older runs into containers. """
+    catalog = Catalog(chamber_fp)
+    for images_fp in sorted(p for p in chamber_fp.glob("*/*") if p.is_dir()):
+        image_fps = sorted(images_fp.iterdir(), key=lambda fp: int(fp.stem.rsplit('_', 1)[1]))
+        if not image_fps:
+            continue
+        container_fp = images_fp.with_name(images_fp.name + SUFFIX)
+        header = write_pages(container_fp, [fp.read_bytes() for fp in image_fps])
+        catalog.add(container_fp, header, image_fps[0].stem.rsplit('_', 1)[0])
+        remove_directory(images_fp)
+        print(f"Packed {len(image_fps)} pages into {container_fp}")
+    catalog.compact()
+
+
+if __name__ == "__main__":
+    for chamber_fp in chamber_fps():
+        pack_loose_pages(chamber_fp)
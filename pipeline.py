@@ -0,0 +1,368 @@
+import argparse
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from tqdm import tqdm
+
+import metrics
+from checkpoint import Manifest, Watermark
+from holdings import (
+    HouseDisclosure,
+    SenateDisclosure,
+    PAGES_SUFFIX,
+    SenateSessionPool,
+    load_HoR_index,
+    RasterConfig,
+    search_reports,
+    watermark_for,
+    senate_sessions,
+    disclosure_api,
+    _HoR_disclosures,
+    _senate_disclosures,
+    _senate_members,
+    _download_HoR_PDF,
+    _process_HoR_PDF,
+    _record_HoR_result,
+    _save_HoR_holding,
+    _save_senate_disclosure
+)
+from pages import Catalog
+from scheduler import prepare
+from store import HoldingsStore
+from utils import HOR_DATA_FP, SENATE_DATA_FP, checkpoint_fp, year_data_fp
+
+# Filings stream through bounded queues, every stage a few threads:
+#
+#   House source  -> house fetch  (download PDFs)  -> process (text layer or rasterize, process pool) -+
+#   Senate source -> senate fetch (reports + GIFs through the session pool) ---------------------------+-> persist -> extract
+#
+# A full queue blocks the stage feeding it, so a slow stage holds back the ones before it instead of
+# piling filings up in memory. Both chambers run at once and extraction starts with the first scanned
+# filing, not after the last download.
+
+# filings waiting between two stages
+QUEUE_SIZE = 32
+_DONE = object()
+
+class Channel:
+    """ Bounded queue between stages, its consumers stop once every producing stage has closed it. """
+
+    def __init__(self, consumers: int, producers: int = 1, maxsize: int = QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.consumers = consumers
+        self.producers = producers
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        with self.lock:
+            self.producers -= 1
+            last = self.producers == 0
+        if last:
+            for _ in range(self.consumers):
+                self.queue.put(_DONE)
+
+    def __iter__(self):
+        while (item := self.queue.get()) is not _DONE:
+            yield item
+
+@dataclass
+class Chamber:
+    """ The checkpoint, page catalog and holdings store of one chamber folder, shared by every stage. """
+    chamber_fp: Path
+    manifest: Manifest
+    catalog: Catalog
+    store: HoldingsStore
+    watermark: Optional[Watermark] = None  # delta runs only
+
+    @classmethod
+    def open(cls, chamber_fp: Path, watermark: Optional[Watermark] = None) -> "Chamber":
+        return cls(chamber_fp, Manifest(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.json", chamber_fp),
+                   Catalog(chamber_fp), HoldingsStore(checkpoint_fp(chamber_fp) / f"{chamber_fp.name}.holdings.log"),
+                   watermark)
+
+@dataclass
+class Filing:
+    chamber: Chamber
+    disclosure: Union[HouseDisclosure, SenateDisclosure]
+    stage: str = "download"
+    content: Optional[bytes] = None        # House PDF
+    rows: Optional[list[dict]] = None      # House text layer
+    header: Optional[dict] = None          # House rasterized pages
+    parsed: Optional[list] = None          # Senate assets or page GIFs
+    error: Optional[Exception] = None
+
+    @property
+    def key(self) -> str:
+        if isinstance(self.disclosure, HouseDisclosure):
+            return self.disclosure.doc_id
+        return self.disclosure.full_url
+
+class Pipeline:
+    """
+    Scrape both chambers of one year into data_fp and extract the scanned filings as they come in.
+    extract_workers=0 leaves extraction to extract.py, so the model SDKs aren't needed. With delta
+    only filings new since the last delta run of each chamber are scraped.
+    """
+
+    def __init__(self, year: int, data_fp: Optional[Path] = None, download_workers: int = 8, raster_workers: int = 4,
+                 senate_workers: int = 4, extract_workers: int = 8, queue_size: int = QUEUE_SIZE, extractor=None,
+                 delta: bool = False, raster: RasterConfig = RasterConfig()):
+        self.year = year
+        self.data_fp = data_fp or year_data_fp(year)
+        self.download_workers = max(download_workers, 1)
+        self.raster_workers = max(raster_workers, 1)
+        self.senate_workers = max(senate_workers, 1)
+        self.extract_workers = extract_workers
+        self.extractor = extractor
+        self.delta = delta
+        self.raster = raster
+
+        self.house_fetch = Channel(self.download_workers, maxsize=queue_size)
+        self.senate_fetch = Channel(self.senate_workers, maxsize=queue_size)
+        self.process = Channel(self.raster_workers, maxsize=queue_size)
+        # the House processors and the Senate fetchers both hand off to persist
+        self.persist = Channel(1, producers=2, maxsize=queue_size)
+        self.extract = Channel(max(self.extract_workers, 1), maxsize=queue_size)
+
+        self.lock = threading.Lock()
+        self.threads: list[threading.Thread] = []
+        self.started = None
+        self.first_result = None
+        self.hit, self.missed, self.unsure, self.failed = [], [], [], []
+        self.extracted = 0
+
+    def _spawn(self, name: str, workers: int, inbox: Optional[Channel], fn, outboxes: list[Channel]):
+        # the last worker of a stage to finish closes the stage's outboxes
+        remaining = [workers]
+
+        def _call(*args):
+            # a stage that dies would leave the stages before it blocked on a full queue
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+
+        def _worker():
+            try:
+                if inbox is None:
+                    _call()
+                else:
+                    for item in inbox:
+                        _call(item)
+            finally:
+                with self.lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for outbox in outboxes:
+                        outbox.close()
+
+        for i in range(workers):
+            thread = threading.Thread(target=_worker, name=f"{name}-{i}", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    # ========= sources ==========
+
+    def _house_source(self):
+        chamber_fp = self.data_fp / HOR_DATA_FP.name
+        watermark = watermark_for(chamber_fp) if self.delta else None
+        fds = load_HoR_index(self.year, chamber_fp, watermark)
+        if fds is None:
+            print(f"delta: {self.year}FD.zip hasn't changed since the last run")
+            return
+        self.house = Chamber.open(chamber_fp, watermark)
+        disclosures, hit, missed, unsure = _HoR_disclosures(fds, chamber_fp, self.house.manifest, watermark)
+        self._found(hit, missed, unsure, len(disclosures))
+        for disclosure in disclosures:
+            self.house_fetch.put(Filing(self.house, disclosure))
+
+    def _senate_source(self):
+        chamber_fp = self.data_fp / SENATE_DATA_FP.name
+        watermark = watermark_for(chamber_fp) if self.delta else None
+        client, pool = senate_sessions(self.senate_workers)
+        reports = _senate_members(search_reports(client, self.year, pool, watermark.since() if watermark is not None else None))
+        # a single worker still borrows its session from a pool
+        self.senate_pool = pool or SenateSessionPool([client])
+        self.senate = Chamber.open(chamber_fp, watermark)
+        disclosures, hit, missed, unsure = _senate_disclosures(reports, chamber_fp, self.senate.manifest, watermark)
+        self._found(hit, missed, unsure, len(disclosures))
+        for disclosure in disclosures:
+            self.senate_fetch.put(Filing(self.senate, disclosure))
+
+    def _found(self, hit: list, missed: list, unsure: list, todo: int):
+        with self.lock:
+            self.hit += hit
+            self.missed += missed
+            self.unsure += unsure
+            self.pbar.total = (self.pbar.total or 0) + todo
+            self.pbar.refresh()
+
+    # ========= stages ==========
+
+    def _fetch_house(self, filing: Filing):
+        try:
+            filing.content = _download_HoR_PDF(filing.disclosure.pdf_link)
+        except Exception as e:
+            filing.error = e
+            return self.persist.put(filing)
+        self.process.put(filing)
+
+    def _process_house(self, filing: Filing):
+        disclosure = filing.disclosure
+        try:
+            filing.chamber.manifest.record(filing.key, "download", content=filing.content)
+            filing.stage = "rasterize"
+            future = self.rasters.submit(metrics.call_recorded, _process_HoR_PDF, filing.content,
+                                         disclosure.container_fp, disclosure.filing_date, self.raster)
+            (filing.rows, filing.header), snapshot = future.result()
+            metrics.merge(snapshot)
+        except Exception as e:
+            filing.error = e
+        # the PDF isn't needed past here, don't hold it in the persist queue
+        filing.content = None
+        self.persist.put(filing)
+
+    def _fetch_senate(self, filing: Filing):
+        disclosure = filing.disclosure
+        try:
+            filing.parsed = self.senate_pool.run(disclosure_api, disclosure.member, disclosure.full_url)
+        except Exception as e:
+            filing.error = e
+        self.persist.put(filing)
+
+    def _persist(self, filing: Filing):
+        chamber, disclosure = filing.chamber, filing.disclosure
+        container_fp = None
+        if filing.error is None:
+            try:
+                if isinstance(disclosure, HouseDisclosure):
+                    _record_HoR_result(disclosure, filing.rows, filing.header, chamber.manifest, chamber.catalog)
+                    filing.stage = "holdings"
+                    _save_HoR_holding(disclosure, chamber.store, filing.rows)
+                    chamber.manifest.record(filing.key, filing.stage)
+                    if filing.header is not None:
+                        container_fp = disclosure.container_fp
+                else:
+                    filing.stage = "holdings"
+                    _save_senate_disclosure(disclosure, filing.parsed, chamber.manifest, chamber.store, chamber.catalog)
+                    if disclosure.member.is_scanned:
+                        container_fp = disclosure.disclosure_fp / f"{disclosure.name}{PAGES_SUFFIX}"
+            except Exception as e:
+                filing.error = e
+
+        with self.lock:
+            if filing.error is not None:
+                chamber.manifest.fail(filing.key, filing.stage, filing.error)
+                self.failed.append(filing.key)
+            else:
+                chamber.manifest.complete(filing.key)
+                member_fp = disclosure.member_fp if isinstance(disclosure, HouseDisclosure) else disclosure.disclosure_fp
+                self.hit.append(member_fp.name)
+                if self.first_result is None:
+                    self.first_result = time.perf_counter() - self.started
+            self.pbar.update()
+
+        if container_fp is not None and self.extract_workers > 0:
+            self.extract.put((chamber, self._extraction_job(chamber, disclosure, container_fp)))
+
+    def _extraction_job(self, chamber: Chamber, disclosure: Union[HouseDisclosure, SenateDisclosure], container_fp: Path):
+        from extract import ExtractionJob
+        if isinstance(disclosure, HouseDisclosure):
+            member_fp, key = disclosure.member_fp, disclosure.doc_id
+            entry = {"link": disclosure.pdf_link, "date": disclosure.filing_date}
+            # the same entry _save_HoR_holding wrote, the store replaces it whole
+            if disclosure.filing_type != 'O':
+                entry["type"] = disclosure.filing_type
+        else:
+            member_fp, key = disclosure.disclosure_fp, disclosure.name
+            entry = {"link": disclosure.full_url, "date": disclosure.member.date}
+        pages = chamber.catalog.entries[str(container_fp.relative_to(chamber.chamber_fp))]["pages"]
+        return ExtractionJob(json_fp=member_fp / f"{member_fp.name}.json", key=key, entry=entry,
+                             container_fp=container_fp, pages=pages)
+
+    def _extract(self, item: tuple):
+        chamber, job = item
+        try:
+            rows = self.extractor.extract(job)
+        except Exception as e:
+            # the filing stays without data, extract.py picks it up again
+            print(f"extraction failed for {job.json_fp.parent.name} {job.key}: {e!r}")
+            return
+        chamber.store.update(job.json_fp, {job.key: job.entry | {"data": rows}})
+        with self.lock:
+            self.extracted += 1
+
+    def run(self) -> list:
+        """ Scrape and extract until every queue has drained, returns the unsure name pairs. """
+        if self.extract_workers > 0 and self.extractor is None:
+            # imported here so scraping alone runs without the model SDKs installed
+            from extract import BatchExtractor
+            self.extractor = BatchExtractor(workers=self.extract_workers)
+        self.house = self.senate = None
+        self.senate_pool = None
+        self.started = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.raster_workers) as self.rasters, \
+             tqdm(total=0, desc=f"Scraping {self.year} financial disclosures") as self.pbar:
+            self._spawn("house-source", 1, None, self._house_source, [self.house_fetch])
+            self._spawn("senate-source", 1, None, self._senate_source, [self.senate_fetch])
+            self._spawn("house-fetch", self.download_workers, self.house_fetch, self._fetch_house, [self.process])
+            self._spawn("house-process", self.raster_workers, self.process, self._process_house, [self.persist])
+            self._spawn("senate-fetch", self.senate_workers, self.senate_fetch, self._fetch_senate, [self.persist])
+            self._spawn("persist", 1, self.persist, self._persist, [self.extract])
+            self._spawn("extract", max(self.extract_workers, 1), self.extract, self._extract, [])
+            for thread in self.threads:
+                thread.join()
+
+        for chamber in (self.house, self.senate):
+            if chamber is not None:
+                chamber.store.close()
+                chamber.manifest.compact()
+                chamber.catalog.compact()
+                if chamber.watermark is not None:
+                    chamber.watermark.advance(chamber.manifest)
+
+        print(f"hit: {sorted(self.hit)}")
+        print(f"missed: {sorted(self.missed)}")
+        if self.failed:
+            print(f"failed (rerun to retry): {sorted(self.failed)}")
+        if self.first_result is not None:
+            print(f"first filing done after {self.first_result:.1f}s, extracted {self.extracted} filings, "
+                  f"{time.perf_counter() - self.started:.1f}s in total")
+        return self.unsure
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape and extract one year of House and Senate disclosures as a stream")
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument("--fresh", action="store_true", help="wipe the year's data instead of resuming")
+    parser.add_argument("--delta", action="store_true", help="only filings new or amended since the last --delta run")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--raster-workers", type=int, default=4)
+    parser.add_argument("--senate-workers", type=int, default=4)
+    parser.add_argument("--extract-workers", type=int, default=8, help="0 to leave extraction to extract.py")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="filings held between two stages")
+    parser.add_argument("--dpi", type=int, default=RasterConfig.dpi, help="resolution scanned House filings are rasterized at")
+    parser.add_argument("--raster-format", default=RasterConfig.fmt, choices=("jpeg", "png", "tiff"), help="format of the rasterized pages")
+    args = parser.parse_args()
+
+    prepare([args.year], fresh=args.fresh)
+    metrics.reset()
+    pipeline = Pipeline(args.year, None, args.download_workers, args.raster_workers, args.senate_workers,
+                        args.extract_workers, args.queue_size, delta=args.delta,
+                        raster=RasterConfig(args.dpi, args.raster_format))
+    unsure = pipeline.run()
+    metrics.METRICS.write("pipeline", year_data_fp(args.year) / 'metrics')
+
+    for name_1, name_2 in unsure:
+        print(name_1, " <=> ", name_2)
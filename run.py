@@ -1,50 +1,64 @@
-from utils import HOR_DATA_FP, SENATE_DATA_FP, remove_directory
-from members import fetch_members, setup_members
-from holdings import scrape_house_of_representatives, scrape_senate
-from extract import disclosure_openai_VLM
+import argparse
 
-CONGRESS = 118 # most recent congress
-year = 2022
+import metrics
+from holdings import RasterConfig
+from pipeline import Pipeline
+from scheduler import SITE_LIMITS, HOUSE_SITE, SENATE_SITE, prepare, schedule
+from utils import year_data_fp
 
-try:
-    # clean up previous attempts
-    if HOR_DATA_FP.exists():
-        remove_directory(HOR_DATA_FP)
-    if SENATE_DATA_FP.exists():
-        remove_directory(SENATE_DATA_FP)
+# concurrency inside each House job, 1 and 1 runs the filings serially
+DOWNLOAD_WORKERS = 8
+RASTER_WORKERS = 4
+# sessions fetching Senate reports in each Senate job, they share one rate limit
+SENATE_WORKERS = 4
+# threads extracting scanned filings with --stream
+EXTRACT_WORKERS = 8
 
-    # fetch members for most recent congress
-    members = fetch_members(CONGRESS)
+def _years(value: str) -> range:
+    # "2022" or an inclusive range "2018-2022"
+    first, _, last = value.partition("-")
+    return range(int(first), int(last or first) + 1)
 
-    # create data folders and basic json structure
-    # -> /data/House of Representatives/
-    # -> /data/Senate/
-    setup_members(members)
+# guard so the worker process pools can spawn without rerunning the scrape
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape House and Senate financial disclosures for a range of years")
+    parser.add_argument("--years", type=_years, default=_years("2022"), help='e.g. 2022 or 2018-2022')
+    parser.add_argument("--congresses", type=_years, default=None,
+                        help="congresses to take members from, e.g. 118 or 115-118 (default: the ones sitting in those years)")
+    parser.add_argument("--workers", type=int, default=4, help="jobs running at once, one per year and chamber")
+    parser.add_argument("--house-jobs", type=int, default=SITE_LIMITS[HOUSE_SITE], help=f"jobs allowed on {HOUSE_SITE} at once")
+    parser.add_argument("--senate-jobs", type=int, default=SITE_LIMITS[SENATE_SITE], help=f"jobs allowed on {SENATE_SITE} at once")
+    # data and checkpoints from previous runs are kept, filings recorded as complete in
+    # data/{year}/checkpoints/ are skipped and failed or missing ones are retried
+    parser.add_argument("--fresh", action="store_true", help="wipe the data of these years instead of resuming")
+    # the daily refresh: a conditional request for the House index and a Senate search from the last filing date
+    parser.add_argument("--delta", action="store_true", help="only scrape filings that are new or amended since the last --delta run")
+    # pages of scanned House filings, rasterized a few at a time so long filings don't need more memory
+    parser.add_argument("--dpi", type=int, default=RasterConfig.dpi, help="resolution scanned House filings are rasterized at")
+    parser.add_argument("--raster-format", default=RasterConfig.fmt, choices=("jpeg", "png", "tiff"), help="format of the rasterized pages")
+    # timings and counters of every job always go to data/{year}/metrics/, profiles are opt-in per stage
+    parser.add_argument("--profile", nargs="*", default=[], metavar="STAGE",
+                        help="run these stages under cProfile, e.g. house.rasterize senate.parse_assets")
+    # one year at a time through pipeline.py, both chambers at once and extraction overlapping the scrape
+    parser.add_argument("--stream", action="store_true", help="scrape and extract each year as one stream")
+    parser.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS,
+                        help="with --stream, threads extracting scanned filings, 0 to leave it to extract.py")
+    args = parser.parse_args()
+    raster = RasterConfig(args.dpi, args.raster_format)
 
-    # House of Representatives
-    # -> /data/House of Representatives/{members}
-    unsure = scrape_house_of_representatives(year)
-    if unsure:
-        for name_1, name_2 in unsure:
-            print(name_1, " <=> ", name_2)
-        ans = input("Are any of these the same person? (yes or no) ")
-        if ans == "yes":
-            raise RuntimeError("please add both names into interchangable_names.json and rerun run.py")
+    if args.stream:
+        results = {}
+        for year in prepare(args.years, args.congresses, args.fresh):
+            recorded = metrics.reset(args.profile)
+            pipeline = Pipeline(year, None, DOWNLOAD_WORKERS, RASTER_WORKERS, SENATE_WORKERS, args.extract_workers,
+                                delta=args.delta, raster=raster)
+            results[year] = pipeline.run()
+            recorded.write("pipeline", year_data_fp(year) / 'metrics')
+    else:
+        results = schedule(args.years, args.congresses, args.workers, {HOUSE_SITE: args.house_jobs, SENATE_SITE: args.senate_jobs},
+                           DOWNLOAD_WORKERS, RASTER_WORKERS, SENATE_WORKERS, args.fresh, args.profile, args.delta, raster)
 
-    # Senate
-    # -> /data/Senate/{members}
-    unsure = scrape_senate(year)
-    if unsure:
+    # names the index could not resolve, add real matches to interchangable_names.json
+    for job, unsure in sorted(results.items(), key=lambda item: str(item[0])):
         for name_1, name_2 in unsure:
-            print(name_1, " <=> ", name_2)
-        ans = input("Are any of these the same person? (yes or no) ")
-        if ans == "yes":
-            raise RuntimeError("please add both names into interchangable_names.json and rerun run.py")
-
-except (KeyboardInterrupt, Exception) as e:
-    # remove everything in directory
-    if HOR_DATA_FP.exists():
-        remove_directory(HOR_DATA_FP)
-    if SENATE_DATA_FP.exists():
-        remove_directory(SENATE_DATA_FP)
-    raise e
\ No newline at end of file
+            print(f"{job}: {name_1} <=> {name_2}")
@@ -0,0 +1,124 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import metrics
+
+from utils import HOR_DATA_FP, SENATE_DATA_FP, year_data_fp, remove_directory
+from members import Member, MemberRegistry, congress_for_year, setup_members
+from holdings import RasterConfig, scrape_house_of_representatives, scrape_senate
+
+# Each (year, chamber) is one job running in its own worker process, scraping into
+#   data/{year}/House of Representatives/{member}
+#   data/{year}/Senate/{member}
+# with that year's checkpoints and catalog in data/{year}/checkpoints/ and data/{year}/catalog/,
+# and the job's stage timings and counters in data/{year}/metrics/{chamber}.json and .prom.
+
+HOUSE_SITE = "disclosures-clerk.house.gov"
+SENATE_SITE = "efdsearch.senate.gov"
+# jobs allowed to scrape a site at once, each Senate job rate limits itself so more than one multiplies the rate
+SITE_LIMITS = {HOUSE_SITE: 2, SENATE_SITE: 1}
+
+@dataclass(frozen=True)
+class Job:
+    year: int
+    chamber: str # HOR_DATA_FP.name or SENATE_DATA_FP.name
+
+    @property
+    def site(self) -> str:
+        return HOUSE_SITE if self.chamber == HOR_DATA_FP.name else SENATE_SITE
+
+    def __str__(self):
+        return f"{self.year} {self.chamber}"
+
+def _run_job(job: Job, download_workers: int, raster_workers: int, senate_workers: int, profile: tuple[str, ...] = (),
+             delta: bool = False, raster: RasterConfig = RasterConfig()) -> list:
+    chamber_fp = year_data_fp(job.year) / job.chamber
+    # worker processes are reused across jobs, every job starts from zero
+    recorded = metrics.reset(profile)
+    try:
+        if job.site == HOUSE_SITE:
+            return scrape_house_of_representatives(job.year, download_workers, raster_workers, chamber_fp, delta, raster)
+        return scrape_senate(job.year, senate_workers, chamber_fp, delta)
+    finally:
+        # written for failed jobs too, they show which stage it died in
+        recorded.write(job.chamber, year_data_fp(job.year) / 'metrics')
+
+def members_for_year(registry: MemberRegistry, year: int, congresses: list[int]) -> list[Member]:
+    """ Members of the congress sitting that year, or of every given congress if that one wasn't asked for. """
+    if congress_for_year(year) in congresses:
+        return registry.get(congress_for_year(year))
+    members = {}
+    for congress in congresses:
+        for member in registry.get(congress):
+            members[(member.chamber, member.key)] = member
+    return list(members.values())
+
+def prepare(years: Iterable[int], congresses: Optional[Iterable[int]] = None, fresh: bool = False) -> list[int]:
+    """ Set up the member folders of every year, returns the years in order. """
+    years = sorted(set(years))
+    congresses = sorted(set(congresses)) if congresses else sorted({congress_for_year(year) for year in years})
+
+    # one registry for every year, so each congress is fetched once
+    registry = MemberRegistry()
+    for year in years:
+        # data from previous runs is kept and resumed from its checkpoints unless fresh
+        if fresh and year_data_fp(year).exists():
+            remove_directory(year_data_fp(year))
+        setup_members(members_for_year(registry, year, congresses), year_data_fp(year))
+    return years
+
+def schedule(years: Iterable[int], congresses: Optional[Iterable[int]] = None, workers: int = 4,
+             site_limits: dict[str, int] = SITE_LIMITS, download_workers: int = 1, raster_workers: int = 1,
+             senate_workers: int = 1, fresh: bool = False, profile: Iterable[str] = (), delta: bool = False,
+             raster: RasterConfig = RasterConfig()) -> dict[Job, list]:
+    """
+    Scrape both chambers for every year, running up to workers jobs at once and at most
+    site_limits[site] against each site. Returns the unsure name pairs of every job that finished.
+    Stages named in profile (e.g. "house.rasterize") are also run under cProfile. With delta
+    every job only scrapes what is new since its last delta run.
+    """
+    profile = tuple(profile)
+    years = prepare(years, congresses, fresh)
+
+    queued = {site: deque() for site in site_limits}
+    for year in years:
+        for chamber_fp in [HOR_DATA_FP, SENATE_DATA_FP]:
+            job = Job(year, chamber_fp.name)
+            queued[job.site].append(job)
+    running = {site: 0 for site in site_limits}
+
+    results = {}
+    failed = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def _submit() -> bool:
+            # the next job of the first site that is still under its limit
+            for site, jobs in queued.items():
+                if jobs and running[site] < site_limits[site]:
+                    job = jobs.popleft()
+                    running[site] += 1
+                    pending[executor.submit(_run_job, job, download_workers, raster_workers, senate_workers, profile, delta, raster)] = job
+                    return True
+            return False
+
+        while len(pending) < workers and _submit(): pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                running[job.site] -= 1
+                try:
+                    results[job] = future.result()
+                    print(f"finished {job}")
+                except Exception as e:
+                    # the job's checkpoints keep what it finished, rerunning resumes it
+                    failed[job] = e
+                    print(f"failed {job}: {e!r}")
+            while len(pending) < workers and _submit(): pass
+
+    if failed:
+        print(f"failed (rerun to retry): {sorted(map(str, failed))}")
+    return results
@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import metrics
+from utils import update_holding_json
+
+class HoldingsStore:
+    """
+    Single writer for the member JSON files.
+
+    Updates are appended to a log and merged in memory, then compacted into the
+    per-member JSON files every batch_size updates (and on flush/close), so each
+    member file is rewritten once per batch instead of once per filing. Updates
+    that were logged but never compacted (e.g. the run crashed) are replayed the
+    next time a store is opened on the same log.
+    """
+
+    def __init__(self, log_fp: Path, batch_size: int = 50):
+        self.log_fp = log_fp
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending: dict[Path, dict] = {}
+        self.count = 0
+
+        log_fp.parent.mkdir(parents=True, exist_ok=True)
+        if log_fp.exists():
+            self._replay()
+        self.log = open(log_fp, "a")
+
+    def _replay(self):
+        good = 0
+        with open(self.log_fp, "rb") as file:
+            for line in file:
+                # the last line may be cut short by a crash
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self.pending.setdefault(Path(entry['path']), {}).update(entry['holdings'])
+                self.count += 1
+                good += len(line)
+        # cut off the partial line, or the next update would be appended to it and lost with it
+        with open(self.log_fp, "r+b") as file:
+            file.truncate(good)
+            os.fsync(file.fileno())
+
+    def update(self, path_to_json: Path, holdings: dict):
+        assert path_to_json.exists(), f"{path_to_json} does not exist"
+        with self.lock:
+            self.log.write(json.dumps({"path": str(path_to_json), "holdings": holdings}) + "\n")
+            self.log.flush()
+            # on disk before the caller records the filing as complete
+            os.fsync(self.log.fileno())
+            self.pending.setdefault(path_to_json, {}).update(holdings)
+            self.count += 1
+            if self.count >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        with metrics.stage("store.flush"):
+            for path_to_json, holdings in self.pending.items():
+                # the log is truncated next, so the member files have to be on disk first
+                update_holding_json(path_to_json, holdings, fsync=True)
+        metrics.count("member_files_written", len(self.pending))
+        self.pending.clear()
+        self.count = 0
+        # everything logged so far is now in the member files
+        self.log.truncate(0)
+        os.fsync(self.log.fileno())
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+        self.log.close()
+        self.log_fp.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
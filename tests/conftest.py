@@ -0,0 +1,24 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules are flat at the top of the repo
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import bench
+
+@pytest.fixture(scope="session")
+def fixtures() -> bench.Fixtures:
+    return bench.Fixtures(year=2022, congress=117, house_members=6, senators=4, scanned=0.5, scan_pages=2, assets=10)
+
+@pytest.fixture(scope="session")
+def stand_in(fixtures):
+    """ bench.py's local stand-in for every site, with the modules pointed at it. """
+    # the stand-in is local, never send it through a proxy
+    os.environ["NO_PROXY"] = "127.0.0.1"
+    server = bench.StandIn(fixtures)
+    bench._point_at(server.url)
+    yield server
+    server.shutdown()
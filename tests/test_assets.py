@@ -0,0 +1,8 @@
+from assets import asset_ticker, normalize_asset
+
+def test_tickers_skip_owner_and_account_codes():
+    assert asset_ticker("Apple Inc. (AAPL)") == "AAPL"
+    assert asset_ticker("Vanguard S&P 500 ETF (VOO) (IRA)") == "VOO"
+    assert asset_ticker("Microsoft Corporation (MSFT) (SP)") == "MSFT"
+    assert asset_ticker("Brokerage Account (JT)") is None
+    assert normalize_asset("NVIDIA Corporation - Common Stock (NVDA) (IRA)") == "NVIDIA"
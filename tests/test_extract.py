@@ -0,0 +1,57 @@
+import json
+import random
+
+import pytest
+
+# extract imports the model SDKs at the top
+pytest.importorskip("openai")
+pytest.importorskip("google.generativeai")
+
+import bench
+import extract
+import metrics
+from images import PayloadCache, PreprocessConfig
+from pages import write_pages
+from store import HoldingsStore
+
+def test_batch_extraction_merges_page_groups_in_order(stand_in, tmp_path, monkeypatch):
+    monkeypatch.setattr(extract, "OPENAI_URL", f"{stand_in.url}/v1/chat/completions")
+    rng = random.Random(0)
+    container_fp = tmp_path / "filing.pages"
+    write_pages(container_fp, [bench._gif(rng) for _ in range(5)])
+    json_fp = tmp_path / "member.json"
+    json_fp.write_text(json.dumps({"holdings": {}}))
+    job = extract.ExtractionJob(json_fp, "report", {"date": "2022-05-12"}, container_fp, 5)
+
+    extractor = extract.BatchExtractor(workers=2, pages_per_request=2, cache=PayloadCache(tmp_path / "payloads"),
+                                       results=extract.ExtractionCache(tmp_path / "extractions"))
+    with HoldingsStore(tmp_path / "extract.log") as store:
+        assert extractor.run([job], store) == []
+    # the stand-in answers five rows per page, numbered within each request
+    rows = json.loads(json_fp.read_text())["holdings"]["report"]["data"]
+    assert [row["Asset"] for row in rows] == [f"Asset {i}" for n in (10, 10, 5) for i in range(n)]
+    assert extractor.tokens_used > 0
+
+    # the same pages again are answered from the result cache
+    recorded = metrics.reset()
+    assert extractor.extract(job) == rows
+    assert not recorded.requests
+
+def test_results_are_keyed_by_preprocessing_and_max_tokens():
+    cache = extract.ExtractionCache()
+    key = lambda config, max_tokens: cache.key(["00" * 32], "system", "user", "model", config, max_tokens)
+    assert key(PreprocessConfig(), 4096) == key(PreprocessConfig(), 4096)
+    assert key(PreprocessConfig(), 4096) != key(PreprocessConfig(grayscale=False), 4096)
+    assert key(PreprocessConfig(), 4096) != key(PreprocessConfig(), 300)
+
+def test_calls_without_a_session_go_through_the_retrying_transport(fixtures, stand_in, monkeypatch):
+    flaky = bench.StandIn(fixtures, flaky=0.5)
+    monkeypatch.setattr(extract, "OPENAI_URL", f"{flaky.url}/v1/chat/completions")
+    try:
+        recorded = metrics.reset()
+        for _ in range(10):
+            response = extract.openai_chat_with_payloads(["aGk="], "image/jpeg", extract.SYSTEM_TEXT, extract.USER_TEXT)
+            assert response.status_code == 200
+        assert recorded.counters["http_retries"] > 0
+    finally:
+        flaky.shutdown()
@@ -0,0 +1,53 @@
+import random
+from pathlib import Path
+
+import pytest
+
+import bench
+import holdings
+from holdings import iter_HoR_FD_XML, parse_HoR_schedule_A
+
+# pdftotext -layout of an e-filed annual report: a three line header with the Tx. > $1,000? column,
+# cells wrapped onto a second line and a page break repeating the header
+FD_TEXT = (Path(__file__).parent / "fixtures" / "HoR_FD_annual.txt").read_text()
+
+@pytest.mark.parametrize("tx", [False, True])
+def test_schedule_A_rows_keep_their_income(tx):
+    rng = random.Random(0)
+    rows = parse_HoR_schedule_A("\n".join(bench.make_schedule_A(rng, 20, "10000000", tx=tx)))
+    assert len(rows) == 20
+    for row in rows:
+        assert row["Income"] in bench.BRACKETS
+        assert row["Owner"] in ("Self", "Spouse", "Joint")
+
+def test_iterparse_matches_the_beautifulsoup_loader(tmp_path):
+    xml_fp = tmp_path / "FD.xml"
+    bench.make_HoR_FD_XML(xml_fp, 500)
+    assert bench._iterparse_HoR_FD_XML(xml_fp) == bench._bs4_HoR_FD_XML(xml_fp)
+    assert len(list(iter_HoR_FD_XML(xml_fp, filing_types=None))) == 500
+
+def test_schedule_A_of_an_e_filed_report():
+    rows = parse_HoR_schedule_A(FD_TEXT)
+    assert [(row["Asset"], row["Owner"], row["Value"], row["Income Type"], row["Income"]) for row in rows] == [
+        ("Apple Inc. (AAPL)", "Spouse", "$1,001 - $15,000", "Dividends", "$1 - $200"),
+        ("Vanguard Total Stock Market Index Fund Admiral Shares (VTSAX)", "Self", "$250,001 - $500,000",
+         "Capital Gains, Dividends", "$5,001 - $15,000"),
+        ("Wells Fargo checking account", "Joint", "$15,001 - $50,000", "Interest", "$1 - $200"),
+        ("123 Main Street rental", "Self", "$500,001 - $1,000,000", "Rent", "$15,001 - $50,000"),
+        ("Acme Ventures LLC", "Self", "Undetermined", "None", ""),
+        ("Microsoft Corporation (MSFT)", "Spouse", "Spouse/DC Over $1,000,000", "Dividends", "$2,501 - $5,000"),
+        ("Tesla, Inc. (TSLA)", "Self", "$15,001 - $50,000", "Capital Gains", "$1,001 - $2,500"),
+        ("US Treasury Bill 912797FH5", "Child", "$100,001 - $250,000", "Interest", "$2,501 - $5,000"),
+    ]
+
+def test_misaligned_text_is_rasterized_instead(monkeypatch, tmp_path):
+    # titles printed left of their columns split the cells in the wrong places
+    text = "\n".join(line[10:] if "Value of Asset" in line else line for line in FD_TEXT.splitlines())
+    assert parse_HoR_schedule_A(text)
+    monkeypatch.setattr(holdings, "_HoR_PDF_text", lambda content: text)
+    monkeypatch.setattr(holdings, "_rasterize_HoR_PDF", lambda *args: {"pages": []})
+    assert holdings._process_HoR_PDF(b"", tmp_path / "filing.pages", "05/15/2023") == (None, {"pages": []})
+
+    monkeypatch.setattr(holdings, "_HoR_PDF_text", lambda content: FD_TEXT)
+    rows, header = holdings._process_HoR_PDF(b"", tmp_path / "filing.pages", "05/15/2023")
+    assert len(rows) == 8 and header is None
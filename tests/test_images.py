@@ -0,0 +1,20 @@
+import os
+import random
+
+import bench
+import images
+from images import PayloadCache
+
+def test_an_entry_evicted_under_a_reader_is_a_miss(tmp_path, monkeypatch):
+    page = bench._gif(random.Random(0))
+    cache = PayloadCache(tmp_path)
+    payload = cache.get(page)
+
+    # another worker evicts the entry right after this one found it
+    utime = os.utime
+    def utime_then_evict(fp):
+        utime(fp)
+        os.unlink(fp)
+    monkeypatch.setattr(images.os, "utime", utime_then_evict)
+    assert cache.get(page) == payload
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,46 @@
+import json
+
+import metrics
+import members
+import transport
+from members import MemberRegistry, ResponseCache, get_current_congress, get_members
+
+def test_get_members_pages_through_the_count(stand_in, fixtures, tmp_path):
+    cache = ResponseCache(tmp_path)
+    assert get_members(fixtures.congress, limit=3, cache=cache) == fixtures.members
+    assert get_current_congress(cache) == fixtures.congress
+
+def test_fresh_entries_are_served_without_a_request(stand_in, fixtures, tmp_path):
+    cache = ResponseCache(tmp_path)
+    get_current_congress(cache)
+    recorded = metrics.reset()
+    assert get_current_congress(cache) == fixtures.congress
+    assert recorded.counters["members_cache_hits"] == 1
+    assert not recorded.requests
+
+def test_stale_entries_are_revalidated_with_a_304(stand_in, fixtures, tmp_path):
+    cache = ResponseCache(tmp_path, ttl=0)
+    url = f"{members.BASE_URL}/member/congress/{fixtures.congress}"
+    params = {"api_key": members.API_KEY, "limit": 5, "offset": 0}
+    body = cache.get_json(transport.session(url), url, params)
+    with open(cache._fp(url, params), "r") as file:
+        before = json.load(file)
+    assert before["etag"]
+
+    recorded = metrics.reset()
+    assert cache.get_json(transport.session(url), url, params) == body
+    assert recorded.counters["members_not_modified"] == 1
+    with open(cache._fp(url, params), "r") as file:
+        after = json.load(file)
+    assert after["body"] == before["body"] and after["fetched_at"] > before["fetched_at"]
+
+def test_registries_pick_up_members_who_joined_mid_congress(stand_in, fixtures, tmp_path):
+    cache = ResponseCache(tmp_path, ttl=0)
+    before = MemberRegistry(cache).get(fixtures.congress)
+    fixtures.members.append(dict(fixtures.members[0], name="Joined, Late"))
+    try:
+        after = MemberRegistry(cache).get(fixtures.congress)
+    finally:
+        fixtures.members.pop()
+    assert len(after) == len(before) + 1
+    assert after[-1].full_name == "Joined, Late"
@@ -0,0 +1,35 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from transport import RetryingSession
+
+BODY = b"x" * 100_000
+
+class _ChunkedGzip(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(body), 100):
+            chunk = body[i:i + 100]
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+def test_bytes_of_chunked_compressed_bodies_are_counted(stand_in):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChunkedGzip)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        recorded = metrics.reset()
+        assert RetryingSession().get(f"http://127.0.0.1:{server.server_port}/").content == BODY
+        assert recorded.requests["127.0.0.1"]["bytes"] == len(BODY)
+    finally:
+        server.shutdown()
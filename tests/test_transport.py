@@ -0,0 +1,26 @@
+import pytest
+import requests
+
+import bench
+import metrics
+from transport import Transport
+
+@pytest.fixture
+def flaky(fixtures, request):
+    server = bench.StandIn(fixtures, flaky=request.param)
+    yield server
+    server.shutdown()
+
+@pytest.mark.parametrize("flaky", [1.0], indirect=True)
+def test_download_attempts_are_bounded_by_its_own_retries(flaky, fixtures, tmp_path):
+    recorded = metrics.reset()
+    url = f"{flaky.url}/public_disc/financial-pdfs/{fixtures.year}FD.zip"
+    with pytest.raises(requests.HTTPError):
+        Transport(max_retries=2).download(url, tmp_path / "FD.zip")
+    assert recorded.requests["127.0.0.1"]["count"] == 3
+
+@pytest.mark.parametrize("flaky", [0.3], indirect=True)
+def test_download_resumes_cut_off_files(flaky, fixtures, tmp_path):
+    url = f"{flaky.url}/public_disc/financial-pdfs/{fixtures.year}FD.zip"
+    fp = Transport(max_retries=20).download(url, tmp_path / "FD.zip")
+    assert fp.read_bytes() == fixtures.fd_zip
@@ -0,0 +1,11 @@
+from utils import NameIndex
+
+def test_names_resolve_through_nicknames_and_typos():
+    names = NameIndex(["SMITH, CHRISTOPHER", "JONES, MICHAEL", "BROWN, KATHERINE"])
+    assert names.resolve("SMITH", "CHRIS") == "SMITH, CHRISTOPHER"
+    assert names.resolve("JONES", "MIKE") == "JONES, MICHAEL"
+    assert names.resolve("BROWN", "KATHERYNE") == "BROWN, KATHERINE"
+
+def test_a_bare_prefix_is_not_a_match():
+    assert NameIndex(["SMITH, CHRISTINE"]).resolve("SMITH", "CHRISTOPHER") is None
+    assert NameIndex(["SMITH, DANIELLE"]).resolve("SMITH", "DAN") is None
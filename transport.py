@@ -0,0 +1,196 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from utils import RateLimiter
+
+# (connect, read) seconds, a read timeout is the longest gap between bytes, not the whole download
+DEFAULT_TIMEOUT = (10, 60)
+# connections kept alive per host, enough for the download workers of a House job
+POOL_SIZE = 16
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+# a Retry-After is honored up to this many seconds, a server asking for more has given up on us
+RETRY_AFTER_MAX = 600.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# a body cut off before its Content-Length surfaces as ChunkedEncodingError
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+CHUNK_SIZE = 1 << 20
+
+def retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    """ The response's Retry-After (seconds or an HTTP date), else exponential backoff with jitter. """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        if retry_after.strip().isdigit():
+            return min(RETRY_AFTER_MAX, float(retry_after))
+        try:
+            return min(RETRY_AFTER_MAX, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            pass
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+class RetryingSession(requests.Session):
+    """
+    Keep-alive session with a default timeout that retries connection errors, timeouts and
+    429/5xx responses with backoff. With a limiter every attempt waits on it first. A request's
+    max_retries overrides the session's, 0 for a caller with a retry loop of its own.
+    """
+
+    def __init__(self, timeout: tuple[float, float] = DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES,
+                 pool_size: int = POOL_SIZE, limiter: Optional[RateLimiter] = None):
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = limiter
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        metrics.instrument(self)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        max_retries = kwargs.pop("max_retries", self.max_retries)
+        for attempt in range(max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.wait(url)
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except RETRY_ERRORS:
+                if attempt == max_retries:
+                    raise
+                delay = retry_delay(None, attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    return response
+                delay = retry_delay(response, attempt)
+                response.close()
+            metrics.count("http_retries")
+            time.sleep(delay)
+
+def _content_total(response: requests.Response) -> Optional[int]:
+    # "bytes 100-999/1000" of a 206, the Content-Length of a 200
+    if response.status_code == 206:
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+class Transport:
+    """ One pooled RetryingSession per host, shared by every thread of the process. """
+
+    def __init__(self, timeout: tuple[float, float] = DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES, pool_size: int = POOL_SIZE):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.sessions: dict[str, RetryingSession] = {}
+        self.lock = threading.Lock()
+
+    def session(self, url: str) -> RetryingSession:
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.sessions:
+                self.sessions[host] = RetryingSession(self.timeout, self.max_retries, self.pool_size)
+            return self.sessions[host]
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session(url).get(url, **kwargs)
+
+    def check(self, url: str, validators: dict) -> tuple[bool, dict]:
+        """
+        Conditional HEAD of url against the validators of an earlier check, returns whether it
+        changed since and its current validators. Without validators to compare it has changed.
+        """
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        response = self.session(url).head(url, headers=headers, allow_redirects=True)
+        if response.status_code == 304:
+            return False, validators
+        if response.status_code != 200:
+            raise requests.HTTPError(f"Received status code {response.status_code} when checking {url}")
+        current = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        # a server ignoring the conditional headers still answers with the same validators
+        return not any(current.values()) or current != validators, current
+
+    def download(self, url: str, fp: Path, chunk_size: int = CHUNK_SIZE) -> Path:
+        """
+        Stream url to fp through {fp}.part. A download cut off midway is resumed with a Range
+        request from the bytes already on disk, if-range so a file changed in between starts over.
+        The session doesn't retry these requests, every retry is a resume of this loop.
+        """
+        part_fp = fp.with_name(f"{fp.name}.part")
+        # a part left by another run can't be validated, so don't resume it
+        part_fp.unlink(missing_ok=True)
+        session = self.session(url)
+        validator = None
+        for attempt in range(self.max_retries + 1):
+            offset = part_fp.stat().st_size if part_fp.exists() else 0
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset and validator else {}
+            try:
+                with session.get(url, stream=True, headers=headers, max_retries=0) as response:
+                    if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                        metrics.count("http_retries")
+                        time.sleep(retry_delay(response, attempt))
+                        continue
+                    if response.status_code not in (200, 206):
+                        raise requests.HTTPError(f"Received status code {response.status_code} when downloading {url}")
+                    # 200 to a range request means the server sent the whole file again
+                    mode = "ab" if response.status_code == 206 else "wb"
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    total = _content_total(response)
+                    with open(part_fp, mode) as file:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            file.write(chunk)
+            except RETRY_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if total is None or part_fp.stat().st_size == total:
+                    os.replace(part_fp, fp)
+                    return fp
+                if attempt == self.max_retries:
+                    raise requests.HTTPError(f"Download of {url} stopped at {part_fp.stat().st_size} of {total} bytes")
+            if part_fp.exists() and validator is not None:
+                metrics.count("download_resumes")
+            time.sleep(retry_delay(None, attempt))
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+# the transport of this process, module level so every module shares its connections
+TRANSPORT = Transport()
+
+def _after_fork():
+    # a forked worker must not write to the sockets of its parent's pools
+    global TRANSPORT
+    TRANSPORT = Transport(TRANSPORT.timeout, TRANSPORT.max_retries, TRANSPORT.pool_size)
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def session(url: str) -> RetryingSession:
+    return TRANSPORT.session(url)
+
+def get(url: str, **kwargs) -> requests.Response:
+    return TRANSPORT.get(url, **kwargs)
+
+def check(url: str, validators: dict) -> tuple[bool, dict]:
+    return TRANSPORT.check(url, validators)
+
+def download(url: str, fp: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> Path:
+    return TRANSPORT.download(url, Path(fp), chunk_size)
@@ -1,6 +1,14 @@
 from collections import defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+import threading
+import time
 import unicodedata
+import hashlib
 import json
+import os
 from pathlib import Path
 import shutil
 import re
@@ -11,24 +19,128 @@ def remove_directory(path:Path):
         return True
     raise FileExistsError(f"directory {path} does not exist")
 
-def update_holding_json(path_to_json:Path, holdings:dict):
+def update_holding_json(path_to_json:Path, holdings:dict, fsync: bool = False):
     assert path_to_json.exists(), f"{path_to_json} does not exist"
     with open(path_to_json, "r") as file:
         data = json.load(file)
 
     data['holdings'] = data['holdings'] | holdings
 
-    with open(path_to_json, "w") as file:
-        json.dump(data, file, indent=4)
+    atomic_write_json(path_to_json, data, fsync=fsync, indent=4)
+
+def atomic_write_json(path: Path, data, fsync: bool = False, **kwargs):
+    # write next to the target and swap it in so a crash never leaves a half written file,
+    # with fsync the new file is also on disk before this returns
+    tmp_fp = path.with_name(f".{path.name}.tmp")
+    with open(tmp_fp, "w") as file:
+        json.dump(data, file, **kwargs)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(tmp_fp, path)
+
+class JsonJournal:
+    """
+    A json object kept as a snapshot file plus a {path}.log of {"key", "value"} lines, one per key changed
+    since. A change costs an append instead of rewriting the whole file, the log is folded into the
+    snapshot every compact_every changes and on compact(). Not thread-safe, callers hold their own lock.
+    """
+
+    def __init__(self, path: Path, compact_every: int = 1000):
+        self.path = path
+        self.log_fp = path.with_name(f"{path.name}.log")
+        self.compact_every = compact_every
+        if path.exists():
+            with open(path, "r") as file:
+                self.data: dict = json.load(file)
+        else:
+            self.data = {}
+        self.log = None
+        self.changes = 0
+        # bytes of the log that replayed, a line cut short by a crash is cut off before the next append
+        self.good = self._replay()
+
+    def _replay(self) -> int:
+        good = 0
+        if not self.log_fp.exists():
+            return good
+        with open(self.log_fp, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    change = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self.data[change["key"]] = change["value"]
+                self.changes += 1
+                good += len(line)
+        return good
+
+    def set(self, key: str, value):
+        self.data[key] = value
+        if self.log is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.log = open(self.log_fp, "a")
+            self.log.truncate(self.good)
+        self.log.write(json.dumps({"key": key, "value": value}) + "\n")
+        self.log.flush()
+        self.changes += 1
+        if self.changes >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """ Write the snapshot and drop the log. """
+        if self.log is None and not self.log_fp.exists():
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.path, self.data, indent=4)
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        self.log_fp.unlink(missing_ok=True)
+        self.changes = 0
+        self.good = 0
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+_AMOUNT_RE = re.compile(r'\$\s*([\d,]+(?:\.\d+)?)')
+
+@lru_cache(maxsize=4096)
+def parse_amount_range(text: Optional[str]) -> tuple[Optional[int], Optional[int]]:
+    """
+    Dollar bounds of a disclosed value or income bracket, None where a bound is unknown:
+    "$100,001 - $250,000" -> (100001, 250000), "Over $50,000,000" -> (50000001, None),
+    "None (or less than $201)" -> (0, 200), "None" -> (0, 0), "Undetermined" -> (None, None)
+    """
+    if not text:
+        return None, None
+    lowered = text.lower()
+    amounts = [round(float(amount.replace(',', ''))) for amount in _AMOUNT_RE.findall(text)]
+    if not amounts:
+        return (0, 0) if lowered.strip().startswith('none') else (None, None)
+    if 'less than' in lowered or 'under' in lowered:
+        return 0, amounts[0] - 1
+    if 'over' in lowered or 'more than' in lowered:
+        return amounts[0] + 1, None
+    return min(amounts), max(amounts)
 
 def remove_accents(input_str):
     nfkd_form = unicodedata.normalize('NFKD', input_str)
     return ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
 
+# first word that doesn't end with a period
+_FIRST_NAME_RE = re.compile(r'\b(\w+)\b(?!\.\s|\.)')
+
 def standardize_name(full_name: str):
     full_name = remove_accents(full_name.strip()).upper()
     # Use regex to find the first word that doesn't end with a period
-    match = re.search(r'\b(\w+)\b(?!\.\s|\.)', full_name)
+    match = _FIRST_NAME_RE.search(full_name)
     if match:
         # return match.group(1).strip()[:2]
         return match.group(1).strip()
@@ -48,6 +160,7 @@ def get_state_district_to_name_map():
             ret[data['state_district']] = member.name
     return ret
 
+@lru_cache(maxsize=None)
 def _get_interchangable_names() -> dict[str, str]:
     p = Path(__file__).resolve().parent / "interchangable_names.json"
     with open(p, "r") as f:
@@ -61,23 +174,100 @@ def interchange_name(full_name: str):
     interchangable_names_map = _get_interchangable_names()
     return interchangable_names_map.get(full_name, full_name)
 
-def house_last_names() -> dict[str, list[str]]:
-    ret = defaultdict(list)
-    for path in HOR_DATA_FP.iterdir():
-        last_name = path.name.split(",")[0].strip()
-        ret[last_name].append(path.name)
-    return ret
+def _first_name_forms(first_name: str) -> tuple[str, ...]:
+    return (first_name, *NICKNAMES.get(first_name, ()))
 
-def senate_last_names() -> dict[str, list[str]]:
-    ret = defaultdict(list)
-    for path in SENATE_DATA_FP.iterdir():
-        last_name = path.name.split(",")[0]
-        ret[last_name].append(path.name)
-    return ret
+def _first_name_score(a: str, b: str) -> float:
+    # short forms only through NICKNAMES, a bare prefix is as likely another name (CHRIS, CHRISTINE)
+    if set(_first_name_forms(a)) & set(_first_name_forms(b)):
+        return 1.0
+    # typos, compared as written so a nickname's formal form isn't stretched to a third name (DAN, DANIELLE)
+    return SequenceMatcher(None, a, b).ratio()
+
+FUZZY_THRESHOLD = 0.8
+
+class NameIndex:
+    """ Resolves standardized (last, first) names from filings to member folder keys. """
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys = set(keys)
+        self.last_names: dict[str, list[str]] = defaultdict(list)
+        # (last name, first name or its formal form) -> key, None if more than one member matches
+        self.variants: dict[tuple[str, str], Optional[str]] = {}
+
+        for key in sorted(self.keys):
+            last_name, first_name = (part.strip() for part in key.split(",", 1))
+            self.last_names[last_name].append(key)
+            for form in _first_name_forms(first_name):
+                variant = (last_name, form)
+                self.variants[variant] = key if self.variants.get(variant, key) == key else None
+
+    @classmethod
+    def from_directory(cls, path: Path) -> "NameIndex":
+        return cls(p.name for p in path.iterdir() if p.is_dir())
+
+    def resolve(self, last_name: str, first_name: str) -> Optional[str]:
+        key = f"{last_name}, {first_name}"
+        if key in self.keys:
+            return key
+        if (swapped := interchange_name(key)) in self.keys:
+            return swapped
+
+        # nicknames, "MIKE" -> "MICHAEL"
+        for form in _first_name_forms(first_name):
+            if key := self.variants.get((last_name, form)):
+                return key
+
+        # fuzzy match the first name against members sharing the last name
+        scored = sorted(((_first_name_score(first_name, candidate.split(",", 1)[1].strip()), candidate)
+                         for candidate in self.last_names.get(last_name, [])), reverse=True)
+        if scored and scored[0][0] >= FUZZY_THRESHOLD and (len(scored) == 1 or scored[1][0] < scored[0][0]):
+            return scored[0][1]
+        return None
+
+class RateLimiter:
+    """
+    Thread-safe token bucket per host: rate tokens per second to each host, up to burst saved up.
+    A request costs one token unless told otherwise (e.g. model tokens against a per-minute budget).
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.interval = 1 / rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        # host -> time at which its bucket will be empty again
+        self.empty_at: dict[str, float] = {}
+
+    def wait(self, url: str, cost: float = 1):
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            empty_at = max(self.empty_at.get(host, now), now) + cost * self.interval
+            self.empty_at[host] = empty_at
+        # go once the bucket holds no more than burst
+        ready_at = empty_at - self.burst * self.interval
+        if ready_at > now:
+            time.sleep(ready_at - now)
 
 BASE_DATA_FP = Path(__file__).resolve().parent / 'data'
 HOR_DATA_FP = BASE_DATA_FP / 'House of Representatives'
 SENATE_DATA_FP = BASE_DATA_FP / 'Senate'
+CHECKPOINT_FP = BASE_DATA_FP / 'checkpoints'
+CACHE_FP = BASE_DATA_FP / 'cache'
+
+def year_data_fp(year: int) -> Path:
+    # data of a scheduled run is partitioned by year: data/{year}/{chamber}/{member}
+    return BASE_DATA_FP / str(year)
+
+def checkpoint_fp(chamber_fp: Path) -> Path:
+    # checkpoints sit next to the chamber folders of the same partition
+    return chamber_fp.parent / CHECKPOINT_FP.name
+
+def chamber_fps() -> list[Path]:
+    """ Every chamber folder on disk, the unpartitioned ones first and then each year's. """
+    partitions = [BASE_DATA_FP] + sorted(fp for fp in BASE_DATA_FP.glob("[0-9][0-9][0-9][0-9]") if fp.is_dir())
+    return [partition / chamber_fp.name for partition in partitions for chamber_fp in [HOR_DATA_FP, SENATE_DATA_FP]
+            if (partition / chamber_fp.name).exists()]
 
 STATE_MAP = {
     'Alabama': 'AL',
@@ -132,3 +322,86 @@ STATE_MAP = {
     'Wyoming': 'WY'
 }
 
+# nickname -> formal first names
+NICKNAMES = {
+    'ABE': ('ABRAHAM',),
+    'AL': ('ALBERT', 'ALAN', 'ALLEN', 'ALFRED'),
+    'ALEX': ('ALEXANDER', 'ALEXANDRA', 'ALEXANDRIA'),
+    'ANDY': ('ANDREW',),
+    'ANGIE': ('ANGELA',),
+    'BARB': ('BARBARA',),
+    'BEN': ('BENJAMIN',),
+    'BETH': ('ELIZABETH',),
+    'BETSY': ('ELIZABETH',),
+    'BILL': ('WILLIAM',),
+    'BILLY': ('WILLIAM',),
+    'BOB': ('ROBERT',),
+    'BOBBY': ('ROBERT',),
+    'BRAD': ('BRADLEY',),
+    'BUDDY': ('EARL', 'WILLIAM'),
+    'CATHY': ('CATHERINE',),
+    'CHARLIE': ('CHARLES',),
+    'CHRIS': ('CHRISTOPHER', 'CHRISTINE', 'CHRISTIAN'),
+    'CHUCK': ('CHARLES',),
+    'DAN': ('DANIEL',),
+    'DANNY': ('DANIEL',),
+    'DAVE': ('DAVID',),
+    'DEB': ('DEBORAH', 'DEBRA'),
+    'DEBBIE': ('DEBORAH', 'DEBRA'),
+    'DICK': ('RICHARD',),
+    'DON': ('DONALD',),
+    'DONNIE': ('DONALD',),
+    'DOUG': ('DOUGLAS',),
+    'DREW': ('ANDREW',),
+    'ED': ('EDWARD',),
+    'EDDIE': ('EDWARD',),
+    'FRANK': ('FRANCIS', 'FRANKLIN'),
+    'FRED': ('FREDERICK',),
+    'GREG': ('GREGORY',),
+    'HAL': ('HAROLD', 'HENRY'),
+    'HANK': ('HENRY',),
+    'JACK': ('JOHN',),
+    'JACKY': ('JACKLYN', 'JACQUELINE'),
+    'JAKE': ('JACOB',),
+    'JEFF': ('JEFFREY',),
+    'JERRY': ('GERALD', 'JEROME'),
+    'JIM': ('JAMES',),
+    'JIMMY': ('JAMES',),
+    'JOE': ('JOSEPH',),
+    'JOEY': ('JOSEPH',),
+    'JON': ('JONATHAN',),
+    'JOSH': ('JOSHUA',),
+    'KATE': ('KATHERINE', 'KATHLEEN'),
+    'KATHY': ('KATHERINE', 'KATHLEEN'),
+    'KATIE': ('KATHERINE', 'KATHLEEN'),
+    'KEN': ('KENNETH',),
+    'LARRY': ('LAWRENCE',),
+    'LIZ': ('ELIZABETH',),
+    'LIZZIE': ('ELIZABETH',),
+    'LOU': ('LOUIS', 'LUIS'),
+    'LUCY': ('LUCIA',),
+    'MAGGIE': ('MARGARET',),
+    'MATT': ('MATTHEW',),
+    'MIKE': ('MICHAEL',),
+    'MITCH': ('MITCHELL',),
+    'NICK': ('NICHOLAS',),
+    'PAT': ('PATRICK', 'PATRICIA'),
+    'PETE': ('PETER',),
+    'RANDY': ('RANDALL', 'RANDOLPH'),
+    'RICH': ('RICHARD',),
+    'RICK': ('RICHARD',),
+    'RICKY': ('RICHARD',),
+    'ROB': ('ROBERT',),
+    'RON': ('RONALD',),
+    'SAM': ('SAMUEL',),
+    'STEVE': ('STEVEN', 'STEPHEN'),
+    'SUE': ('SUSAN',),
+    'TED': ('EDWARD', 'THEODORE'),
+    'TIM': ('TIMOTHY',),
+    'TOM': ('THOMAS',),
+    'TOMMY': ('THOMAS',),
+    'TONY': ('ANTHONY',),
+    'VINCE': ('VINCENT',),
+    'WILL': ('WILLIAM',),
+    'ZACH': ('ZACHARY',),
+}